@@ -0,0 +1,199 @@
+"""
+분석 리포트용 SQL 쿼리
+
+답안 행을 Python으로 가져와서 세는 대신, 통계는 DB에서 집계하고
+오답 목록은 answer_sheet와 한 번에 조인해서 가져온다.
+"""
+import base64
+import json
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from sqlalchemy import select, func, or_, tuple_
+
+from models import Question, Answer, AnswerSheet, AnalysisResult
+from score_distribution import score_bucket_conditions, score_bucket_labels, BUCKET_COUNT
+
+
+def question_statistics_stmt(exam_id: int, question_id: int, max_score: Decimal):
+    """
+    문항 하나의 통계를 집계 쿼리 한 번으로 계산
+    결과 컬럼: total, correct, scored, mean_score, std_score, bucket_0 ~ bucket_4
+    (question_pattern 누적 통계가 없을 때 쓰는 대체 경로)
+    """
+    count = func.count(Answer.id)
+    return select(
+        count.label("total"),
+        count.filter(Answer.raw_score >= max_score).label("correct"),
+        count.filter(Answer.raw_score.is_not(None)).label("scored"),
+        func.avg(Answer.raw_score).label("mean_score"),
+        func.stddev_pop(Answer.raw_score).label("std_score"),
+        *[
+            count.filter(condition).label(f"bucket_{index}")
+            for index, condition in enumerate(score_bucket_conditions(Answer.raw_score, max_score))
+        ],
+    ).where(Answer.exam_id == exam_id, Answer.question_id == question_id)
+
+
+def statistics_from_row(row, max_score: Decimal) -> dict:
+    """question_statistics_stmt 결과 한 행을 리포트 statistics 형식으로 변환"""
+    total = row.total or 0
+    correct = row.correct or 0
+    correct_rate = (correct / total * 100) if total > 0 else 0
+    return {
+        "total_answers": total,
+        "correct_answers": correct,
+        # 점수가 없는 답안도 오답으로 간주
+        "wrong_answers": total - correct,
+        "correct_rate": round(correct_rate, 2),
+        "scored_answers": row.scored or 0,
+        "mean_score": round(float(row.mean_score), 2) if row.mean_score is not None else None,
+        "std_score": round(float(row.std_score), 2) if row.std_score is not None else None,
+        "histogram": {
+            "labels": score_bucket_labels(max_score),
+            "counts": [getattr(row, f"bucket_{index}") or 0 for index in range(BUCKET_COUNT)],
+        },
+    }
+
+
+def wrong_answers_stmt(exam_id: int, question_id: int, max_score: Decimal):
+    """
+    오답(점수 < 배점 또는 점수 없음) 목록을 학번과 함께 조인 한 번으로 조회
+    (question_id, raw_score, id) 인덱스 순서대로 정렬, exam_id 조건으로 해당 시험 파티션만 읽는다
+    """
+    return (
+        select(
+            Answer.id,
+            AnswerSheet.student_code,
+            Answer.answer_text,
+            Answer.raw_score,
+        )
+        .join(AnswerSheet, AnswerSheet.id == Answer.answer_sheet_id)
+        .where(
+            Answer.exam_id == exam_id,
+            Answer.question_id == question_id,
+            or_(Answer.raw_score < max_score, Answer.raw_score.is_(None)),
+        )
+        .order_by(Answer.raw_score.asc().nulls_last(), Answer.id.asc())
+    )
+
+
+def exam_overview_stmt(exam_id: int):
+    """
+    대시보드용 시험 전체 문항 요약을 쿼리 한 번으로 조회 (답안 텍스트는 읽지 않음)
+    문항별 답안 수/평균/점수 구간은 answer ⟕ question GROUP BY로 집계하고,
+    전체 학생 수와 문항별 최신 클러스터 결과는 스칼라 서브쿼리로 같이 가져온다
+    """
+    count = func.count(Answer.id)
+    total_students = select(func.count(AnswerSheet.id)).where(AnswerSheet.exam_id == exam_id).scalar_subquery()
+    latest_clusters = (
+        select(AnalysisResult.cluster_data)
+        .where(AnalysisResult.question_id == Question.id)
+        .order_by(AnalysisResult.updated_at.desc(), AnalysisResult.id.desc())
+        .limit(1)
+        .correlate(Question)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            Question.id,
+            Question.number,
+            Question.text,
+            Question.score,
+            count.label("total"),
+            func.avg(Answer.raw_score).label("mean_score"),
+            *[
+                count.filter(condition).label(f"bucket_{index}")
+                for index, condition in enumerate(score_bucket_conditions(Answer.raw_score, Question.score))
+            ],
+            total_students.label("total_students"),
+            latest_clusters.label("cluster_data"),
+        )
+        .select_from(Question)
+        # exam_id를 상수로 걸어서 시험 파티션 하나만 읽는다
+        .outerjoin(Answer, (Answer.question_id == Question.id) & (Answer.exam_id == exam_id))
+        .where(Question.exam_id == exam_id)
+        .group_by(Question.id)
+        .order_by(Question.number)
+    )
+
+
+def overview_question_from_row(row) -> dict:
+    """exam_overview_stmt 결과 한 행을 대시보드 questions 항목 형식으로 변환 (analysis_wrapper 출력과 같은 키)"""
+    cluster_data = row.cluster_data
+    # 분석 결과는 클러스터 배열 그대로 또는 {"clusters": [...]} 형태로 저장되어 있다
+    if isinstance(cluster_data, dict):
+        cluster_data = cluster_data.get("clusters")
+    return {
+        "qNum": row.number,
+        "maxScore": float(row.score),
+        "qText": row.text,
+        "avgScore": round(float(row.mean_score), 1) if row.mean_score is not None else 0.0,
+        "scoreLabels": score_bucket_labels(row.score),
+        "scoreData": [getattr(row, f"bucket_{index}") or 0 for index in range(BUCKET_COUNT)],
+        "clusters": cluster_data or [],
+    }
+
+
+def encode_cursor(raw_score: Optional[Decimal], answer_id: int) -> str:
+    """마지막으로 본 (raw_score, id)를 URL에 넣을 수 있는 커서 문자열로 변환"""
+    payload = json.dumps([str(raw_score) if raw_score is not None else None, answer_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[Decimal], int]:
+    """encode_cursor의 역변환 (형식이 잘못되면 ValueError)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw_score, answer_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return (Decimal(raw_score) if raw_score is not None else None), int(answer_id)
+    except Exception as e:
+        raise ValueError(f"잘못된 커서입니다: {cursor}") from e
+
+
+def wrong_answers_page_stmt(
+    exam_id: int,
+    question_id: int,
+    max_score: Decimal,
+    limit: int,
+    after: Optional[Tuple[Optional[Decimal], int]] = None,
+    min_score: Optional[Decimal] = None,
+    max_score_filter: Optional[Decimal] = None,
+    student_code: Optional[str] = None,
+):
+    """
+    오답 목록 한 페이지 (keyset pagination)
+    정렬 순서는 (raw_score ASC NULLS LAST, id ASC) 이고, after 는 이전 페이지 마지막 행의 (raw_score, id)
+    OFFSET 없이 인덱스에서 바로 다음 위치부터 읽으므로 뒤 페이지도 첫 페이지와 같은 비용이다
+    """
+    stmt = wrong_answers_stmt(exam_id, question_id, max_score)
+
+    if after is not None:
+        after_score, after_id = after
+        if after_score is None:
+            # 점수 없는 답안 구간(맨 뒤)에서 이어서
+            stmt = stmt.where(Answer.raw_score.is_(None), Answer.id > after_id)
+        else:
+            stmt = stmt.where(or_(
+                tuple_(Answer.raw_score, Answer.id) > tuple_(after_score, after_id),
+                Answer.raw_score.is_(None),
+            ))
+
+    if min_score is not None:
+        stmt = stmt.where(Answer.raw_score >= min_score)
+    if max_score_filter is not None:
+        stmt = stmt.where(Answer.raw_score <= max_score_filter)
+    if student_code:
+        stmt = stmt.where(AnswerSheet.student_code == student_code)
+
+    return stmt.limit(limit)
+
+
+def wrong_answer_to_dict(row, max_score: Decimal) -> dict:
+    return {
+        "answer_id": row.id,
+        "student_code": row.student_code,
+        "answer_text": row.answer_text,
+        "score": float(row.raw_score) if row.raw_score is not None else None,
+        "max_score": float(max_score),
+    }
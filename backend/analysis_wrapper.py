@@ -2,9 +2,15 @@ import sys
 import os
 import json
 import argparse
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from decimal import Decimal
 
+import numpy as np
+
 sys.stdout.reconfigure(encoding='utf-8')
 
 # ==========================================
@@ -21,14 +27,22 @@ sys.path.insert(0, str(BACKEND_DIR))
 from dotenv import load_dotenv
 load_dotenv()
 
+from score_distribution import score_bucket_labels, score_bucket_index, BUCKET_COUNT
+from serialization import dumps_str
+from config import settings
+from vision_cache import vision_cache, format_stats
+import embedding_store
+import image_preprocess
+import rasterize
+
 # 백엔드 모듈 import
 try:
     from test_parse import parse_exam
-    from score import parse_sheet
+    from score import parse_sheets
     from parse2 import parse_student_answer_handwriting
     import clustering
     from clustering import (
-        load_exams, get_embeddings, cosine_similarity_matrix, 
+        load_exams, exam_to_text, get_embeddings, cosine_similarity_matrix, 
         cluster_by_threshold, compute_cluster_stats, describe_clusters_with_openai
     )
     # clustering 모듈에서 상수 가져오기
@@ -39,7 +53,6 @@ try:
     CLUSTERING_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️ 일부 모듈 import 실패: {e}", file=sys.stderr)
-    import traceback
     traceback.print_exc()
     CLUSTERING_AVAILABLE = False
     # 기본값 설정
@@ -79,21 +92,12 @@ def calculate_score_distribution(score_results: list, question_num: int, max_sco
     if not scores:
         return (["0점", "1-3점", "4-6점", "7-9점", "만점"], [0, 0, 0, 0, 0], 0.0)
     
-    # 점수 구간별 분류
-    score_labels = ["0점", "1-3점", "4-6점", "7-9점", f"{max_score}점"]
-    score_data = [0, 0, 0, 0, 0]
+    # 점수 구간별 분류 (리포트 API의 histogram과 같은 기준)
+    score_labels = score_bucket_labels(max_score)
+    score_data = [0] * BUCKET_COUNT
     
     for score in scores:
-        if score == 0:
-            score_data[0] += 1
-        elif score < 4:
-            score_data[1] += 1
-        elif score < 7:
-            score_data[2] += 1
-        elif score < max_score:
-            score_data[3] += 1
-        else:  # 만점
-            score_data[4] += 1
+        score_data[score_bucket_index(score, max_score)] += 1
     
     avg_score = sum(scores) / len(scores) if scores else 0.0
     
@@ -170,18 +174,22 @@ def extract_non_perfect_answers(score_results: list, student_answers: list, prob
 # ==========================================
 # 4. Clustering 연동
 # ==========================================
-def run_clustering_for_problem(problem_num: int, rubric_path: str, question_image_path: str, non_perfect_answers: list):
+def run_clustering_for_problem(problem_num: int, rubric_path: str, question_image_path: str, non_perfect_answers: list, embed=None, workers: int = None):
     """
     clustering.py를 사용하여 클러스터링 분석 수행
+    embed: 텍스트 목록 → 임베딩 행렬 함수 (없으면 clustering.get_embeddings, 파이프라인에서는 미리 받아 둔 임베딩 사용)
+    workers: 클러스터 요약을 동시에 보낼 요청 수 (없으면 ANALYSIS_CONCURRENCY)
     """
     if not CLUSTERING_AVAILABLE or not non_perfect_answers:
         return []
     
+    embed = embed or get_embeddings
+    json_path = None
     try:
-        # problem{n}_answers.json 형식으로 임시 파일 생성
-        import tempfile
-        temp_dir = Path(tempfile.gettempdir())
-        json_path = temp_dir / f"problem{problem_num}_answers.json"
+        # problem{n}_answers.json 형식으로 임시 파일 생성 (문제별/실행별로 이름이 겹치지 않게)
+        fd, temp_name = tempfile.mkstemp(prefix=f"problem{problem_num}_answers_", suffix=".json")
+        os.close(fd)
+        json_path = Path(temp_name)
         
         # extract_answers.py 형식으로 데이터 저장
         output_data = {
@@ -207,7 +215,7 @@ def run_clustering_for_problem(problem_num: int, rubric_path: str, question_imag
         
         # 임베딩 생성
         print(f"    🔄 문제 {problem_num}번: 임베딩 생성 중...", file=sys.stderr)
-        embeddings = get_embeddings(texts)
+        embeddings = embed(texts)
         
         # 유사도 행렬 계산
         print(f"    🔄 문제 {problem_num}번: 유사도 행렬 계산 중...", file=sys.stderr)
@@ -236,152 +244,233 @@ def run_clustering_for_problem(problem_num: int, rubric_path: str, question_imag
             rubric_path,
             problem_num=problem_num,  # 문제 번호 전달
             model=CLUSTER_SUMMARY_MODEL,
-            max_samples_per_cluster=MAX_SAMPLES_PER_CLUSTER
+            max_samples_per_cluster=MAX_SAMPLES_PER_CLUSTER,
+            workers=workers
         )
         
         print(f"    ✅ 문제 {problem_num}번: {len(cluster_summaries)}개 클러스터 분석 완료", file=sys.stderr)
         
-        # 임시 파일 삭제
-        if json_path.exists():
-            json_path.unlink()
-        
         return cluster_summaries
         
     except Exception as e:
         print(f"⚠️ 클러스터링 실패 (문제 {problem_num}): {e}", file=sys.stderr)
-        import traceback
         traceback.print_exc()
         return []
+    finally:
+        # 임시 파일 삭제
+        if json_path is not None and json_path.exists():
+            json_path.unlink()
+
+
+def problem_texts(entries: list, problem_num: int) -> list:
+    """extract_non_perfect_answers 결과 → clustering.load_exams가 만드는 것과 같은 텍스트 목록"""
+    problem_key = f"problem_{problem_num}_answer"
+    return [
+        exam_to_text({"exam_id": entry.get("student_code") or "", "problems": [entry[problem_key]]})
+        for entry in entries
+    ]
+
+
+class EmbeddingPrefetcher:
+    """
+    답안지가 파싱되는 대로 임베딩을 미리 요청해 두고, 클러스터링 때 꺼내 쓰는 임베딩 함수
+    같은 텍스트는 한 번만 요청한다. 미리 받지 못한 텍스트(또는 요청 실패)는 호출한 스레드에서 바로 받는다.
+    """
+
+    def __init__(self, pool: ThreadPoolExecutor, embed_fn):
+        self._pool = pool
+        self._embed_fn = embed_fn
+        self._lock = threading.Lock()
+        self._pending = {}  # text → (future, 결과 행 번호)
+        self.prefetched = 0
+
+    def prefetch(self, texts: list) -> None:
+        with self._lock:
+            new_texts = [text for text in dict.fromkeys(texts) if text not in self._pending]
+            if not new_texts:
+                return
+            future = self._pool.submit(self._embed_fn, new_texts)
+            for row, text in enumerate(new_texts):
+                self._pending[text] = (future, row)
+            self.prefetched += len(new_texts)
+
+    def __call__(self, texts: list):
+        vectors = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            with self._lock:
+                entry = self._pending.get(text)
+            try:
+                if entry is None:
+                    raise LookupError(text)
+                future, row = entry
+                vectors[text] = future.result()[row]
+            except Exception:
+                missing.append(text)
+        if missing:
+            # 워커 스레드 안에서 풀에 다시 넣고 기다리면 교착될 수 있으므로 직접 요청
+            for text, vector in zip(missing, self._embed_fn(missing)):
+                vectors[text] = vector
+        return np.array([vectors[text] for text in texts])
+
+
+def _call_logged(fn, label: str, *args):
+    """실패하면 경고를 남기고 None 반환 (한 장이 실패해도 나머지는 계속)"""
+    try:
+        return fn(*args)
+    except Exception as e:
+        print(f"⚠️ {label} 실패: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return None
 
 # ==========================================
 # 5. Main Analysis Function
 # ==========================================
-def perform_analysis(blank_path, rubric_path, score_path, student_paths):
+def perform_analysis(blank_path, rubric_path, score_path, student_paths, concurrency: int = None):
     """
     전체 분석 파이프라인 실행
     
     Args:
         blank_path: 문제 원본 파일 경로 (문제지.pdf) → test_parse.py의 parse_exam() 사용
         rubric_path: 채점 기준표 이미지 경로 → clustering.py의 describe_clusters_with_openai() 사용
-        score_path: 점수표 이미지 경로 → score.py의 parse_sheet() 사용
-        student_paths: 학생 답안지 이미지 경로 리스트 → parse2.py의 parse_student_answer_handwriting() 사용
-    """
-    print("🚀 분석 시작...", file=sys.stderr)
-    
-    # 1. 문제지 파싱 (test_parse.py) - 문제 원본 처리
-    print("📝 [1단계] 문제지 파싱 중 (test_parse.py)...", file=sys.stderr)
-    try:
-        problem_data = parse_exam(blank_path)  # test_parse.py의 parse_exam() 사용
-        questions = problem_data.get("problems", [])
-        print(f"✅ 문제 {len(questions)}개 파싱 완료", file=sys.stderr)
-    except Exception as e:
-        print(f"❌ 문제지 파싱 실패: {e}", file=sys.stderr)
-        import traceback
-        traceback.print_exc()
-        questions = []
-    
-    # 2. 점수표 파싱 (score.py) - 점수표 처리 (여러 개 가능)
-    print("📊 [2단계] 점수표 파싱 중 (score.py)...", file=sys.stderr)
-    score_results = []
-    # score_path는 이미 리스트로 받음 (nargs='+')
-    score_paths = score_path if isinstance(score_path, list) else [score_path]
-    
-    print(f"  📊 점수표 {len(score_paths)}개 처리 예정", file=sys.stderr)
-    for sp in score_paths:
-        try:
-            result = parse_sheet(sp)  # score.py의 parse_sheet() 사용
-            score_results.append(result)
-        except Exception as e:
-            print(f"⚠️ 점수표 파싱 실패 ({sp}): {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-    
-    total_students = len(score_results)
-    print(f"✅ 점수표 {total_students}개 파싱 완료", file=sys.stderr)
+        score_path: 점수표 이미지/PDF 경로 → score.py의 parse_sheets() 사용 (여러 장씩 한 요청으로, PDF는 쪽마다 한 장)
+        student_paths: 학생 답안지 이미지/PDF 경로 리스트 (파일 하나 = 학생 한 명) → parse2.py의 parse_student_answer_handwriting() 사용
+        concurrency: 동시에 보낼 LLM/임베딩 요청 수 (기본값: ANALYSIS_CONCURRENCY, 1이면 순차 실행과 같음)
     
-    # 3. 학생 답안 파싱 (parse2.py) - 학생 답안지 처리
-    print("✍️ [3단계] 학생 답안 파싱 중 (parse2.py)...", file=sys.stderr)
-    student_answers = []
+    단계가 겹치도록 스레드 풀에서 실행한다.
+    - 문제지 / 점수표 / 답안지 파싱을 한꺼번에 요청 (답안지는 같은 순번 점수표의 학번이 필요해서 그 결과만 기다림)
+    - 점수표가 모두 끝나면 문제별 "만점이 아닌 학생"이 정해지므로, 이후 답안지가 파싱되는 대로 해당 답안의 임베딩을 미리 요청
+    - 답안지가 모두 끝나면 문제별 클러스터링(유사도 + 클러스터 요약)을 동시에 실행
+    문제 순서, 학생 순서, 클러스터링 입력은 순차 실행과 같다.
+    """
+    concurrency = max(1, concurrency or settings.ANALYSIS_CONCURRENCY)
+    # 묶음 스캔 PDF는 쪽마다 한 장으로 펼쳐서 답안지와 순번을 맞춘다 (렌더링은 여러 프로세스로, 한 번 렌더링한 쪽은 캐시에서)
+    score_paths = rasterize.expand_pages(score_path if isinstance(score_path, list) else [score_path])
+    print(f"🚀 분석 시작... (동시 요청 {concurrency}개)", file=sys.stderr)
     
-    for idx, student_path in enumerate(student_paths):
-        try:
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # 1~3. 문제지(test_parse.py) / 점수표(score.py) / 학생 답안(parse2.py) 파싱 요청
+        # 풀의 작업 큐는 FIFO라서, 답안지 작업이 실행될 때 기다리는 점수표 작업은 이미 실행 중이거나 끝나 있다 (교착 없음)
+        print(f"📝 [1~3단계] 문제지 1개, 점수표 {len(score_paths)}개, 답안지 {len(student_paths)}개 파싱 중...", file=sys.stderr)
+        problem_future = pool.submit(_call_logged, parse_exam, "문제지 파싱", blank_path)
+        # 점수표는 여러 장씩 한 요청으로 묶어서 (score.parse_sheets, 실패한 장은 None)
+        # 점수표 배치는 안쪽 풀에서 보내므로, 같이 도는 문제지 요청 하나를 빼서 전체 동시 요청이 concurrency를 넘지 않게
+        score_future = pool.submit(
+            _call_logged, parse_sheets, f"점수표 파싱 ({len(score_paths)}장)", score_paths, None, False, max(1, concurrency - 1)
+        )
+        
+        def parse_answer(idx: int, student_path: str):
             # 점수표에서 학번 찾기
             student_code = None
-            if idx < len(score_results):
-                student_code = score_results[idx].get("student_code")
-            
-            answer_data = parse_student_answer_handwriting(student_path, student_code)  # parse2.py 사용
-            student_answers.append(answer_data)
-        except Exception as e:
-            print(f"⚠️ 답안 파싱 실패 ({student_path}): {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-    
-    print(f"✅ 답안 {len(student_answers)}개 파싱 완료", file=sys.stderr)
-    
-    # 4. 문제별 분석 및 클러스터링 (clustering.py) - 채점 기준표 사용
-    print("📈 [4단계] 문제별 분석 중 (clustering.py)...", file=sys.stderr)
-    questions_result = []
-    
-    for problem in questions:
-        problem_num = problem.get("problem_index")
-        max_score = problem.get("score", PROBLEM_MAX_SCORES.get(problem_num, 10))
+            if idx < len(score_paths):
+                score_result = (score_future.result() or [None] * len(score_paths))[idx]
+                student_code = score_result.get("student_code") if score_result else None
+            return _call_logged(parse_student_answer_handwriting, f"답안 파싱 ({student_path})", student_path, student_code)
         
-        # 점수 분포 계산
-        score_labels, score_data, avg_score = calculate_score_distribution(
-            score_results, problem_num, max_score
-        )
+        answer_futures = [pool.submit(parse_answer, idx, student_path) for idx, student_path in enumerate(student_paths)]
         
-        # 만점이 아닌 학생 답안 추출
-        non_perfect_answers = extract_non_perfect_answers(
-            score_results, student_answers, problem_num, max_score
-        )
+        problem_data = problem_future.result()
+        questions = problem_data.get("problems", []) if problem_data else []
+        print(f"✅ 문제 {len(questions)}개 파싱 완료", file=sys.stderr)
+        problems = [
+            (problem.get("problem_index"), problem.get("score", PROBLEM_MAX_SCORES.get(problem.get("problem_index"), 10)))
+            for problem in questions
+        ]
         
-        print(f"  📊 문제 {problem_num}번: 만점이 아닌 학생 {len(non_perfect_answers)}명", file=sys.stderr)
+        score_results = [result for result in (score_future.result() or []) if result is not None]
+        total_students = len(score_results)
+        print(f"✅ 점수표 {total_students}개 파싱 완료", file=sys.stderr)
         
-        # 클러스터링 실행 (clustering.py 사용, rubric_path와 blank_path 전달)
-        print(f"  📊 문제 {problem_num}번 클러스터링 중 (clustering.py, 채점 기준표 사용)...", file=sys.stderr)
-        clusters = run_clustering_for_problem(problem_num, rubric_path, blank_path, non_perfect_answers)
+        # 4-1. 답안지가 파싱되는 대로 만점이 아닌 학생 답안의 임베딩을 미리 요청
+        embedder = EmbeddingPrefetcher(pool, get_embeddings) if CLUSTERING_AVAILABLE else None
+        for future in as_completed(answer_futures):
+            answer_data = future.result()
+            if answer_data is None or embedder is None:
+                continue
+            texts = []
+            for problem_num, max_score in problems:
+                entries = extract_non_perfect_answers(score_results, [answer_data], problem_num, max_score)
+                texts.extend(problem_texts(entries, problem_num))
+            if texts:
+                embedder.prefetch(texts)
         
-        print(f"  📊 문제 {problem_num}번: 클러스터링 결과 {len(clusters) if clusters else 0}개", file=sys.stderr)
+        student_answers = [result for result in (future.result() for future in answer_futures) if result is not None]
+        print(
+            f"✅ 답안 {len(student_answers)}개 파싱 완료 (임베딩 {embedder.prefetched if embedder else 0}개 미리 요청)",
+            file=sys.stderr
+        )
         
-        # 클러스터가 없으면 기본값 제공
-        if not clusters:
-            clusters = [
-                {
-                    "cluster_index": 1,
-                    "cognitive_diagnosis": {
-                        "misconceptions": ["분석 데이터 부족"],
-                        "logical_gaps": ["분석 데이터 부족"],
-                        "missing_keywords": ["분석 데이터 부족"]
-                    },
-                    "pattern_characteristics": {
-                        "specificity": "분석 데이터 부족",
-                        "approach": "분석 데이터 부족",
-                        "error_type": "분석 데이터 부족"
-                    },
-                    "quantitative_metrics": {
-                        "num_students": len(non_perfect_answers),
-                        "percentage": round((len(non_perfect_answers) / total_students * 100) if total_students > 0 else 0, 1),
-                        "relative_length": "분석 데이터 부족",
-                        "expected_score_level": "분석 데이터 부족"
-                    },
-                    "overall_summary": "클러스터링을 수행할 충분한 데이터가 없습니다."
-                }
-            ]
+        # 4-2. 문제별 분석 및 클러스터링 (clustering.py) - 채점 기준표 사용, 문제끼리 동시에 실행
+        print("📈 [4단계] 문제별 분석 중 (clustering.py)...", file=sys.stderr)
+        non_perfect_by_problem = []
+        cluster_futures = []
+        # 문제별 클러스터 요약은 각자 안쪽 풀에서 보내므로, 동시에 도는 문제 수로 나눠 전체가 concurrency를 넘지 않게
+        summary_workers = max(1, concurrency // max(1, len(problems)))
+        for problem_num, max_score in problems:
+            # 만점이 아닌 학생 답안 추출
+            non_perfect_answers = extract_non_perfect_answers(
+                score_results, student_answers, problem_num, max_score
+            )
+            print(f"  📊 문제 {problem_num}번: 만점이 아닌 학생 {len(non_perfect_answers)}명", file=sys.stderr)
+            non_perfect_by_problem.append(non_perfect_answers)
+            cluster_futures.append(pool.submit(
+                run_clustering_for_problem, problem_num, rubric_path, blank_path, non_perfect_answers, embedder, summary_workers
+            ))
         
-        # 프론트엔드 형식으로 변환
-        question_result = {
-            "qNum": problem_num,
-            "maxScore": max_score,
-            "qText": problem.get("raw_text", ""),
-            "avgScore": avg_score,
-            "scoreLabels": score_labels,
-            "scoreData": score_data,
-            "clusters": clusters
-        }
+        questions_result = []
+        for problem, (problem_num, max_score), non_perfect_answers, cluster_future in zip(
+            questions, problems, non_perfect_by_problem, cluster_futures
+        ):
+            # 점수 분포 계산
+            score_labels, score_data, avg_score = calculate_score_distribution(
+                score_results, problem_num, max_score
+            )
+            
+            clusters = cluster_future.result()
+            print(f"  📊 문제 {problem_num}번: 클러스터링 결과 {len(clusters) if clusters else 0}개", file=sys.stderr)
+            
+            # 클러스터가 없으면 기본값 제공
+            if not clusters:
+                clusters = [
+                    {
+                        "cluster_index": 1,
+                        "cognitive_diagnosis": {
+                            "misconceptions": ["분석 데이터 부족"],
+                            "logical_gaps": ["분석 데이터 부족"],
+                            "missing_keywords": ["분석 데이터 부족"]
+                        },
+                        "pattern_characteristics": {
+                            "specificity": "분석 데이터 부족",
+                            "approach": "분석 데이터 부족",
+                            "error_type": "분석 데이터 부족"
+                        },
+                        "quantitative_metrics": {
+                            "num_students": len(non_perfect_answers),
+                            "percentage": round((len(non_perfect_answers) / total_students * 100) if total_students > 0 else 0, 1),
+                            "relative_length": "분석 데이터 부족",
+                            "expected_score_level": "분석 데이터 부족"
+                        },
+                        "overall_summary": "클러스터링을 수행할 충분한 데이터가 없습니다."
+                    }
+                ]
+        
+            # 프론트엔드 형식으로 변환
+            question_result = {
+                "qNum": problem_num,
+                "maxScore": max_score,
+                "qText": problem.get("raw_text", ""),
+                "avgScore": avg_score,
+                "scoreLabels": score_labels,
+                "scoreData": score_data,
+                "clusters": clusters
+            }
         
-        questions_result.append(question_result)
+            questions_result.append(question_result)
+    
+    print(f"🗂️  비전 캐시: {format_stats(vision_cache.stats())}", file=sys.stderr)
+    print(f"🧮 임베딩 저장소: {embedding_store.format_stats()}", file=sys.stderr)
+    print(f"🖼️  이미지 전처리: {image_preprocess.format_stats()}", file=sys.stderr)
+    print(f"📄 PDF 렌더링: {rasterize.format_stats()}", file=sys.stderr)
     
     # 최종 결과 반환
     return {
@@ -398,14 +487,16 @@ if __name__ == "__main__":
     parser.add_argument("--rubric", required=True, help="채점 기준표 IMG 경로")
     parser.add_argument("--score", nargs='+', required=True, help="점수표 IMG 경로 (여러 개 가능)")
     parser.add_argument("--students", nargs='+', required=True, help="학생 답안 IMG 경로 리스트")
+    parser.add_argument("--concurrency", type=int, default=None, help="동시 LLM/임베딩 요청 수 (기본값: ANALYSIS_CONCURRENCY)")
     args = parser.parse_args()
 
     try:
         # 분석 실행 (여러 점수표 처리)
-        final_data = perform_analysis(args.blank, args.rubric, args.score, args.students)
+        final_data = perform_analysis(args.blank, args.rubric, args.score, args.students, args.concurrency)
         
         # 결과를 JSON 문자열로 출력 (Node.js가 읽는 부분)
-        print(json.dumps(final_data, ensure_ascii=False))
+        # 클러스터 통계에 numpy 값이 섞여 있어도 그대로 직렬화된다
+        print(dumps_str(final_data))
         
     except Exception as e:
         # 에러 발생 시 stderr로 출력
@@ -0,0 +1,96 @@
+"""
+동기 세션 vs 비동기 세션 처리량(requests/sec) 비교 벤치마크
+
+같은 조회(문항 + 답안 수 집계)를 하는 엔드포인트를
+1) 기존 방식: async def 핸들러 + 동기 Session (이벤트 루프 블로킹)
+2) 변경 방식: async def 핸들러 + AsyncSession
+으로 각각 띄워 놓고, 한 워커(한 이벤트 루프) 안에서 동시 요청을 보내 처리량을 비교한다.
+
+사용법:
+    python bench_db_stack.py --requests 500 --concurrency 50 --question-id 1 --sleep-ms 5
+
+--sleep-ms는 pg_sleep으로 쿼리 지연을 흉내 내서 네트워크 너머 DB 환경과 비슷하게 만든다.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import httpx
+from fastapi import FastAPI, Depends
+from sqlalchemy import select, func, text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import Question, Answer
+from dependencies import get_db, get_sync_db
+
+
+def build_sync_app(sleep_sec: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/report/{question_id}")
+    async def report(question_id: int, db: Session = Depends(get_sync_db)):
+        if sleep_sec:
+            db.execute(text("SELECT pg_sleep(:s)"), {"s": sleep_sec})
+        question = db.get(Question, question_id)
+        total = db.scalar(select(func.count(Answer.id)).where(Answer.question_id == question_id))
+        return {"question_id": question.id if question else None, "total_answers": total}
+
+    return app
+
+
+def build_async_app(sleep_sec: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/report/{question_id}")
+    async def report(question_id: int, db: AsyncSession = Depends(get_db)):
+        if sleep_sec:
+            await db.execute(text("SELECT pg_sleep(:s)"), {"s": sleep_sec})
+        question = await db.get(Question, question_id)
+        total = await db.scalar(select(func.count(Answer.id)).where(Answer.question_id == question_id))
+        return {"question_id": question.id if question else None, "total_answers": total}
+
+    return app
+
+
+async def run_load(app: FastAPI, question_id: int, total_requests: int, concurrency: int) -> float:
+    """동시 요청을 보내고 초당 처리 요청 수를 반환"""
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 워밍업 (커넥션 풀 채우기)
+        await client.get(f"/report/{question_id}")
+
+        async def one():
+            async with semaphore:
+                resp = await client.get(f"/report/{question_id}")
+                resp.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+    return total_requests / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="동기/비동기 DB 스택 처리량 비교")
+    parser.add_argument("--requests", type=int, default=500, help="총 요청 수")
+    parser.add_argument("--concurrency", type=int, default=50, help="동시 요청 수")
+    parser.add_argument("--question-id", type=int, default=1, help="조회할 문항 ID")
+    parser.add_argument("--sleep-ms", type=float, default=5.0, help="요청마다 추가할 DB 지연 (ms)")
+    args = parser.parse_args()
+
+    sleep_sec = args.sleep_ms / 1000
+
+    print(f"요청 {args.requests}개, 동시 {args.concurrency}개, DB 지연 {args.sleep_ms}ms")
+    sync_rps = asyncio.run(run_load(build_sync_app(sleep_sec), args.question_id, args.requests, args.concurrency))
+    print(f"  [before] 동기 Session   : {sync_rps:8.1f} req/s")
+    async_rps = asyncio.run(run_load(build_async_app(sleep_sec), args.question_id, args.requests, args.concurrency))
+    print(f"  [after ] AsyncSession   : {async_rps:8.1f} req/s")
+    print(f"  → {async_rps / sync_rps:.1f}배")
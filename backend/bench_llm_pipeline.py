@@ -0,0 +1,134 @@
+"""
+분석 파이프라인(analysis_wrapper.perform_analysis) 전체 벤치마크 (fake LLM 백엔드)
+
+API 키/비용 없이 llm_fake의 가짜 OpenAI 응답으로 문제지 → 점수표 → 답안지 → 임베딩 → 클러스터 요약까지
+실제 호출 경로(스케줄러, 재시도, 이미지 전처리, 배치)를 그대로 돌려서 동시 요청 수별 소요 시간을 비교한다.
+서버 지연 분포와 분당 한도/무작위 429를 지정해 한도에 걸렸을 때의 동작도 볼 수 있다.
+"최대 동시"는 fake 서버가 실제로 동시에 받은 요청 수의 최댓값이다 (동시 요청 1이면 1이어야 함).
+
+학생 수만큼 답안지/점수표 이미지를 샘플 이미지에 번호를 찍어 만든다 (내용이 달라야 학생마다 다른 응답이 나옴, Pillow 필요).
+비전 캐시와 임베딩 저장소는 끈다 (매 실행이 같은 양의 요청을 보내도록).
+
+사용법:
+    python bench_llm_pipeline.py --students 30 --concurrency 1 4 8 16 --latency lognormal:0.8,0.5
+    python bench_llm_pipeline.py --students 30 --concurrency 8 --rpm 60 --error-rate 0.05
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_images(directory: str, source: str, prefix: str, count: int) -> list:
+    """source 이미지에 번호를 찍은 사본 count장"""
+    from PIL import Image, ImageDraw
+
+    paths = []
+    with Image.open(source) as image:
+        base = image.convert("RGB")
+    for i in range(count):
+        copy = base.copy()
+        ImageDraw.Draw(copy).text((10, 10), f"#{i:04d}", fill=(0, 0, 0))
+        path = os.path.join(directory, f"{prefix}_{i:04d}.png")
+        copy.save(path)
+        paths.append(path)
+    return paths
+
+
+def run_once(args, blank: str, score_paths: list, student_paths: list, concurrency: int) -> dict:
+    import llm_client
+    from analysis_wrapper import perform_analysis
+
+    # 라운드마다 버킷/AIMD 상태와 fake 서버 한도를 새로 시작
+    llm_client.reset()
+
+    started = time.perf_counter()
+    result = perform_analysis(blank, args.rubric, score_paths, student_paths, concurrency)
+    elapsed = time.perf_counter() - started
+
+    stats = llm_client.stats()
+    server = llm_client.fake_backend_stats()
+    return {
+        "elapsed": elapsed,
+        "students": result["totalStudents"],
+        "clusters": sum(len(q["clusters"]) for q in result["questions"]),
+        "requests": sum(s["requests"] for s in stats.values()),
+        "retries": sum(s["retries"] for s in stats.values()),
+        "throttled": sum(s["throttled"] for s in stats.values()),
+        "wait_sec": sum(s["wait_sec"] for s in stats.values()),
+        # 문제지/점수표 배치/답안지/임베딩/클러스터 요약 전부 합쳐 서버가 동시에 받은 최대 요청 수
+        "max_in_flight": server.get("max_in_flight", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fake LLM 백엔드로 분석 파이프라인 전체 벤치마크")
+    parser.add_argument("--students", type=int, default=20, help="학생 수 (답안지/점수표 장 수)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="비교할 동시 요청 수")
+    parser.add_argument("--latency", default=None, help="fake 응답 지연 (예: fixed:0.3, uniform:0.2,1.5, lognormal:0.8,0.5)")
+    parser.add_argument("--rpm", type=int, default=None, help="fake 서버 분당 요청 한도 (넘으면 429)")
+    parser.add_argument("--tpm", type=int, default=None, help="fake 서버 분당 토큰 한도 (넘으면 429)")
+    parser.add_argument("--error-rate", type=float, default=None, help="무작위 429 확률")
+    parser.add_argument("--record-dir", default=None, help="녹화된 응답 디렉터리 (같은 요청이면 재생)")
+    parser.add_argument("--blank", default=os.path.join(BASE_DIR, "문제지.pdf"))
+    parser.add_argument("--rubric", default=os.path.join(BASE_DIR, "채점기준.png"))
+    parser.add_argument("--answer-sample", default=os.path.join(BASE_DIR, "답안지.png"))
+    parser.add_argument("--score-sample", default=os.path.join(BASE_DIR, "점수", "점수.png"))
+    args = parser.parse_args()
+
+    # config를 읽기 전에 환경변수로 넘긴다
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["VISION_CACHE_ENABLED"] = "false"
+    os.environ["EMBEDDING_STORE_ENABLED"] = "false"
+    for name, value in (
+        ("LLM_FAKE_LATENCY", args.latency),
+        ("LLM_FAKE_RPM", args.rpm),
+        ("LLM_FAKE_TPM", args.tpm),
+        ("LLM_FAKE_429_RATE", args.error_rate),
+        ("LLM_RECORD_DIR", args.record_dir),
+    ):
+        if value is not None:
+            os.environ[name] = str(value)
+
+    from config import settings
+
+    work_dir = tempfile.mkdtemp(prefix="bench_llm_")
+    try:
+        print(f"🖼️  이미지 {args.students * 2}장 생성 중...", file=sys.stderr)
+        student_paths = make_images(work_dir, args.answer_sample, "answer", args.students)
+        score_paths = make_images(work_dir, args.score_sample, "score", args.students)
+
+        print(
+            f"🧪 fake 백엔드: 지연 {settings.LLM_FAKE_LATENCY}, RPM {settings.LLM_FAKE_RPM or '무제한'}, "
+            f"TPM {settings.LLM_FAKE_TPM or '무제한'}, 429 확률 {settings.LLM_FAKE_429_RATE}",
+            file=sys.stderr,
+        )
+        rows = []
+        for concurrency in args.concurrency:
+            print(f"\n▶ 동시 요청 {concurrency}개", file=sys.stderr)
+            rows.append((concurrency, run_once(args, args.blank, score_paths, student_paths, concurrency)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n학생 {args.students}명")
+    print(
+        f"{'동시 요청':>8} {'최대 동시':>8} {'소요(초)':>9} {'요청':>6} {'재시도':>6} {'429':>5} {'대기(초)':>9} "
+        f"{'학생':>5} {'클러스터':>8}"
+    )
+    baseline = rows[0][1]["elapsed"] if rows else 0
+    for concurrency, row in rows:
+        speedup = baseline / row["elapsed"] if row["elapsed"] else 0
+        print(
+            f"{concurrency:>8} {row['max_in_flight']:>8} {row['elapsed']:>9.2f} {row['requests']:>6} {row['retries']:>6} {row['throttled']:>5} "
+            f"{row['wait_sec']:>9.2f} {row['students']:>5} {row['clusters']:>8}   x{speedup:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
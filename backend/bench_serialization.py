@@ -0,0 +1,102 @@
+"""
+리포트 JSON 직렬화 벤치마크
+
+답안 5,000개짜리 문항 리포트(오답 전체 포함, 기존 응답 형태)를 만들어서
+1) FastAPI 기본 경로: jsonable_encoder + json.dumps
+2) 표준 json.dumps (+ Decimal default)
+3) serialization.dumps (orjson이 있으면 orjson)
+의 인코딩 시간과 전송 크기(원본 / gzip)를 비교한다. DB 없이 실행된다.
+
+사용법:
+    python bench_serialization.py --answers 5000 --repeat 20
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+from decimal import Decimal
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import serialization
+from serialization import dumps, _default
+from score_distribution import score_bucket_labels
+
+SAMPLE_SENTENCES = [
+    "f'(x)=0 이 되는 x의 값을 구한 뒤 증감표를 그려서 극값을 판단하였다.",
+    "주어진 조건에서 a와 b의 관계식을 세우고 연립하여 해를 구하였다.",
+    "그래프의 개형을 그려 교점의 개수를 세었지만 경계값 처리가 빠졌다.",
+    "부정적분을 계산할 때 적분상수를 빠뜨려서 최종 답이 달라졌다.",
+]
+
+
+def build_report(answer_count: int, max_score: Decimal = Decimal("10.00")) -> dict:
+    rng = random.Random(42)
+    wrong_answers = []
+    for index in range(answer_count):
+        raw_score = Decimal(rng.randint(0, 9)).quantize(Decimal("0.01"))
+        wrong_answers.append({
+            "answer_id": index + 1,
+            "student_code": f"2025{index:05d}",
+            "answer_text": " ".join(rng.choice(SAMPLE_SENTENCES) for _ in range(3)),
+            # 기존 응답은 Decimal을 그대로 두고 인코더에 맡기는 경우를 가정
+            "score": raw_score,
+            "max_score": max_score,
+            "updated_at": datetime(2025, 11, 23, 9, 0, tzinfo=timezone.utc),
+        })
+    return {
+        "question_id": 1,
+        "question_number": 1,
+        "question_text": "다음 함수의 극값을 구하고 그 과정을 서술하시오.",
+        "max_score": max_score,
+        "statistics": {
+            "total_answers": answer_count,
+            "correct_answers": 0,
+            "wrong_answers": answer_count,
+            "correct_rate": 0.0,
+            "histogram": {"labels": score_bucket_labels(max_score), "counts": [0, 0, 0, 0, 0]},
+        },
+        "wrong_answers": wrong_answers,
+        "analysis_result": None,
+    }
+
+
+def measure(encode, payload, repeat: int):
+    """(평균 ms, 결과 bytes)"""
+    body = encode(payload)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode(payload)
+    elapsed = (time.perf_counter() - started) / repeat
+    return elapsed * 1000, body
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="리포트 JSON 직렬화 속도/크기 비교")
+    parser.add_argument("--answers", type=int, default=5000, help="리포트에 담을 답안 수")
+    parser.add_argument("--repeat", type=int, default=20, help="반복 횟수")
+    args = parser.parse_args()
+
+    report = build_report(args.answers)
+
+    encoders = [
+        ("jsonable_encoder + json.dumps", lambda p: json.dumps(jsonable_encoder(p), ensure_ascii=False).encode("utf-8")),
+        ("json.dumps (default=Decimal)", lambda p: json.dumps(p, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")),
+        (f"serialization.dumps ({'orjson' if serialization.USE_ORJSON else 'json'})", dumps),
+    ]
+
+    print(f"답안 {args.answers}개 리포트, {args.repeat}회 평균")
+    print(f"  {'방식':<34} {'인코딩(ms)':>10} {'원본(KB)':>10} {'gzip(KB)':>10}")
+    baseline_ms = None
+    for name, encode in encoders:
+        ms, body = measure(encode, report, args.repeat)
+        # GZipMiddleware 기본 압축 레벨(9)과 같게
+        gzipped = gzip.compress(body, compresslevel=9)
+        baseline_ms = baseline_ms or ms
+        print(f"  {name:<34} {ms:10.2f} {len(body) / 1024:10.1f} {len(gzipped) / 1024:10.1f}   (x{baseline_ms / ms:.1f})")
@@ -0,0 +1,418 @@
+"""
+과거 점수/답안 데이터 일괄 적재 (COPY → 임시 스테이징 테이블 → set-based merge)
+
+ORM으로 한 행씩 쓰는 대신
+1) 입력 파일들을 스트리밍으로 읽어 (학번, 문항 번호, 답안, 점수) 행으로 펼치고
+2) PostgreSQL COPY로 임시 테이블(answer_import_stage)에 적재한 뒤
+3) answer_sheet / answer에 INSERT ... SELECT ... ON CONFLICT 몇 문장으로 합친다.
+한 학기 분량도 한 트랜잭션 안에서 몇 초 안에 끝난다. 중간에 실패하면 아무것도 반영되지 않는다.
+
+지원 형식 (확장자로 판별, --format으로 지정 가능):
+- JSON 배열 (.json): 배열 원소를 하나씩 읽는다 (파일 전체를 메모리에 올리지 않음)
+- JSONL / NDJSON (.jsonl, .ndjson): 한 줄에 레코드 하나
+- CSV (.csv): student_code, question_number, answer_text, score 컬럼 (한 행에 답안 하나)
+
+레코드 형태 (JSON / JSONL):
+- 점수 데이터 (100 samples.json, 답안지 LLM 추출 결과)
+    {"student_code": "2271001", "answers": [{"question_number": 1, "answer_text": "", "score": 3}]}
+- 답안 데이터 (Samples(answers).json)
+    {"exam_id": "2271001", "problems": [{"problem_number": 1, "subparts": [{"contents": [...]}]}]}
+    (exam_id가 학번, 답안 텍스트는 clustering.py와 같은 규칙으로 text/equation 내용을 이어붙인다)
+- 한 행짜리: {"student_code": ..., "question_number": ..., "answer_text": ..., "score": ...}
+
+합치는 규칙:
+- 같은 (학번, 문항)이 여러 번 나오면 뒤에 나온 값이 이긴다. 단 답안/점수 각각 값이 있는 것만 본다.
+  그래서 점수 파일과 답안 파일을 한 번에 넣으면 한 답안으로 합쳐진다.
+- 빈 답안 텍스트와 없는 점수는 "값 없음"으로 보고 기존 값을 덮어쓰지 않는다.
+- 시험에 없는 문항 번호는 건너뛴다 (문제지를 먼저 업로드해야 함).
+
+사용법:
+    python bulk_import.py "100 samples.json" "Samples(answers).json"
+    python bulk_import.py scores.csv --exam-id 2
+    python bulk_import.py answers.jsonl --dry-run    # 적재/검증만 하고 반영하지 않음
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ingest import prepare_question_writes
+from question_stats import rebuild_patterns
+
+# (학번, 문항 번호, 답안 텍스트 또는 None, 점수 또는 None)
+ImportRow = Tuple[str, int, Optional[str], Optional[Decimal]]
+
+STAGE_TABLE = "answer_import_stage"
+MERGED_TABLE = "answer_import_merged"
+READ_CHUNK_SIZE = 1 << 16
+# answer_sheet.student_code 길이 / answer.raw_score 정밀도 (Numeric(5, 2))
+MAX_STUDENT_CODE_LENGTH = 100
+MAX_ABS_SCORE = Decimal("999.99")
+# 출력할 최대 오류 레코드 수
+MAX_REPORTED_ERRORS = 20
+
+
+# ---------------------------------------------------------------------------
+# 입력 읽기
+# ---------------------------------------------------------------------------
+
+def iter_json_array(fp, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[object]:
+    """
+    최상위 JSON 배열의 원소를 하나씩 돌려준다 (청크 단위로 읽어서 디코딩)
+    최상위가 객체면 그 객체 하나를 레코드로 본다
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer += chunk
+        return True
+
+    def skip_whitespace() -> None:
+        nonlocal buffer
+        while True:
+            stripped = buffer.lstrip()
+            if stripped or eof:
+                buffer = stripped
+                return
+            buffer = ""
+            fill()
+
+    skip_whitespace()
+    if not buffer:
+        return
+    if buffer[0] != "[":
+        # 배열이 아니면 남은 내용을 모두 읽어 한 번에 디코딩
+        while fill():
+            pass
+        yield json.loads(buffer)
+        return
+    buffer = buffer[1:]
+
+    while True:
+        skip_whitespace()
+        if not buffer:
+            raise ValueError("JSON 배열이 닫히지 않았습니다.")
+        if buffer[0] == "]":
+            return
+        if buffer[0] == ",":
+            buffer = buffer[1:]
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # 원소가 청크 경계에서 잘렸으면 더 읽어서 다시 시도
+            if not fill():
+                raise
+            continue
+        buffer = buffer[end:]
+        yield item
+
+
+def iter_records(path: str, file_format: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as fp:
+        if file_format == "json":
+            yield from iter_json_array(fp)
+        elif file_format == "jsonl":
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    # 깨진 줄 하나 때문에 전체가 멈추지 않도록 오류를 레코드로 넘긴다 (record_to_rows에서 ValueError)
+                    yield e
+        elif file_format == "csv":
+            yield from csv.DictReader(fp)
+        else:
+            raise ValueError(f"지원하지 않는 형식입니다: {file_format}")
+
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    return "json"
+
+
+def _student_code(value) -> str:
+    code = str(value).strip() if value is not None else ""
+    if not code:
+        raise ValueError("학번(student_code)이 없습니다.")
+    if len(code) > MAX_STUDENT_CODE_LENGTH:
+        raise ValueError(f"학번이 너무 깁니다: {code[:20]}...")
+    return code
+
+
+def _question_number(value) -> int:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"문항 번호가 올바르지 않습니다: {value!r}")
+
+
+def _score(value) -> Optional[Decimal]:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        score = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"점수가 올바르지 않습니다: {value!r}")
+    if not score.is_finite() or abs(score) > MAX_ABS_SCORE:
+        raise ValueError(f"점수 범위를 벗어났습니다: {value!r}")
+    return score
+
+
+def _answer_text(value) -> Optional[str]:
+    # 빈 답안은 "값 없음" (점수 데이터의 answer_text가 비어 있어도 기존 답안을 지우지 않도록)
+    if value is None:
+        return None
+    value = str(value)
+    return value if value.strip() else None
+
+
+def problem_to_text(problem: dict) -> str:
+    """답안 데이터의 problem 하나를 텍스트로 (clustering.exam_to_text와 같은 규칙)"""
+    pieces = []
+    for sub in problem.get("subparts", []):
+        for content in sub.get("contents", []):
+            if content.get("type") == "text":
+                pieces.append(content.get("value", ""))
+            elif content.get("type") == "equation":
+                pieces.append(content.get("latex") or content.get("raw", ""))
+    return "\n".join(pieces)
+
+
+def record_to_rows(record: dict) -> List[ImportRow]:
+    """레코드 하나를 (학번, 문항 번호, 답안, 점수) 행들로 펼친다 (형식이 틀리면 ValueError)"""
+    if isinstance(record, json.JSONDecodeError):
+        raise ValueError(f"JSON 파싱 실패: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("레코드가 객체가 아닙니다.")
+
+    if isinstance(record.get("answers"), list):
+        student_code = _student_code(record.get("student_code") or record.get("student_id"))
+        return [
+            (
+                student_code,
+                _question_number(item.get("question_number")),
+                _answer_text(item.get("answer_text")),
+                _score(item.get("score")),
+            )
+            for item in record["answers"]
+        ]
+
+    if isinstance(record.get("problems"), list):
+        # 답안 데이터는 exam_id 필드에 학번이 들어 있다
+        student_code = _student_code(record.get("student_code") or record.get("exam_id"))
+        return [
+            (student_code, _question_number(problem.get("problem_number")), _answer_text(problem_to_text(problem)), None)
+            for problem in record["problems"]
+        ]
+
+    if "question_number" in record:
+        return [(
+            _student_code(record.get("student_code") or record.get("student_id")),
+            _question_number(record["question_number"]),
+            _answer_text(record.get("answer_text")),
+            _score(record.get("score", record.get("raw_score"))),
+        )]
+
+    raise ValueError("알 수 없는 레코드 형식입니다 (answers / problems / question_number 중 하나가 필요).")
+
+
+# ---------------------------------------------------------------------------
+# 스테이징 + merge
+# ---------------------------------------------------------------------------
+
+def create_stage_table(db: Session) -> None:
+    db.execute(text(
+        f"CREATE TEMP TABLE {STAGE_TABLE} ("
+        " seq bigint NOT NULL,"
+        " student_code varchar(100) NOT NULL,"
+        " question_number integer NOT NULL,"
+        " answer_text text,"
+        " raw_score numeric(5, 2)"
+        ") ON COMMIT DROP"
+    ))
+
+
+def copy_rows(db: Session, rows: Iterable[ImportRow]) -> int:
+    """행들을 COPY ... FROM STDIN으로 스테이징 테이블에 적재 (세션과 같은 트랜잭션)"""
+    driver_connection = db.connection().connection.driver_connection
+    count = 0
+    with driver_connection.cursor() as cursor:
+        with cursor.copy(
+            f"COPY {STAGE_TABLE} (seq, student_code, question_number, answer_text, raw_score) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                count += 1
+                copy.write_row((count, *row))
+    return count
+
+
+def merge_stage(db: Session, exam_id: int) -> dict:
+    """스테이징 테이블을 answer_sheet / answer에 합친다 (commit은 호출하는 쪽에서)"""
+    # (학번, 문항)별로 답안/점수 각각 마지막 값을 고르고 문항 ID를 붙인다
+    db.execute(text(
+        f"CREATE TEMP TABLE {MERGED_TABLE} ON COMMIT DROP AS "
+        "SELECT s.student_code, s.question_number, q.id AS question_id,"
+        " (array_agg(s.answer_text ORDER BY s.seq DESC) FILTER (WHERE s.answer_text IS NOT NULL))[1] AS answer_text,"
+        " (array_agg(s.raw_score ORDER BY s.seq DESC) FILTER (WHERE s.raw_score IS NOT NULL))[1] AS raw_score "
+        f"FROM {STAGE_TABLE} s "
+        "LEFT JOIN question q ON q.exam_id = :exam_id AND q.number = s.question_number "
+        "GROUP BY s.student_code, s.question_number, q.id"
+    ), {"exam_id": exam_id})
+    db.execute(text(f"ANALYZE {MERGED_TABLE}"))
+
+    missing_numbers = db.scalars(text(
+        f"SELECT DISTINCT question_number FROM {MERGED_TABLE} WHERE question_id IS NULL ORDER BY 1"
+    )).all()
+    skipped = db.scalar(text(f"SELECT count(*) FROM {MERGED_TABLE} WHERE question_id IS NULL"))
+    question_ids = db.scalars(text(
+        f"SELECT DISTINCT question_id FROM {MERGED_TABLE} WHERE question_id IS NOT NULL"
+    )).all()
+
+    # 다른 답안 쓰기 경로와 같은 잠금 순서: 문항(data_version) → question_pattern → answer_sheet → answer
+    prepare_question_writes(db, question_ids)
+
+    created_sheets = db.scalar(text(
+        "WITH inserted AS ("
+        " INSERT INTO answer_sheet (exam_id, student_code)"
+        f" SELECT DISTINCT CAST(:exam_id AS integer), student_code FROM {MERGED_TABLE}"
+        " ON CONFLICT (exam_id, student_code) DO NOTHING"
+        " RETURNING 1"
+        ") SELECT count(*) FROM inserted"
+    ), {"exam_id": exam_id})
+
+    inserted, updated = db.execute(text(
+        "WITH upserted AS ("
+        " INSERT INTO answer (exam_id, answer_sheet_id, question_id, answer_text, raw_score)"
+        " SELECT CAST(:exam_id AS integer), sheet.id, m.question_id, coalesce(m.answer_text, ''), m.raw_score"
+        f" FROM {MERGED_TABLE} m"
+        " JOIN answer_sheet sheet ON sheet.exam_id = :exam_id AND sheet.student_code = m.student_code"
+        " WHERE m.question_id IS NOT NULL"
+        " ON CONFLICT ON CONSTRAINT uq_answer_exam_sheet_question DO UPDATE SET"
+        "  answer_text = CASE WHEN excluded.answer_text = '' THEN answer.answer_text ELSE excluded.answer_text END,"
+        "  raw_score = coalesce(excluded.raw_score, answer.raw_score),"
+        "  updated_at = now()"
+        # 바뀌는 값이 없으면 행을 건드리지 않는다
+        " WHERE (excluded.answer_text <> '' AND excluded.answer_text IS DISTINCT FROM answer.answer_text)"
+        "  OR (excluded.raw_score IS NOT NULL AND excluded.raw_score IS DISTINCT FROM answer.raw_score)"
+        " RETURNING (xmax = 0) AS was_inserted"
+        ") SELECT count(*) FILTER (WHERE was_inserted), count(*) FILTER (WHERE NOT was_inserted) FROM upserted"
+    ), {"exam_id": exam_id}).one()
+
+    # 점수가 한꺼번에 바뀌었으므로 누적 통계는 증분 대신 한 번에 다시 계산
+    rebuild_patterns(db, question_ids)
+
+    return {
+        "created_sheets": created_sheets,
+        "inserted_answers": inserted,
+        "updated_answers": updated,
+        "skipped_answers": skipped,
+        "missing_question_numbers": list(missing_numbers),
+        "questions": len(question_ids),
+    }
+
+
+def import_files(db: Session, exam_id: int, paths: List[str], file_format: Optional[str] = None, dry_run: bool = False) -> dict:
+    """파일들을 한 트랜잭션으로 적재 (dry_run이면 스테이징/검증만 하고 rollback)"""
+    errors = []
+    error_count = 0
+
+    def rows() -> Iterator[ImportRow]:
+        nonlocal error_count
+        for path in paths:
+            for index, record in enumerate(iter_records(path, file_format or detect_format(path)), start=1):
+                try:
+                    yield from record_to_rows(record)
+                except (ValueError, AttributeError) as e:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f"{os.path.basename(path)} #{index}: {e}")
+
+    timings = {}
+    started = time.perf_counter()
+    # 대량 적재는 statement_timeout(DB_STATEMENT_TIMEOUT_MS)에 걸리지 않게 이 트랜잭션에서만 끈다
+    db.execute(text("SET LOCAL statement_timeout = 0"))
+    create_stage_table(db)
+    staged = copy_rows(db, rows())
+    db.execute(text(f"ANALYZE {STAGE_TABLE}"))
+    timings["copy_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    summary = {"staged_rows": staged, "error_count": error_count, "errors": errors}
+    if dry_run:
+        db.rollback()
+        return {**summary, "timings": timings}
+
+    started = time.perf_counter()
+    summary.update(merge_stage(db, exam_id))
+    db.commit()
+    timings["merge_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return {**summary, "timings": timings}
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    from exam_scope import resolve_exam_id
+
+    parser = argparse.ArgumentParser(description="점수/답안 데이터를 COPY로 일괄 적재합니다.")
+    parser.add_argument("files", nargs="+", help="입력 파일 (JSON 배열 / JSONL / CSV, 여러 개 가능)")
+    parser.add_argument("--exam-id", type=int, default=None, help="적재할 시험 ID (없으면 현재 시험)")
+    parser.add_argument("--format", choices=["json", "jsonl", "csv"], default=None, help="입력 형식 (없으면 확장자로 판별)")
+    parser.add_argument("--dry-run", action="store_true", help="스테이징/검증만 하고 반영하지 않음")
+    args = parser.parse_args()
+
+    for path in args.files:
+        if not os.path.exists(path):
+            print(f"❌ 오류: '{path}' 파일을 찾을 수 없습니다.")
+            sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        exam_id = resolve_exam_id(db, args.exam_id, create_if_missing=True)
+        result = import_files(db, exam_id, args.files, args.format, args.dry_run)
+        elapsed = time.perf_counter() - started
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 적재 실패 (반영된 내용 없음): {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"시험 {exam_id}: {result['staged_rows']}행 스테이징 ({result['timings']['copy_ms']}ms)")
+    if result["error_count"]:
+        print(f"⚠️ 형식 오류 레코드 {result['error_count']}개 (건너뜀)")
+        for error in result["errors"]:
+            print(f"    {error}")
+    if args.dry_run:
+        print("dry-run: 반영하지 않았습니다.")
+    else:
+        print(
+            f"답안지 {result['created_sheets']}개 생성, 답안 {result['inserted_answers']}개 저장 / "
+            f"{result['updated_answers']}개 갱신, 문항이 없어 건너뛴 답안 {result['skipped_answers']}개 "
+            f"({result['timings']['merge_ms']}ms)"
+        )
+        if result["missing_question_numbers"]:
+            print(f"    DB에 없는 문항 번호: {result['missing_question_numbers']} (문제지를 먼저 업로드하세요)")
+    print(f"총 {elapsed:.2f}초")
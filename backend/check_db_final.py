@@ -8,7 +8,8 @@ print(">>> SCRIPT START", flush=True)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from sqlalchemy import create_engine, text
+    from sqlalchemy import text
+    from database import build_engine, pool_status
     print(">>> SQLAlchemy Imported", flush=True)
 except ImportError as e:
     print(f">>> Import Failed: {e}", flush=True)
@@ -26,14 +27,15 @@ def test():
     print(f">>> Testing Connection to: {DB_URL}", flush=True)
     
     try:
-        # 엔진 생성
-        engine = create_engine(DB_URL)
+        # 엔진 생성 (서버와 같은 풀 설정 사용)
+        engine = build_engine(DB_URL)
         
         # 연결 시도
         with engine.connect() as conn:
             result = conn.execute(text("SELECT version();"))
             version = result.fetchone()[0]
             print(f">>> [SUCCESS] Connected! DB Version: {version}", flush=True)
+            print(f">>> Pool: {pool_status(engine)}", flush=True)
             
     except Exception as e:
         print(f">>> [ERROR] Connection Failed: {e}", flush=True)
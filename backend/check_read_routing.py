@@ -0,0 +1,115 @@
+"""
+읽기 복제본 라우팅 확인 스크립트
+
+DATABASE_URL(primary)과 READ_DATABASE_URL(복제본 또는 두 번째 로컬 인스턴스)을 설정한 상태에서 실행한다.
+서버를 띄우지 않고 main.app에 직접 요청을 보내서
+1) 쿠키 없는 GET은 복제본(X-DB-Route: replica)에서 읽는지
+2) 쓰기 직후(쿠키가 READ_YOUR_WRITES_WINDOW_SEC 안)면 primary에서 읽는지
+3) 창이 지나면 다시 복제본으로 가는지
+4) 읽기 세션에서 쓰기가 막혀 있는지 (default_transaction_read_only)
+를 확인한다. 두 인스턴스가 복제로 연결되어 있지 않아도 라우팅 자체는 확인할 수 있다.
+
+사용법:
+    DATABASE_URL=postgresql://...:5432/realthon_db READ_DATABASE_URL=postgresql://...:5433/realthon_db \\
+        python check_read_routing.py
+    python check_read_routing.py --write    # POST /exams로 실제 시험을 하나 만들어서 read-your-writes 확인
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import httpx
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import settings
+from database import async_engine, read_async_engine, ReadAsyncSessionLocal
+from read_routing import LAST_WRITE_COOKIE, ROUTE_HEADER, ROUTE_PRIMARY, ROUTE_REPLICA
+from main import app
+
+SERVER_INFO_SQL = text(
+    "SELECT coalesce(inet_server_addr()::text, 'local socket'), inet_server_port(), "
+    "pg_is_in_recovery(), current_setting('transaction_read_only')"
+)
+
+
+async def describe(name: str, target_engine) -> None:
+    async with target_engine.connect() as conn:
+        addr, port, in_recovery, read_only = (await conn.execute(SERVER_INFO_SQL)).one()
+    print(f"  {name:<8} {addr}:{port}  recovery={in_recovery}  read_only={read_only}")
+
+
+def check(label: str, response: httpx.Response, expected_route: str) -> bool:
+    route = response.headers.get(ROUTE_HEADER)
+    ok = response.status_code < 400 and route == expected_route
+    print(f"  [{'OK' if ok else 'FAIL'}] {label}: status={response.status_code} {ROUTE_HEADER}={route} (기대값 {expected_route})")
+    return ok
+
+
+async def run(write: bool) -> bool:
+    window = settings.READ_YOUR_WRITES_WINDOW_SEC
+    results = []
+
+    print("DB 연결")
+    await describe("primary", async_engine)
+    await describe("read", read_async_engine)
+
+    print(f"\n라우팅 (read-your-writes 창 {window}초)")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        results.append(check("쿠키 없는 GET /exams", await client.get("/exams"), ROUTE_REPLICA))
+
+        recent = {LAST_WRITE_COOKIE: f"{time.time():.3f}"}
+        results.append(check("최근 쓰기 쿠키 GET /exams", await client.get("/exams", cookies=recent), ROUTE_PRIMARY))
+
+        expired = {LAST_WRITE_COOKIE: f"{time.time() - window - 1:.3f}"}
+        results.append(check("창이 지난 쿠키 GET /exams", await client.get("/exams", cookies=expired), ROUTE_REPLICA))
+
+        if write:
+            created = await client.post("/exams", json={"title": f"read-routing check {int(time.time())}"})
+            has_cookie = LAST_WRITE_COOKIE in created.cookies
+            print(f"  [{'OK' if has_cookie else 'FAIL'}] POST /exams: status={created.status_code} 쓰기 쿠키={has_cookie}")
+            results.append(has_cookie)
+            exam_id = created.json().get("id")
+
+            # httpx 클라이언트가 쿠키를 보관하므로 다음 요청에 자동으로 붙는다
+            response = await client.get("/exams")
+            results.append(check("쓰기 직후 GET /exams", response, ROUTE_PRIMARY))
+            visible = any(exam["id"] == exam_id for exam in response.json())
+            print(f"    새 시험 {exam_id} 보임: {visible}")
+            results.append(visible)
+
+            await asyncio.sleep(window + 0.5)
+            response = await client.get("/exams")
+            results.append(check("창이 지난 뒤 GET /exams", response, ROUTE_REPLICA))
+            visible = any(exam["id"] == exam_id for exam in response.json())
+            print(f"    새 시험 {exam_id} 복제본에서 보임: {visible} (복제로 연결되지 않은 인스턴스면 False가 정상)")
+
+    print("\n읽기 세션 쓰기 차단")
+    async with ReadAsyncSessionLocal() as db:
+        try:
+            await db.execute(text("CREATE TEMP TABLE read_routing_check (id int)"))
+            print("  [FAIL] 읽기 세션에서 쓰기가 허용됨")
+            results.append(False)
+        except Exception as e:
+            print(f"  [OK] 쓰기 거부: {str(e).splitlines()[0]}")
+        await db.rollback()
+
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="읽기 복제본 라우팅 확인")
+    parser.add_argument("--write", action="store_true", help="POST /exams로 시험을 만들어 read-your-writes까지 확인")
+    args = parser.parse_args()
+
+    if read_async_engine is None:
+        print("❌ READ_DATABASE_URL이 설정되어 있지 않습니다.")
+        sys.exit(1)
+
+    ok = asyncio.run(run(args.write))
+    print("\n결과:", "통과" if ok else "실패")
+    sys.exit(0 if ok else 1)
@@ -1,24 +1,31 @@
 import json
 import numpy as np
-from openai import OpenAI
-import base64
-import mimetypes
 import os
-import time
-from openai import RateLimitError
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from config import settings
+from llm_client import chat_completion, create_embeddings
+from embedding_store import embed_texts
+import image_preprocess
+
+try:
+    import tiktoken  # 선택: 임베딩 입력을 실제 토큰 수로 자름 (없으면 UTF-8 바이트 수로)
+except ImportError:
+    tiktoken = None
+
 # .env 파일에서 환경변수 로드
 load_dotenv()
 
-# OpenAI API 키를 환경변수에서 읽어오기
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # ---------- 설정 ----------
 QUESTION_IMAGE_PATH = "문제지.png"   # 문제지 이미지
 RUBRIC_IMAGE_PATH = "채점기준.png"   # 채점 기준 이미지
 
 SIM_THRESHOLD = 0.90               # 클러스터링 기준 유사도
 EMBED_MODEL = "text-embedding-3-large"
+EMBED_DIMENSIONS = None            # None이면 모델 기본 차원 (text-embedding-3-large: 3072)
+EMBED_MAX_INPUT_TOKENS = 8000      # 입력 하나의 최대 토큰 (모델 한도 8191, 넘으면 뒷부분을 자름)
+EMBED_ENCODING = "cl100k_base"     # text-embedding-3-* 토크나이저
 CLUSTER_SUMMARY_MODEL = "gpt-4o-mini"
 MAX_SAMPLES_PER_CLUSTER = 10       # 클러스터당 요약에 쓸 최대 샘플 수
 
@@ -26,14 +33,10 @@ MAX_SAMPLES_PER_CLUSTER = 10       # 클러스터당 요약에 쓸 최대 샘플
 PROBLEM_NUMS = [1, 2, 3]
 # --------------------------
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-
-def encode_image_to_data_url(path: str) -> str:
-    mime = mimetypes.guess_type(path)[0] or "image/png"
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+def encode_image_parts(path: str) -> list:
+    """문제지/채점 기준 이미지 또는 PDF(모든 쪽)를 전처리(image_preprocess)해서 messages에 넣을 image_url 항목 목록으로"""
+    return image_preprocess.document_parts(path, "reference")
 
 
 def exam_to_text(exam: dict) -> str:
@@ -104,12 +107,95 @@ def load_exams(json_path: str, problem_num: int):
 
 
 def get_embeddings(texts):
-    resp = client.embeddings.create(
+    """texts 순서대로 임베딩 행렬 (float32, 임베딩 저장소에 없는 텍스트만 API로 보냄)"""
+    return embed_texts(texts, EMBED_MODEL, EMBED_DIMENSIONS, request_embeddings)
+
+
+_encoding = None
+
+
+def _get_encoding():
+    """tiktoken 인코딩 (없거나 인코딩 파일을 못 받으면 None)"""
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding(EMBED_ENCODING)
+        except Exception:
+            return None
+    return _encoding
+
+
+def embedding_tokens(text):
+    """
+    임베딩 입력 토큰 수: tiktoken이 있으면 실제 값, 없으면 UTF-8 바이트 수
+    (바이트 단위 BPE는 토큰 수가 바이트 수를 넘지 않으므로 항상 상한, 한글은 음절당 3)
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text.encode("utf-8"))
+
+
+def batch_by_tokens(texts, max_tokens, max_inputs):
+    """
+    texts를 순서대로 토큰 수(embedding_tokens) 합이 max_tokens, 개수가 max_inputs를 넘지 않는 구간으로 나눈다
+    Returns: [(start, end), ...]
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = min(embedding_tokens(text), EMBED_MAX_INPUT_TOKENS)
+        if i > start and (tokens + cost > max_tokens or i - start >= max_inputs):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _truncate_for_embedding(text):
+    # 입력 하나가 모델 한도를 넘으면 요청 전체가 400으로 실패하므로 한도 안으로 자른다
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= EMBED_MAX_INPUT_TOKENS:
+            return text
+        return encoding.decode(tokens[:EMBED_MAX_INPUT_TOKENS])
+    data = text.encode("utf-8")
+    if len(data) <= EMBED_MAX_INPUT_TOKENS:
+        return text
+    # 잘린 글자 조각은 버린다
+    return data[:EMBED_MAX_INPUT_TOKENS].decode("utf-8", errors="ignore")
+
+
+def _request_embedding_batch(texts):
+    extra = {"dimensions": EMBED_DIMENSIONS} if EMBED_DIMENSIONS else {}
+    resp = create_embeddings(
+        label=f"embeddings x{len(texts)}",
         model=EMBED_MODEL,
-        input=texts,
+        input=[_truncate_for_embedding(text) for text in texts],
+        **extra,
     )
-    vectors = np.array([item.embedding for item in resp.data])
-    return vectors
+    return np.array([item.embedding for item in sorted(resp.data, key=lambda item: item.index)], dtype=np.float32)
+
+
+def request_embeddings(texts):
+    """
+    토큰 추정치로 묶은 배치들을 동시에 보내고, 입력 순서대로 이어 붙인 float32 행렬을 돌려준다
+    (보내는 속도는 llm_client가 RPM/TPM 한도에 맞춤)
+    """
+    batches = batch_by_tokens(texts, settings.EMBED_BATCH_MAX_TOKENS, settings.EMBED_BATCH_MAX_INPUTS)
+    if not batches:
+        return np.zeros((0, EMBED_DIMENSIONS or 0), dtype=np.float32)
+    if len(batches) == 1:
+        return _request_embedding_batch(list(texts))
+
+    workers = max(1, min(len(batches), settings.EMBED_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(lambda batch: _request_embedding_batch(list(texts[batch[0]:batch[1]])), batches))
+    return np.vstack(parts)
 
 
 def cosine_similarity_matrix(vectors: np.ndarray) -> np.ndarray:
@@ -204,6 +290,7 @@ def describe_clusters_with_openai(
     problem_num: int = 1,
     model=CLUSTER_SUMMARY_MODEL,
     max_samples_per_cluster=MAX_SAMPLES_PER_CLUSTER,
+    workers: int = None,
 ):
     """
     각 클러스터에 대해:
@@ -212,17 +299,16 @@ def describe_clusters_with_openai(
     - 문제 이미지, 채점기준 이미지
     를 함께 넘기고,
     인지적 진단/패턴/정량 분포를 포함한 JSON 분석을 받는다.
+    workers: 동시에 보낼 요청 수 (기본값: ANALYSIS_CONCURRENCY, 1이면 한 클러스터씩)
     """
     id_to_text = dict(zip(exam_ids, texts))
     stats_by_index = {s["cluster_index"]: s for s in stats_per_cluster}
 
     # 문제/채점기준 이미지는 모든 클러스터에서 공통으로 사용
-    question_data_url = encode_image_to_data_url(question_image_path)
-    rubric_data_url = encode_image_to_data_url(rubric_image_path)
-
-    cluster_summaries = []
+    question_images = encode_image_parts(question_image_path)
+    rubric_images = encode_image_parts(rubric_image_path)
 
-    for idx, cluster in enumerate(clusters, start=1):
+    def describe_one(idx, cluster):
         stats = stats_by_index[idx]
         size = stats["size"]
 
@@ -323,55 +409,35 @@ def describe_clusters_with_openai(
 - JSON 이외의 다른 텍스트는 절대 출력하지 마세요.
 """
 
-        # Rate Limit 대응: 재시도 로직
-        max_retries = 5
-        retry_delay = 2  # 초
-        
-        for attempt in range(max_retries):
-            try:
-                resp = client.chat.completions.create(
-                    model=model,
-                    response_format={"type": "json_object"},
-                    messages=[
-                        {"role": "system", "content": system_msg},
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": user_text},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": question_data_url},
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": rubric_data_url},
-                                },
-                            ],
-                        },
+        # 한도/재시도는 llm_client가 맡는다 (429면 Retry-After만큼 기다렸다가 다시 보냄)
+        resp = chat_completion(
+            label=f"problem {problem_num} cluster {idx}",
+            model=model,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_msg},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": user_text},
+                        *question_images,
+                        *rubric_images,
                     ],
-                    max_tokens=900,
-                )
-
-                content = resp.choices[0].message.content
-                summary_obj = json.loads(content)
-                cluster_summaries.append(summary_obj)
-
-                print(f"\n[Cluster {idx}] 특징 요약 완료")
-                
-                # 다음 클러스터 처리 전 짧은 대기 (Rate Limit 방지)
-                if idx < len(clusters):
-                    time.sleep(1)
-                
-                break  # 성공하면 재시도 루프 탈출
-                
-            except RateLimitError as e:
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                    print(f"\n⚠️  Rate Limit 도달. {wait_time}초 후 재시도... (시도 {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    print(f"\n❌ [Cluster {idx}] Rate Limit 에러: 최대 재시도 횟수 초과")
-                    raise  # 최대 재시도 후에도 실패하면 에러 발생
+                },
+            ],
+            max_tokens=900,
+        )
+
+        content = resp.choices[0].message.content
+        summary_obj = json.loads(content)
+
+        print(f"\n[Cluster {idx}] 특징 요약 완료")
+        return summary_obj
+
+    # 클러스터끼리는 서로 독립이라 한꺼번에 보낸다 (보내는 속도는 llm_client가 한도에 맞춤)
+    workers = max(1, min(len(clusters), workers or settings.ANALYSIS_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        cluster_summaries = list(pool.map(describe_one, range(1, len(clusters) + 1), clusters))
 
     return cluster_summaries
 
@@ -5,6 +5,79 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # NDJSON 스트리밍 업로드 시 한 번에 commit할 학생 수
+    INGEST_BATCH_SIZE: int = 500
+    # NDJSON 스트리밍 업로드 본문 최대 크기 (gzip이면 압축 해제 후 기준)와 한 줄 최대 크기
+    INGEST_MAX_BODY_BYTES: int = 1024 * 1024 * 1024
+    INGEST_MAX_LINE_BYTES: int = 1024 * 1024
+    
+    # DB 커넥션 풀 설정 (동기/비동기 엔진 각각에 적용)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # 커넥션을 얻기 위해 기다리는 최대 시간 (초)
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800  # 초, -1이면 재활용하지 않음
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # 0이면 제한 없음
+    # PgBouncer transaction pooling 모드 (prepared statement 끄고, 풀링은 PgBouncer에 맡김)
+    DB_PGBOUNCER_TRANSACTION_MODE: bool = False
+    # 0보다 크면 이 주기(초)마다 풀 상태를 로그로 남김
+    DB_POOL_LOG_INTERVAL_SEC: int = 0
+    # 서버 시작 시 DB 스키마가 Alembic head 리비전인지 확인
+    DB_SCHEMA_CHECK: bool = True
+    # 프로세스마다 메모리에 보관할 문항 리포트 응답 수 (0이면 캐시 안 함)
+    REPORT_CACHE_SIZE: int = 256
+    # orjson이 설치되어 있으면 큰 분석 응답을 orjson으로 직렬화
+    FAST_JSON: bool = True
+    # 이 크기(bytes) 이상인 응답은 gzip 압축 (0이면 압축 안 함)
+    GZIP_MINIMUM_SIZE: int = 1024
+    # 읽기 전용 복제본 URL (비어 있으면 읽기 요청도 DATABASE_URL 사용)
+    READ_DATABASE_URL: str = ""
+    # 쓰기 요청 후 이 시간(초) 동안은 같은 클라이언트의 읽기를 primary로 보냄 (복제 지연 대비)
+    READ_YOUR_WRITES_WINDOW_SEC: float = 5.0
+    # analysis_wrapper.py에서 동시에 보낼 LLM/임베딩 요청 수
+    ANALYSIS_CONCURRENCY: int = 8
+    # LLM 호출 한도 (모델마다 따로 적용, 응답 헤더로 계정 실제 한도가 오면 그 값을 따름)
+    LLM_RPM_LIMIT: int = 500
+    LLM_TPM_LIMIT: int = 200000
+    # 동시 요청 수: 처음 값에서 시작해 성공하면 늘리고 429면 절반으로 (AIMD)
+    LLM_INITIAL_CONCURRENCY: int = 4
+    LLM_MAX_CONCURRENCY: int = 32
+    # 429 / 5xx / 연결 오류 재시도 (지수 백오프 + jitter, Retry-After가 있으면 그 값)
+    LLM_MAX_RETRIES: int = 6
+    LLM_RETRY_BASE_DELAY_SEC: float = 1.0
+    LLM_RETRY_MAX_DELAY_SEC: float = 60.0
+    LLM_HTTP_MAX_CONNECTIONS: int = 32
+    LLM_TIMEOUT_SEC: float = 120.0
+    # 비전 파싱 결과 캐시 (이미지 SHA-256 + 프롬프트 버전 + 모델 + 학번 힌트 → 모델 응답 JSON)
+    VISION_CACHE_ENABLED: bool = True
+    VISION_CACHE_DIR: str = ""  # 비어 있으면 backend/.cache/vision
+    # 임베딩 저장소 (정규화한 텍스트 + 모델 + 차원 → float32 벡터, 없는 텍스트만 API로 보냄)
+    EMBEDDING_STORE_ENABLED: bool = True
+    EMBEDDING_STORE_DIR: str = ""  # 비어 있으면 backend/.cache/embeddings
+    # 임베딩 요청 하나에 담을 추정 토큰 수 / 텍스트 수 (API 한도: 요청당 300k 토큰, 2048개) 와 동시에 보낼 요청 수
+    EMBED_BATCH_MAX_TOKENS: int = 100000
+    EMBED_BATCH_MAX_INPUTS: int = 512
+    EMBED_CONCURRENCY: int = 4
+    # 비전 호출 전 이미지 전처리 (회전/여백 자르기/흑백/축소/재인코딩, Pillow 필요)
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_FORMAT: str = "jpeg"  # jpeg | webp
+    IMAGE_QUALITY: int = 85
+    # 점수표를 한 요청에 몇 장씩 묶어 파싱할지 (1이면 한 장씩)
+    SCORE_BATCH_SIZE: int = 8
+    # LLM 백엔드: openai | fake (fake는 API 키 없이 llm_fake.py가 응답, 벤치마크/오프라인 개발용)
+    LLM_BACKEND: str = "openai"
+    # fake 백엔드 지연 ("0", "fixed:0.3", "uniform:0.2,1.5", "lognormal:중앙값,sigma")
+    LLM_FAKE_LATENCY: str = "lognormal:0.8,0.5"
+    # fake 백엔드 429: 무작위 확률 / 서버 쪽 분당 한도 (0이면 제한 없음)
+    LLM_FAKE_429_RATE: float = 0.0
+    LLM_FAKE_RPM: int = 0
+    LLM_FAKE_TPM: int = 0
+    # 응답 녹화 디렉터리 (openai 백엔드: 실제 응답 저장, fake 백엔드: 같은 요청이면 재생)
+    LLM_RECORD_DIR: str = ""
+    # PDF 페이지 렌더링: 페이지당 픽셀 예산 (배율을 여기에 맞춤) / 프로세스 수 (0이면 CPU 코어 수) / 캐시 위치
+    RASTER_PIXEL_BUDGET: int = 4000000
+    RASTER_WORKERS: int = 0
+    RASTER_CACHE_DIR: str = ""  # 비어 있으면 backend/.cache/pages
     
     class Config:
         env_file = ".env"
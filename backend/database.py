@@ -1,9 +1,14 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
 from dotenv import load_dotenv
 
+from config import settings
+
 # .env 파일 로드 (환경 변수 강제 적용)
 load_dotenv()
 
@@ -14,11 +19,162 @@ DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg://realthon:realthon
 if DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg://")
 
+# 읽기 전용 복제본 (선택, 리포트/조회 GET 요청용)
+READ_DATABASE_URL = settings.READ_DATABASE_URL
+if READ_DATABASE_URL.startswith("postgresql://"):
+    READ_DATABASE_URL = READ_DATABASE_URL.replace("postgresql://", "postgresql+psycopg://")
+
+
+class _PoolWaitStatsMixin:
+    """커넥션을 얻기까지 기다린 시간을 누적하는 풀 (풀 크기 산정용)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total_sec = 0.0
+        self.wait_max_sec = 0.0
+        self.timeout_count = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeout_count += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total_sec += waited
+            self.wait_max_sec = max(self.wait_max_sec, waited)
+
+
+class InstrumentedQueuePool(_PoolWaitStatsMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolWaitStatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_options(is_async: bool, read_only: bool = False) -> dict:
+    """config.Settings의 풀 설정을 create_engine 인자로 변환"""
+    connect_args = {}
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "connect_args": connect_args,
+    }
+
+    if settings.DB_PGBOUNCER_TRANSACTION_MODE:
+        # 트랜잭션마다 서버 커넥션이 바뀔 수 있으므로 서버 측 prepared statement를 쓰지 않는다
+        connect_args["prepare_threshold"] = None
+        # 커넥션 재사용은 PgBouncer가 담당
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+        server_options = []
+        if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+            server_options.append(f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}")
+        if read_only:
+            # 복제본이 아닌 일반 인스턴스를 읽기용으로 붙여도 실수로 쓰지 못하게
+            server_options.append("-c default_transaction_read_only=on")
+        if server_options:
+            connect_args["options"] = " ".join(server_options)
+
+    return options
+
+
+def _apply_statement_timeout_per_transaction(sync_engine):
+    """PgBouncer는 startup options를 받지 않으므로 트랜잭션마다 SET LOCAL로 적용"""
+    if not (settings.DB_PGBOUNCER_TRANSACTION_MODE and settings.DB_STATEMENT_TIMEOUT_MS > 0):
+        return
+
+    @event.listens_for(sync_engine, "begin")
+    def _set_statement_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
+
+
+def _apply_read_only_per_transaction(sync_engine):
+    """PgBouncer 모드에서는 startup options 대신 트랜잭션마다 읽기 전용으로 지정"""
+    if not settings.DB_PGBOUNCER_TRANSACTION_MODE:
+        return
+
+    @event.listens_for(sync_engine, "begin")
+    def _set_read_only(conn):
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+
+def build_engine(url: str = DATABASE_URL):
+    """설정된 풀 옵션으로 동기 엔진 생성 (스크립트에서도 이 함수를 사용)"""
+    new_engine = create_engine(url, **_engine_options(is_async=False))
+    _apply_statement_timeout_per_transaction(new_engine)
+    return new_engine
+
+
+def build_async_engine(url: str = DATABASE_URL, read_only: bool = False):
+    """설정된 풀 옵션으로 비동기 엔진 생성"""
+    new_engine = create_async_engine(url, **_engine_options(is_async=True, read_only=read_only))
+    _apply_statement_timeout_per_transaction(new_engine.sync_engine)
+    if read_only:
+        _apply_read_only_per_transaction(new_engine.sync_engine)
+    return new_engine
+
+
+def pool_status(target_engine) -> dict:
+    """엔진의 커넥션 풀 상태 (checked out / idle / overflow / 대기 시간)"""
+    pool = getattr(target_engine, "sync_engine", target_engine).pool
+    status = {"pool_class": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, _PoolWaitStatsMixin):
+        status["wait"] = {
+            "count": pool.wait_count,
+            "avg_ms": round(pool.wait_total_sec / pool.wait_count * 1000, 3) if pool.wait_count else 0.0,
+            "max_ms": round(pool.wait_max_sec * 1000, 3),
+            "timeouts": pool.timeout_count,
+        }
+    return status
+
+
 # 엔진 생성
-engine = create_engine(DATABASE_URL)
+engine = build_engine()
 
 # 세션 생성기
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 비동기 엔진 (FastAPI 라우터용)
+# psycopg(3)는 같은 postgresql+psycopg:// URL로 async 드라이버를 사용한다
+async_engine = build_async_engine()
+
+# 비동기 세션 생성기 (commit 후에도 응답 직렬화 시 속성을 다시 조회하지 않도록 expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# 읽기 전용 엔진/세션 (READ_DATABASE_URL이 없으면 primary와 같은 세션 생성기)
+read_async_engine = build_async_engine(READ_DATABASE_URL, read_only=True) if READ_DATABASE_URL else None
+ReadAsyncSessionLocal = async_sessionmaker(
+    bind=read_async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+) if read_async_engine is not None else AsyncSessionLocal
+
 # 모델의 기본 클래스
 Base = declarative_base()
\ No newline at end of file
@@ -1,7 +1,26 @@
+from fastapi import Request
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import SessionLocal, AsyncSessionLocal, ReadAsyncSessionLocal, read_async_engine
+from read_routing import choose_read_route, ROUTE_REPLICA
 
-def get_db():
+async def get_db():
+    """라우터용 비동기 DB 세션"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db(request: Request):
+    """
+    조회 전용 비동기 DB 세션 (GET 엔드포인트용)
+    READ_DATABASE_URL이 있으면 복제본, 이 클라이언트가 방금 쓴 경우(read-your-writes)에는 primary
+    """
+    route = choose_read_route(request, replica_available=read_async_engine is not None)
+    request.state.db_route = route
+    session_factory = ReadAsyncSessionLocal if route == ROUTE_REPLICA else AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
+
+def get_sync_db():
+    """동기 DB 세션 (스크립트/동기 코드용)"""
     db = SessionLocal()
     try:
         yield db
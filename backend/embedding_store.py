@@ -0,0 +1,287 @@
+"""
+임베딩 저장소 (텍스트 내용 기준, append-only)
+
+clustering.get_embeddings는 실행할 때마다 모든 답안을 임베딩 API로 보냈다.
+(정규화한 텍스트, 모델, 차원 수) 해시를 키로 벡터를 디스크에 쌓아 두고, 저장소에 없는 텍스트만 API로 보낸다.
+임계값만 바꿔서 다시 분석하면 임베딩 요청이 하나도 나가지 않는다.
+
+모델/차원마다 파일 두 개:
+- {이름}.f32  float32 벡터를 행 단위로 이어 붙인 파일 (읽을 때는 np.memmap)
+- {이름}.idx  키(sha256 hex)를 한 줄에 하나씩, 줄 번호 = .f32 행 번호
+벡터를 먼저 쓰고 키를 나중에 쓰므로, 쓰다가 멈춰도 인덱스가 없는 행을 가리키는 일은 없다.
+다른 프로세스가 덧붙인 키는 조회할 때 .idx의 늘어난 부분만 읽어서 반영한다.
+덧붙이기는 {이름}.lock 파일 잠금(fcntl / Windows는 msvcrt)으로 프로세스 간에 직렬화한다.
+
+사용법:
+    python embedding_store.py --stats    # 모델별 저장된 벡터 수 / 크기
+    python embedding_store.py --clear    # 전부 삭제
+"""
+import os
+import re
+import sys
+import hashlib
+import argparse
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+
+# 여러 프로세스(업로드마다 뜨는 analysis_wrapper)가 동시에 덧붙일 때 쓰는 파일 잠금
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt  # Windows
+except ImportError:
+    msvcrt = None
+
+_CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+# fake 백엔드 벡터가 실제 임베딩 저장소에 섞이지 않도록 따로 둔다
+DEFAULT_STORE_DIR = os.path.join(_CACHE_ROOT, "fake" if settings.LLM_BACKEND.lower() == "fake" else "", "embeddings")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """유니코드 NFC + 연속 공백 하나로 (줄바꿈/들여쓰기만 다른 답안은 같은 키)"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def _lock_file(f) -> None:
+    """잠금 파일 전체에 대한 프로세스 간 배타 잠금 (풀릴 때까지 기다림)"""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK은 10초 동안 재시도하고 못 잡으면 OSError
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def embedding_key(text: str, model: str, dimensions: Optional[int]) -> str:
+    payload = "\x00".join([model, str(dimensions or "default"), normalize_text(text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """모델/차원 하나의 벡터 저장소 (스레드 안전)"""
+
+    def __init__(self, directory: str, model: str, dimensions: Optional[int] = None):
+        self.model = model
+        self.dimensions = dimensions
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{model}-{dimensions or 'default'}")
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        # 프로세스 간 잠금이 없으면 덧붙이지 않는다 (두 프로세스가 서로 쓴 행을 잘라 내면 인덱스가 엉뚱한 벡터를 가리킴)
+        self.writable = fcntl is not None or msvcrt is not None
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._dim: Optional[int] = None
+        self._mmap: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._load_index()
+
+    def _load_index(self) -> None:
+        """.idx에서 아직 안 읽은 부분만 읽는다 (다른 프로세스가 덧붙인 키 포함)"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            tail = f.read()
+        # 마지막 줄이 아직 다 안 써졌으면 다음에 읽는다
+        complete = tail[: tail.rfind(b"\n") + 1]
+        for line in complete.decode("ascii").splitlines():
+            if not line:
+                continue
+            if self._dim is None:
+                # 첫 줄은 차원 수 헤더 ("dim 3072")
+                self._dim = int(line.split()[1])
+                continue
+            self._rows.setdefault(line, len(self._rows))
+        self._index_offset += len(complete)
+
+    def _vectors(self) -> Optional[np.memmap]:
+        """필요한 행까지 덮는 memmap (파일이 커졌으면 다시 연다)"""
+        if self._dim is None or not self._rows:
+            return None
+        needed = len(self._rows)
+        if self._mmap is None or self._mmap.shape[0] < needed:
+            rows = os.path.getsize(self.vectors_path) // (self._dim * 4)
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+        return self._mmap
+
+    def lookup(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._load_index()
+            vectors = self._vectors()
+            found = {}
+            for key in keys:
+                row = self._rows.get(key)
+                if row is not None and vectors is not None and row < vectors.shape[0]:
+                    found[key] = np.array(vectors[row])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def append(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        if not self.writable:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock, open(self.lock_path, "a+b") as lock_file, open(self.index_path, "ab") as index_file:
+            _lock_file(lock_file)
+            try:
+                # 잠근 뒤 다른 프로세스가 쓴 것까지 반영하고 새 키만 덧붙인다
+                self._load_index()
+                # 중간에 멈춘 쓰기가 남긴 덜 쓴 줄은 버린다
+                if os.path.getsize(self.index_path) > self._index_offset:
+                    index_file.truncate(self._index_offset)
+                if self._dim is None:
+                    self._dim = vectors.shape[1]
+                    header = f"dim {self._dim}\n".encode("ascii")
+                    index_file.write(header)
+                    self._index_offset += len(header)
+                if vectors.shape[1] != self._dim:
+                    raise ValueError(f"임베딩 차원이 저장소와 다릅니다: {vectors.shape[1]} != {self._dim}")
+
+                new_rows = []
+                new_keys: Dict[str, None] = {}
+                for key, vector in zip(keys, vectors):
+                    if key in self._rows or key in new_keys:
+                        continue
+                    new_keys[key] = None
+                    new_rows.append(vector)
+                if not new_keys:
+                    return
+
+                # 벡터 파일 끝을 인덱스 행 수에 맞춘 뒤(키를 못 쓰고 멈춘 벡터 제거) 벡터 → 키 순서로 쓴다
+                indexed_bytes = len(self._rows) * self._dim * 4
+                with open(self.vectors_path, "ab") as vectors_file:
+                    if os.path.getsize(self.vectors_path) > indexed_bytes:
+                        vectors_file.truncate(indexed_bytes)
+                    vectors_file.write(np.stack(new_rows).tobytes())
+                    vectors_file.flush()
+                    os.fsync(vectors_file.fileno())
+                payload = "".join(f"{key}\n" for key in new_keys).encode("ascii")
+                index_file.write(payload)
+                index_file.flush()
+                for key in new_keys:
+                    self._rows[key] = len(self._rows)
+                self._index_offset += len(payload)
+            finally:
+                _unlock_file(lock_file)
+
+    def embed(self, texts: Sequence[str], fetch: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        texts 순서대로 float32 임베딩 행렬
+        저장소에 없는 텍스트만 (중복 제거해서) fetch로 받아 저장한다
+        """
+        keys = [embedding_key(text, self.model, self.dimensions) for text in texts]
+        found = self.lookup(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            fetched = np.asarray(fetch(list(missing.values())), dtype=np.float32)
+            self.append(list(missing), fetched)
+            found.update(zip(missing, fetched))
+
+        if not keys:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+            return {"vectors": len(self._rows), "dim": self._dim, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+_stores: Dict[tuple, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def store_directory() -> str:
+    return settings.EMBEDDING_STORE_DIR or DEFAULT_STORE_DIR
+
+
+def store_for(model: str, dimensions: Optional[int] = None) -> EmbeddingStore:
+    with _stores_lock:
+        store = _stores.get((model, dimensions))
+        if store is None:
+            store = _stores[(model, dimensions)] = EmbeddingStore(store_directory(), model, dimensions)
+        return store
+
+
+def format_stats() -> str:
+    """이 프로세스에서의 모델별 저장소 적중 수"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    parts = []
+    for store in stores:
+        total = store.hits + store.misses
+        parts.append(f"{store.model} {store.hits}/{total} 적중 (API로 보낸 텍스트 {store.misses}개)")
+    return ", ".join(parts) if parts else "호출 없음"
+
+
+def embed_texts(
+    texts: Sequence[str],
+    model: str,
+    dimensions: Optional[int],
+    fetch: Callable[[List[str]], np.ndarray],
+) -> np.ndarray:
+    """저장소를 거쳐 임베딩 (EMBEDDING_STORE_ENABLED=false면 전부 fetch)"""
+    if not settings.EMBEDDING_STORE_ENABLED:
+        return np.asarray(fetch(list(texts)), dtype=np.float32)
+    return store_for(model, dimensions).embed(texts, fetch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="임베딩 저장소 관리")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--stats", action="store_true", help="모델별 저장된 벡터 수 / 크기")
+    group.add_argument("--clear", action="store_true", help="저장된 벡터 전부 삭제")
+    args = parser.parse_args()
+
+    directory = store_directory()
+    print(f"저장소 디렉터리: {directory} ({'사용' if settings.EMBEDDING_STORE_ENABLED else '사용 안 함'})")
+    names = sorted(name for name in os.listdir(directory) if name.endswith((".f32", ".idx", ".lock"))) if os.path.isdir(directory) else []
+    if args.clear:
+        for name in names:
+            os.remove(os.path.join(directory, name))
+        print(f"🗑️  파일 {len(names)}개 삭제")
+        sys.exit(0)
+
+    if not names:
+        print("저장된 벡터 없음")
+    for name in names:
+        if not name.endswith(".idx"):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            lines = f.read().count(b"\n")
+        vectors_path = os.path.join(directory, name[:-4] + ".f32")
+        size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+        print(f"  {name[:-4]:<36} {max(lines - 1, 0):>8}개  {size / 1024 / 1024:,.1f} MB")
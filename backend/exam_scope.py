@@ -0,0 +1,120 @@
+"""
+시험(exam) 단위 범위 지정 + answer 파티션 관리
+
+- question / answer_sheet / answer / analysis_results는 모두 exam_id를 가진다
+  (문항 번호, 학번은 시험 안에서만 유일)
+- answer는 exam_id 기준 LIST 파티션 테이블이고 시험마다 answer_exam_{exam_id} 파티션을 만든다
+  exam_id 조건이 붙은 쿼리는 해당 파티션 하나만 읽는다
+- 시험 보관(archive)은 파티션을 분리(DETACH)하는 것으로 처리한다. 분리된 테이블은 그대로 남아 있어서
+  복원(restore) 시 다시 붙이면(ATTACH) 된다. 보관 중에는 누적 통계(question_pattern)로 리포트를 볼 수 있다.
+
+exam_id를 지정하지 않은 요청은 "현재 시험"(보관되지 않은 가장 최근 시험)을 사용한다.
+"""
+from typing import Optional
+
+from sqlalchemy import select, func, text
+from sqlalchemy.orm import Session
+
+from models import Exam, Question
+from report_cache import bump_data_versions
+
+DEFAULT_EXAM_TITLE = "기본 시험"
+# 기본 시험 생성을 직렬화하는 트랜잭션 advisory lock 키 (임의의 고정값)
+DEFAULT_EXAM_LOCK_KEY = 0x45584D31
+
+
+def answer_partition_name(exam_id: int) -> str:
+    return f"answer_exam_{int(exam_id)}"
+
+
+def create_answer_partition(db: Session, exam_id: int) -> None:
+    """시험의 answer 파티션 생성 (이미 있으면 무시)"""
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {answer_partition_name(exam_id)} "
+        f"PARTITION OF answer FOR VALUES IN ({int(exam_id)})"
+    ))
+
+
+def is_partition_attached(db: Session, exam_id: int) -> bool:
+    return bool(db.scalar(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'answer'::regclass AND c.relname = :name)"
+        ),
+        {"name": answer_partition_name(exam_id)},
+    ))
+
+
+def create_exam(db: Session, title: str, **fields) -> Exam:
+    """시험 생성 + answer 파티션 생성 (commit은 호출하는 쪽에서)"""
+    exam = Exam(title=title, **fields)
+    db.add(exam)
+    db.flush()
+    create_answer_partition(db, exam.id)
+    return exam
+
+
+def current_exam(db: Session) -> Optional[Exam]:
+    """보관되지 않은 가장 최근 시험"""
+    return db.scalar(
+        select(Exam).where(Exam.archived_at.is_(None)).order_by(Exam.id.desc()).limit(1)
+    )
+
+
+def resolve_exam_id(db: Session, exam_id: Optional[int] = None, create_if_missing: bool = False) -> int:
+    """
+    요청에 지정된 시험 ID를 확인하거나, 없으면 현재 시험 ID를 반환
+    - 지정한 시험이 없거나 보관된 시험이면 ValueError
+    - create_if_missing: 시험이 하나도 없을 때 기본 시험을 만든다 (업로드 경로용)
+    """
+    if exam_id is not None:
+        exam = db.get(Exam, exam_id)
+        if exam is None:
+            raise ValueError(f"시험을 찾을 수 없습니다: {exam_id}")
+        if exam.archived_at is not None:
+            raise ValueError(f"보관된 시험입니다: {exam_id}")
+        return exam.id
+
+    exam = current_exam(db)
+    if exam is None:
+        if not create_if_missing:
+            raise ValueError("시험이 없습니다.")
+        # 첫 업로드가 동시에 들어와도 기본 시험은 하나만: 잠근 뒤 다시 확인 (잠금은 commit/rollback 때 풀림)
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DEFAULT_EXAM_LOCK_KEY})
+        exam = current_exam(db)
+        if exam is None:
+            exam = create_exam(db, DEFAULT_EXAM_TITLE)
+    return exam.id
+
+
+def _bump_exam_reports(db: Session, exam_id: int) -> None:
+    """파티션을 붙이거나 떼면 오답 목록이 바뀌므로 시험 문항들의 리포트 버전(ETag/캐시 키)을 올린다"""
+    question_ids = db.scalars(select(Question.id).where(Question.exam_id == exam_id)).all()
+    bump_data_versions(db, question_ids)
+
+
+def archive_exam(db: Session, exam: Exam) -> None:
+    """시험 보관: answer 파티션을 분리 (commit은 호출하는 쪽에서)"""
+    if exam.archived_at is not None:
+        return
+    if is_partition_attached(db, exam.id):
+        db.execute(text(f"ALTER TABLE answer DETACH PARTITION {answer_partition_name(exam.id)}"))
+    _bump_exam_reports(db, exam.id)
+    exam.archived_at = func.now()
+
+
+def restore_exam(db: Session, exam: Exam) -> None:
+    """보관 해제: 분리했던 파티션을 다시 붙임 (파티션 테이블이 없으면 새로 만듦)"""
+    if exam.archived_at is None:
+        return
+    partition = answer_partition_name(exam.id)
+    exists = db.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition})
+    if is_partition_attached(db, exam.id):
+        pass
+    elif exists:
+        db.execute(text(f"ALTER TABLE answer ATTACH PARTITION {partition} FOR VALUES IN ({int(exam.id)})"))
+    else:
+        create_answer_partition(db, exam.id)
+    _bump_exam_reports(db, exam.id)
+    exam.archived_at = None
@@ -0,0 +1,346 @@
+"""
+비전 호출 전 이미지 전처리
+
+score.py / parse2.py / test_parse.py / clustering.py는 스캔 원본(수 MB PNG)을 그대로 base64로 보냈다.
+모델은 어차피 긴 변 2048 / 짧은 변 768로 줄여서 보고 512px 타일 수로 과금하므로,
+보내기 전에 여기서 줄이고 다시 인코딩한다.
+
+단계 (문서 종류마다 PROFILES의 픽셀 예산 사용):
+1. rotate     EXIF 방향 정보대로 회전 (휴대폰 촬영본)
+2. flatten    투명 배경을 흰색으로 합침 (JPEG에는 알파 채널이 없음)
+3. crop       바깥 여백 자르기 (배경보다 어두운 부분의 경계 + 약간의 여백)
+4. grayscale  흑백 변환 (글자/채점 표시만 읽으면 됨)
+5. resize     픽셀 예산 안으로 축소 (확대는 안 함)
+6. encode     JPEG / WebP로 다시 인코딩
+마지막으로 512x512 안에 들어가면 detail=low(85토큰), 아니면 high를 고른다.
+
+단계마다 픽셀 데이터 크기(폭 x 높이 x 채널)와 추정 토큰을, 마지막에 실제 전송 바이트를 기록하고
+종류별 합계를 format_stats()로 볼 수 있다.
+Pillow가 없거나 IMAGE_PREPROCESS_ENABLED=false면 원본을 그대로 보낸다.
+"""
+import io
+import sys
+import math
+import base64
+import mimetypes
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+from config import settings
+import rasterize
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 선택 의존성
+    Image = None
+    ImageOps = None
+
+# 전처리 방식이 바뀌면 올릴 것 (비전 캐시 키에 들어감)
+PREPROCESS_VERSION = "pre-v1"
+
+# 모델 쪽 이미지 처리 기준 (detail=high: 2048 안으로 → 짧은 변 768 → 512 타일당 170 + 85)
+MODEL_MAX_LONG_SIDE = 2048
+MODEL_MAX_SHORT_SIDE = 768
+TILE_SIZE = 512
+LOW_DETAIL_TOKENS = 85
+TOKENS_PER_TILE = 170
+
+# 이 값보다 밝은 픽셀은 종이 배경으로 본다 (여백 자르기)
+BACKGROUND_LEVEL = 225
+# 여백을 자를 때 내용 둘레에 남길 여유 (긴 변 대비)
+CROP_PADDING_RATIO = 0.02
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    max_long_side: int
+    max_short_side: int
+    grayscale: bool = True
+    crop: bool = True
+
+
+PROFILES = {
+    # 인쇄된 점수표: 학번과 숫자만 읽으면 된다
+    "score": ImageProfile(max_long_side=1024, max_short_side=512),
+    # 손글씨 답안 / 문제지: 모델이 실제로 보는 해상도까지만
+    "answer": ImageProfile(max_long_side=MODEL_MAX_LONG_SIDE, max_short_side=MODEL_MAX_SHORT_SIDE),
+    "problems": ImageProfile(max_long_side=MODEL_MAX_LONG_SIDE, max_short_side=MODEL_MAX_SHORT_SIDE),
+    # 클러스터 분석에 같이 보내는 문제지 / 채점 기준 이미지
+    "reference": ImageProfile(max_long_side=MODEL_MAX_LONG_SIDE, max_short_side=MODEL_MAX_SHORT_SIDE),
+}
+
+ENCODINGS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """OpenAI 비전 입력 토큰 추정 (detail=low는 크기와 무관하게 85)"""
+    if detail == "low":
+        return LOW_DETAIL_TOKENS
+    scale = min(1.0, MODEL_MAX_LONG_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, MODEL_MAX_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return LOW_DETAIL_TOKENS + TOKENS_PER_TILE * tiles
+
+
+def choose_detail(width: int, height: int) -> str:
+    # 512x512 안에 들어가면 low로 봐도 잃는 픽셀이 없다
+    return "low" if max(width, height) <= TILE_SIZE else "high"
+
+
+@dataclass
+class PreparedImage:
+    data_url: str
+    detail: str
+    original_bytes: int
+    bytes: int
+    original_tokens: int
+    tokens: int
+    # 단계별 기록: {"stage", "size", "mode", "pixel_bytes", "tokens"}
+    stages: List[dict] = field(default_factory=list)
+
+    def content_part(self) -> dict:
+        """chat.completions messages에 넣는 image_url 항목"""
+        return {"type": "image_url", "image_url": {"url": self.data_url, "detail": self.detail}}
+
+
+def _pixel_bytes(image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def _crop_margins(image):
+    gray = image.convert("L")
+    # 배경(밝은 픽셀)은 0, 내용은 255 → 경계 상자
+    mask = gray.point(lambda p: 255 if p < BACKGROUND_LEVEL else 0)
+    bbox = mask.getbbox()
+    if bbox is None:
+        return image
+    pad = int(max(image.size) * CROP_PADDING_RATIO)
+    left, top, right, bottom = bbox
+    return image.crop((
+        max(0, left - pad), max(0, top - pad),
+        min(image.width, right + pad), min(image.height, bottom + pad),
+    ))
+
+
+def _fit(image, profile: ImageProfile):
+    long_side, short_side = max(image.size), min(image.size)
+    scale = min(1.0, profile.max_long_side / long_side, profile.max_short_side / short_side)
+    if scale >= 1.0:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def _flatten(image):
+    """투명 배경(RGBA/P)은 흰 배경으로 합친다 (JPEG에는 알파 채널이 없음)"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_kind: Dict[str, Dict[str, int]] = {}
+
+    def add(self, kind: str, prepared: PreparedImage) -> None:
+        with self._lock:
+            totals = self._by_kind.setdefault(kind, {
+                "images": 0, "original_bytes": 0, "bytes": 0, "original_tokens": 0, "tokens": 0,
+            })
+            totals["images"] += 1
+            totals["original_bytes"] += prepared.original_bytes
+            totals["bytes"] += prepared.bytes
+            totals["original_tokens"] += prepared.original_tokens
+            totals["tokens"] += prepared.tokens
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {kind: dict(totals) for kind, totals in self._by_kind.items()}
+
+
+stats = _Stats()
+_warned_missing_pillow = False
+
+
+def enabled() -> bool:
+    return settings.IMAGE_PREPROCESS_ENABLED and Image is not None
+
+
+def cache_tag(kind: str) -> str:
+    """비전 캐시 키에 붙일 전처리 설정 (설정이 바뀌면 다시 파싱)"""
+    if not enabled():
+        return "raw"
+    profile = PROFILES[kind]
+    return f"{PREPROCESS_VERSION}:{settings.IMAGE_FORMAT}:{settings.IMAGE_QUALITY}:{profile.max_long_side}x{profile.max_short_side}"
+
+
+def _passthrough(data: bytes, mime_type: str) -> PreparedImage:
+    b64 = base64.b64encode(data).decode("utf-8")
+    return PreparedImage(
+        data_url=f"data:{mime_type};base64,{b64}",
+        detail="auto",
+        original_bytes=len(data),
+        bytes=len(data),
+        original_tokens=0,
+        tokens=0,
+    )
+
+
+def prepare_image(source: Union[str, bytes], kind: str, mime_type: Optional[str] = None) -> PreparedImage:
+    """
+    이미지 파일 경로 또는 바이트 → 전처리한 PreparedImage
+    kind: PROFILES 키 (score / answer / problems / reference)
+    """
+    global _warned_missing_pillow
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+        mime_type = mime_type or "image/png"
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+        mime_type = mime_type or mimetypes.guess_type(source)[0] or "image/png"
+
+    if not enabled():
+        if Image is None and settings.IMAGE_PREPROCESS_ENABLED and not _warned_missing_pillow:
+            _warned_missing_pillow = True
+            print("⚠️  Pillow가 없어 이미지 전처리 없이 원본을 보냅니다 (pip install Pillow)", file=sys.stderr)
+        return _passthrough(data, mime_type)
+
+    profile = PROFILES[kind]
+    stages: List[dict] = []
+
+    def record(stage: str, image) -> None:
+        stages.append({
+            "stage": stage,
+            "size": image.size,
+            "mode": image.mode,
+            "pixel_bytes": _pixel_bytes(image),
+            "tokens": estimate_image_tokens(*image.size),
+        })
+
+    with Image.open(io.BytesIO(data)) as opened:
+        opened.load()
+        image = opened
+        record("original", image)
+        original_tokens = stages[0]["tokens"]
+
+        image = ImageOps.exif_transpose(image)
+        record("rotate", image)
+
+        image = _flatten(image)
+        record("flatten", image)
+
+        if profile.crop:
+            image = _crop_margins(image)
+            record("crop", image)
+
+        if profile.grayscale:
+            image = image.convert("L")
+            record("grayscale", image)
+
+        image = _fit(image, profile)
+        record("resize", image)
+
+        pil_format, out_mime = ENCODINGS.get(settings.IMAGE_FORMAT, ENCODINGS["jpeg"])
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, quality=settings.IMAGE_QUALITY, optimize=True)
+        encoded = buffer.getvalue()
+
+    # 다시 인코딩한 결과가 더 크면(이미 작은 JPEG 등) 원본을 보낸다
+    if len(encoded) >= len(data) and stages[-1]["size"] == stages[0]["size"]:
+        prepared = _passthrough(data, mime_type)
+        prepared.original_tokens = prepared.tokens = original_tokens
+        prepared.detail = "high"
+    else:
+        detail = choose_detail(*image.size)
+        prepared = PreparedImage(
+            data_url=f"data:{out_mime};base64,{base64.b64encode(encoded).decode('utf-8')}",
+            detail=detail,
+            original_bytes=len(data),
+            bytes=len(encoded),
+            original_tokens=original_tokens,
+            tokens=estimate_image_tokens(*image.size, detail=detail),
+        )
+    prepared.stages = stages
+    stats.add(kind, prepared)
+    return prepared
+
+
+def image_part(source: Union[str, bytes], kind: str, mime_type: Optional[str] = None) -> dict:
+    """prepare_image → messages에 바로 넣을 image_url 항목"""
+    return prepare_image(source, kind, mime_type).content_part()
+
+
+def document_parts(path: str, kind: str) -> List[dict]:
+    """이미지 파일 또는 PDF(쪽마다 한 장, rasterize) → image_url 항목 목록"""
+    return [image_part(page, kind) for page in rasterize.rasterize(path)]
+
+
+def format_stage_report(prepared: PreparedImage) -> str:
+    """단계별로 줄어든 픽셀 데이터 / 추정 토큰 (이전 단계 대비)"""
+    lines = []
+    previous = None
+    for stage in prepared.stages:
+        width, height = stage["size"]
+        line = f"  {stage['stage']:<10} {width}x{height} {stage['mode']:<4} {stage['pixel_bytes'] / 1024:>9,.0f} KB  {stage['tokens']:>5} 토큰"
+        if previous is not None:
+            line += f"  (-{(previous['pixel_bytes'] - stage['pixel_bytes']) / 1024:,.0f} KB, -{previous['tokens'] - stage['tokens']} 토큰)"
+        lines.append(line)
+        previous = stage
+    lines.append(
+        f"  {'encode':<10} 전송 {prepared.original_bytes / 1024:,.0f} KB → {prepared.bytes / 1024:,.0f} KB, "
+        f"detail={prepared.detail}, 토큰 {prepared.original_tokens} → {prepared.tokens}"
+    )
+    return "\n".join(lines)
+
+
+def format_stats() -> str:
+    parts = []
+    for kind, totals in sorted(stats.snapshot().items()):
+        parts.append(
+            f"{kind} {totals['images']}장 {totals['original_bytes'] / 1024:,.0f}→{totals['bytes'] / 1024:,.0f} KB, "
+            f"토큰 {totals['original_tokens']}→{totals['tokens']}"
+        )
+    return ", ".join(parts) if parts else "처리한 이미지 없음"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="이미지 전처리 결과 확인 (API는 호출하지 않음)")
+    parser.add_argument("images", nargs="+", help="이미지 파일 경로")
+    parser.add_argument("--kind", choices=sorted(PROFILES), default="answer", help="문서 종류 (픽셀 예산)")
+    parser.add_argument("--save", default=None, help="전처리한 이미지를 저장할 디렉터리")
+    args = parser.parse_args()
+
+    if Image is None:
+        print("❌ Pillow가 설치되어 있지 않습니다 (pip install Pillow)")
+        sys.exit(1)
+
+    import os
+
+    for path in args.images:
+        prepared = prepare_image(path, args.kind)
+        print(f"{path} ({args.kind})")
+        print(format_stage_report(prepared))
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+            header, b64 = prepared.data_url.split(",", 1)
+            extension = mimetypes.guess_extension(header[5:].split(";")[0]) or ".bin"
+            out_path = os.path.join(args.save, os.path.splitext(os.path.basename(path))[0] + extension)
+            with open(out_path, "wb") as f:
+                f.write(base64.b64decode(b64))
+            print(f"  저장: {out_path}")
+    print(format_stats())
@@ -0,0 +1,205 @@
+"""
+답안 일괄 저장(bulk upsert) 로직
+
+학생 수(S) × 문항 수(Q) 만큼 SELECT를 반복하던 방식 대신,
+문항 카탈로그 캐시 조회 + 답안지 upsert + 답안 배치 upsert 몇 번으로 끝낸다.
+동시에 같은 student_code가 들어와도 ON CONFLICT로 처리되므로 unique 제약 충돌이 나지 않는다.
+모든 저장은 시험(exam_id) 하나 안에서 이뤄지고, answer는 그 시험의 파티션에만 쓰인다.
+답안이 바뀔 때마다 같은 트랜잭션에서 문항별 누적 통계(question_stats)와 문항 데이터 버전(report_cache)도 함께 갱신한다.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import AnswerSheet, Answer, QuestionPattern
+from schemas import AnswerExtractionResult
+from question_catalog import resolve_question_ids
+from question_stats import lock_patterns, existing_scores, apply_changes
+from report_cache import bump_data_versions
+
+# 한 INSERT 문에 담을 최대 행 수 (PostgreSQL 바인드 파라미터 한도 65535 / 컬럼 수 보다 충분히 작게)
+UPSERT_BATCH_SIZE = 1000
+
+
+def _chunks(rows: List[dict], size: int) -> Iterable[List[dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def upsert_answer_sheets(db: Session, exam_id: int, student_codes: Iterable[str], batch_size: int = UPSERT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    시험의 student_code 목록을 INSERT ... ON CONFLICT (exam_id, student_code)로 저장하고
+    student_code → answer_sheet.id 매핑을 반환
+    """
+    # 잠금 순서를 고정해서 동시 업로드 간 데드락을 피한다
+    codes = sorted(set(student_codes))
+    sheet_ids: Dict[str, int] = {}
+
+    for batch in _chunks([{"exam_id": exam_id, "student_code": code} for code in codes], batch_size):
+        stmt = pg_insert(AnswerSheet).values(batch)
+        # DO NOTHING이면 기존 행의 id가 RETURNING에 나오지 않으므로 DO UPDATE로 처리
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnswerSheet.exam_id, AnswerSheet.student_code],
+            set_={"updated_at": func.now()},
+        ).returning(AnswerSheet.student_code, AnswerSheet.id)
+        for student_code, sheet_id in db.execute(stmt):
+            sheet_ids[student_code] = sheet_id
+
+    return sheet_ids
+
+
+def _dedupe_answer_rows(rows: List[dict]) -> List[dict]:
+    # 한 문장 안에서 같은 키가 두 번 나오면 ON CONFLICT가 실패하므로 마지막 값만 남긴다
+    deduped = {(row["answer_sheet_id"], row["question_id"]): row for row in rows}
+    return [deduped[key] for key in sorted(deduped)]
+
+
+def upsert_answers(db: Session, rows: List[dict], batch_size: int = UPSERT_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    Answer 행들을 uq_answer_exam_sheet_question 기준으로 배치 upsert
+    (문항별 누적 통계는 갱신하지 않으므로 보통은 upsert_answers_with_stats를 사용)
+
+    rows: {"exam_id", "answer_sheet_id", "question_id", "answer_text", "raw_score"} 딕셔너리 목록
+    Returns: (새로 저장된 수, 업데이트된 수)
+    """
+    ordered = _dedupe_answer_rows(rows)
+
+    inserted = updated = 0
+    for batch in _chunks(ordered, batch_size):
+        stmt = pg_insert(Answer).values(batch)
+        # RETURNING xmax = 0: 새로 INSERT된 행이면 true, 기존 행이 UPDATE됐으면 false
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_answer_exam_sheet_question",
+            set_={
+                "answer_text": stmt.excluded.answer_text,
+                "raw_score": stmt.excluded.raw_score,
+                "updated_at": func.now(),
+            },
+        ).returning(literal_column("xmax = 0"))
+        for (was_inserted,) in db.execute(stmt):
+            if was_inserted:
+                inserted += 1
+            else:
+                updated += 1
+
+    return inserted, updated
+
+
+def prepare_question_writes(db: Session, question_ids: Iterable[int]) -> Dict[int, QuestionPattern]:
+    """
+    문항별 답안을 쓰기 전에 호출: 문항 데이터 버전을 올리고 누적 통계 행을 잠근다
+    잠금 순서(question → question_pattern → answer_sheet → answer)를 모든 쓰기 경로에서 같게 유지한다
+    """
+    question_ids = sorted(set(question_ids))
+    bump_data_versions(db, question_ids)
+    return lock_patterns(db, question_ids)
+
+
+def upsert_answers_with_stats(
+    db: Session,
+    exam_id: int,
+    rows: List[dict],
+    batch_size: int = UPSERT_BATCH_SIZE,
+    patterns: Optional[Dict[int, QuestionPattern]] = None,
+) -> Tuple[int, int]:
+    """
+    upsert_answers + 문항별 누적 통계 / 데이터 버전 갱신
+    관련 문항의 통계 행을 먼저 잠근 뒤 기존 점수를 읽으므로, 같은 문항에 동시에 쓰는 요청이 있어도 누적값이 맞는다
+    patterns: 이미 prepare_question_writes로 잠근 경우 그 결과
+    """
+    rows = _dedupe_answer_rows([{**row, "exam_id": exam_id} for row in rows])
+    if not rows:
+        return 0, 0
+
+    if patterns is None:
+        patterns = prepare_question_writes(db, (row["question_id"] for row in rows))
+    before = existing_scores(db, exam_id, ((row["answer_sheet_id"], row["question_id"]) for row in rows))
+
+    inserted, updated = upsert_answers(db, rows, batch_size)
+
+    apply_changes(
+        patterns,
+        removed=[(question_id, score) for (_, question_id), score in before.items()],
+        added=[(row["question_id"], row["raw_score"]) for row in rows],
+    )
+    return inserted, updated
+
+
+def delete_answer_sheet(db: Session, exam_id: int, student_code: str) -> Optional[int]:
+    """
+    시험의 학생 답안지와 답안을 삭제하고 문항별 누적 통계에서 빼준다 (commit은 호출하는 쪽에서)
+    Returns: 삭제된 답안 수 (답안지가 없으면 None)
+    """
+    sheet_id = db.scalar(
+        select(AnswerSheet.id).where(AnswerSheet.exam_id == exam_id, AnswerSheet.student_code == student_code)
+    )
+    if sheet_id is None:
+        return None
+
+    sheet_answers = select(Answer.question_id, Answer.raw_score).where(
+        Answer.exam_id == exam_id, Answer.answer_sheet_id == sheet_id
+    )
+    question_ids = [question_id for question_id, _ in db.execute(sheet_answers)]
+    patterns = prepare_question_writes(db, question_ids)
+    # 통계 행을 잠근 뒤에 다시 읽어야 그 사이 바뀐 점수까지 정확히 뺄 수 있다
+    removed = db.execute(sheet_answers).all()
+
+    # answer / llm_analyses는 FK ON DELETE CASCADE로 함께 삭제된다
+    db.execute(delete(AnswerSheet).where(AnswerSheet.id == sheet_id))
+
+    apply_changes(patterns, removed=[(question_id, score) for question_id, score in removed if question_id in patterns])
+    return len(removed)
+
+
+def bulk_upsert_extraction_results(db: Session, exam_id: int, extraction_results: List[AnswerExtractionResult]) -> dict:
+    """
+    답안지 LLM 추출 결과들을 시험(exam_id)에 한 번에 저장 (commit은 호출하는 쪽에서)
+    문항 번호는 프로세스 단위 문항 카탈로그 캐시(시험별)로 변환한다
+
+    Returns:
+        {
+            "uploaded_sheets": [{"student_code": ..., "answers_count": ...}, ...],
+            "inserted_answers": 새로 저장된 답안 수,
+            "updated_answers": 업데이트된 답안 수,
+            "skipped_answers": 문항이 없어 저장하지 않은 답안 수
+        }
+    """
+    question_ids = resolve_question_ids(
+        db, exam_id, (item.question_number for result in extraction_results for item in result.answers)
+    )
+    # 답안지 upsert보다 먼저 문항 쪽 잠금을 잡는다 (prepare_question_writes 참고)
+    patterns = prepare_question_writes(db, question_ids.values())
+    sheet_ids = upsert_answer_sheets(db, exam_id, (result.student_code for result in extraction_results))
+
+    answer_rows = []
+    skipped = 0
+    for result in extraction_results:
+        answer_sheet_id = sheet_ids[result.student_code]
+        for answer_item in result.answers:
+            question_id = question_ids.get(answer_item.question_number)
+            if question_id is None:
+                skipped += 1
+                continue  # 문항이 없으면 스킵
+            answer_rows.append({
+                "answer_sheet_id": answer_sheet_id,
+                "question_id": question_id,
+                "answer_text": answer_item.answer_text,
+                "raw_score": answer_item.score,
+            })
+
+    inserted, updated = upsert_answers_with_stats(db, exam_id, answer_rows, patterns=patterns)
+
+    return {
+        "uploaded_sheets": [
+            {
+                "student_code": result.student_code,
+                "answers_count": len(result.answers),
+            }
+            for result in extraction_results
+        ],
+        "inserted_answers": inserted,
+        "updated_answers": updated,
+        "skipped_answers": skipped,
+    }
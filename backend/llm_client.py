@@ -0,0 +1,438 @@
+"""
+공용 OpenAI 클라이언트 + 요청 스케줄러
+
+score.py / parse2.py / test_parse.py / clustering.py가 각자 OpenAI 클라이언트를 만들고
+clustering만 RateLimitError를 재시도하던 것을 여기로 모았다.
+
+- 클라이언트는 프로세스에 하나 (httpx 커넥션 풀 공유, SDK 자체 재시도는 끄고 여기서 재시도)
+- 모델마다 요청 수(RPM) / 토큰 수(TPM) 토큰 버킷으로 보내는 속도를 맞춘다
+  응답의 x-ratelimit-* 헤더에 계정 실제 한도가 오면 그 값으로 버킷을 다시 맞춘다
+- 동시 요청 수는 AIMD로 조절 (성공하면 조금씩 늘리고, 429가 오면 절반으로 줄임)
+- 429 / 5xx / 연결 오류는 Retry-After(없으면 지수 백오프 + jitter)만큼 기다렸다가 재시도
+  429의 Retry-After 동안은 같은 모델의 다른 요청도 새로 보내지 않는다
+- LLM_BACKEND=fake면 실제 API 대신 llm_fake의 가짜 응답 (API 키 없이 파이프라인 전체 실행/벤치마크)
+
+사용법:
+    from llm_client import chat_completion, create_embeddings
+    resp = chat_completion(model="gpt-4o", messages=[...], max_tokens=900)
+"""
+import os
+import re
+import sys
+import math
+import time
+import random
+import threading
+from typing import Callable, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+from openai import OpenAI, APIConnectionError, APIStatusError, RateLimitError
+
+from config import settings
+
+load_dotenv()
+
+# 이미지 한 장을 토큰으로 얼마나 셀지 (high detail 512px 타일 4장 + 기본 85 기준, 응답의 usage로 다시 맞춘다)
+IMAGE_TOKEN_ESTIMATE = 765
+LOW_DETAIL_IMAGE_TOKENS = 85
+# max_tokens를 안 준 요청의 출력 토큰 추정치
+DEFAULT_COMPLETION_TOKENS = 1000
+# 글자당 토큰 수 (TPM 버킷용 평균 추정치, 한글은 음절당 1토큰을 넘기도 하므로 입력 한도 검사에는 쓰지 말 것
+# → 임베딩 입력 자르기는 clustering.embedding_tokens)
+TOKENS_PER_CHAR = 1.0
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """x-ratelimit-reset-* 형식("20ms", "1s", "6m0s") 또는 초 숫자 → 초"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """429 응답에서 기다릴 시간 (retry-after-ms > retry-after > x-ratelimit-reset-*)"""
+    if headers is None:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = _parse_duration(headers.get("retry-after"))
+    if retry_after is not None:
+        return retry_after
+    resets = [
+        _parse_duration(headers.get(name))
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def estimate_text_tokens(text: str) -> int:
+    return int(math.ceil(len(text) * TOKENS_PER_CHAR))
+
+
+def estimate_tokens(kwargs: dict) -> int:
+    """요청이 TPM에서 차지할 토큰 추정치 (입력 + max_tokens)"""
+    chars = 0
+    image_tokens = 0
+
+    def visit(content):
+        nonlocal chars, image_tokens
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict) and part.get("type") == "image_url":
+                    low = (part.get("image_url") or {}).get("detail") == "low"
+                    image_tokens += LOW_DETAIL_IMAGE_TOKENS if low else IMAGE_TOKEN_ESTIMATE
+                elif isinstance(part, dict):
+                    visit(part.get("text", ""))
+                else:
+                    visit(part)
+
+    for message in kwargs.get("messages", []):
+        visit(message.get("content", ""))
+    if "input" in kwargs:
+        visit(kwargs["input"])
+        completion = 0
+    else:
+        completion = kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+
+    return int(math.ceil(chars * TOKENS_PER_CHAR)) + image_tokens + completion
+
+
+class TokenBucket:
+    """
+    분당 한도 토큰 버킷 (스레드 안전)
+    reserve()는 바로 차감하고 기다려야 할 시간을 돌려준다 (잔량이 음수가 될 수 있음 → 먼저 온 요청 순서 유지)
+    """
+
+    def __init__(self, per_minute: float):
+        self._lock = threading.Lock()
+        self.per_minute = float(per_minute)
+        self._tokens = self.per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        rate = self.per_minute / 60.0
+        self._tokens = min(self.per_minute, self._tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        if self.per_minute <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # 한도보다 큰 요청은 한도만큼만 차감 (영원히 못 보내는 일이 없도록)
+            self._tokens -= min(amount, self.per_minute)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / (self.per_minute / 60.0)
+
+    def credit(self, amount: float) -> None:
+        """추정치와 실제 사용량 차이를 돌려주거나(+) 더 뺀다(-)"""
+        if self.per_minute <= 0 or not amount:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.per_minute, self._tokens + amount)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float]) -> None:
+        """응답 헤더의 실제 한도 / 남은 양으로 맞춘다 (서버가 남았다고 한 것보다 많이 들고 있지 않도록)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if limit and limit > 0 and limit != self.per_minute:
+                self.per_minute = float(limit)
+            if remaining is not None and remaining < self._tokens:
+                self._tokens = float(remaining)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 동시 요청 수 제한
+    - 성공: limit += 1 / limit (limit개가 성공할 때마다 1씩 증가)
+    - 429: limit /= 2 (동시에 여러 개가 429를 받아도 한 번만 줄이도록 cooldown 동안은 무시)
+      그리고 Retry-After 동안은 새 요청을 보내지 않는다
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self._cond = threading.Condition()
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self._cond.wait()
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            before = int(self.limit)
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            if int(self.limit) > before:
+                self._cond.notify()
+
+    def on_throttle(self, pause_sec: float) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease > max(pause_sec, 1.0):
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = now
+            self._paused_until = max(self._paused_until, now + pause_sec)
+            self._cond.notify_all()
+
+
+class RequestScheduler:
+    """모델 하나의 RPM/TPM 버킷 + 동시 요청 수 + 재시도"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.requests = TokenBucket(settings.LLM_RPM_LIMIT)
+        self.tokens = TokenBucket(settings.LLM_TPM_LIMIT)
+        self.concurrency = AdaptiveConcurrency(
+            initial=min(settings.LLM_INITIAL_CONCURRENCY, settings.LLM_MAX_CONCURRENCY),
+            maximum=settings.LLM_MAX_CONCURRENCY,
+        )
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "tokens": 0, "wait_sec": 0.0}
+
+    def _count(self, **deltas) -> None:
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def _sync_limits(self, headers) -> None:
+        def number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        self.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"))
+        self.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"))
+
+    def _wait_for_budget(self, estimated_tokens: int) -> None:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            self._count(wait_sec=wait)
+            time.sleep(wait)
+
+    def run(self, send: Callable, estimated_tokens: int, label: str = ""):
+        """
+        send(): with_raw_response 호출 (헤더를 보기 위해) → 파싱된 응답 반환
+        재시도할 수 없는 오류(400, 401, insufficient_quota 등)는 그대로 올린다
+        """
+        label = label or self.model
+        attempt = 0
+        while True:
+            self._wait_for_budget(estimated_tokens)
+            self.concurrency.acquire()
+            try:
+                raw = send()
+            except Exception as e:
+                self.concurrency.release()
+                delay = self._retry_delay(e, attempt)
+                # 실패한 요청이 쓰지 않은 토큰은 돌려준다 (429는 서버에서도 차감되지 않음)
+                self.tokens.credit(estimated_tokens)
+                if delay is None or attempt >= settings.LLM_MAX_RETRIES:
+                    self._count(errors=1)
+                    raise
+                attempt += 1
+                self._count(retries=1)
+                print(
+                    f"⚠️  [{label}] {type(e).__name__}: {delay:.1f}초 후 재시도 ({attempt}/{settings.LLM_MAX_RETRIES})",
+                    file=sys.stderr,
+                )
+                time.sleep(delay)
+                continue
+
+            self.concurrency.release()
+            self.concurrency.on_success()
+            self._sync_limits(raw.headers)
+            response = raw.parse()
+
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", None) if usage is not None else None
+            if used is not None:
+                self.tokens.credit(estimated_tokens - used)
+            self._count(requests=1, tokens=used or estimated_tokens)
+            return response
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """재시도까지 기다릴 시간 (None이면 재시도 안 함)"""
+        backoff = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY_SEC, settings.LLM_RETRY_BASE_DELAY_SEC * (2 ** attempt)))
+
+        if isinstance(error, RateLimitError):
+            # 한도 초과가 아니라 잔액 부족이면 기다려도 소용없다
+            if getattr(error, "code", None) == "insufficient_quota":
+                return None
+            retry_after = retry_after_seconds(error.response.headers)
+            self._count(throttled=1)
+            pause = retry_after if retry_after is not None else backoff
+            self.concurrency.on_throttle(pause)
+            # 모두 같은 순간에 다시 몰리지 않도록 jitter를 더한다
+            return pause + random.uniform(0, min(1.0, 0.1 * pause + 0.1))
+
+        if isinstance(error, APIStatusError):
+            if error.status_code not in RETRYABLE_STATUS:
+                return None
+            retry_after = retry_after_seconds(error.response.headers)
+            return max(retry_after or 0.0, backoff)
+
+        if isinstance(error, APIConnectionError):  # APITimeoutError 포함
+            return backoff
+
+        return None
+
+
+_client: Optional[OpenAI] = None
+# LLM_BACKEND=fake일 때의 가짜 서버 (backend_stats용)
+_fake_transport = None
+_client_lock = threading.Lock()
+_schedulers: Dict[str, RequestScheduler] = {}
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=60.0,
+    )
+
+
+def get_client() -> OpenAI:
+    """프로세스 공용 OpenAI 클라이언트 (처음 호출할 때 생성)"""
+    global _client, _fake_transport
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                backend = settings.LLM_BACKEND.lower()
+                transport = None
+                if backend == "fake":
+                    # 네트워크 없이 llm_fake가 응답 (키 불필요, 스케줄러/재시도 경로는 그대로)
+                    from llm_fake import FakeOpenAITransport
+                    api_key = "sk-fake"
+                    transport = _fake_transport = FakeOpenAITransport()
+                elif backend == "openai":
+                    api_key = os.getenv("OPENAI_API_KEY")
+                    if not api_key:
+                        raise ValueError("OPENAI_API_KEY 환경변수가 설정되지 않았습니다.")
+                    if settings.LLM_RECORD_DIR:
+                        from llm_fake import RecordingTransport
+                        transport = RecordingTransport(
+                            httpx.HTTPTransport(limits=_http_limits()), settings.LLM_RECORD_DIR
+                        )
+                else:
+                    raise ValueError(f"알 수 없는 LLM_BACKEND: {settings.LLM_BACKEND} (openai | fake)")
+                http_client = httpx.Client(
+                    timeout=httpx.Timeout(settings.LLM_TIMEOUT_SEC, connect=10.0),
+                    limits=_http_limits(),
+                    transport=transport,
+                    follow_redirects=True,
+                )
+                # 재시도는 RequestScheduler가 한다 (SDK 재시도와 겹치면 429 때 요청이 배로 늘어남)
+                _client = OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+    return _client
+
+
+def scheduler_for(model: str) -> RequestScheduler:
+    with _client_lock:
+        scheduler = _schedulers.get(model)
+        if scheduler is None:
+            scheduler = _schedulers[model] = RequestScheduler(model)
+        return scheduler
+
+
+def chat_completion(label: str = "", **kwargs):
+    """client.chat.completions.create와 같은 인자 (한도/재시도 적용)"""
+    client = get_client()
+    return scheduler_for(kwargs["model"]).run(
+        lambda: client.chat.completions.with_raw_response.create(**kwargs),
+        estimate_tokens(kwargs),
+        label,
+    )
+
+
+def create_embeddings(label: str = "", **kwargs):
+    """client.embeddings.create와 같은 인자 (한도/재시도 적용)"""
+    client = get_client()
+    return scheduler_for(kwargs["model"]).run(
+        lambda: client.embeddings.with_raw_response.create(**kwargs),
+        estimate_tokens(kwargs),
+        label,
+    )
+
+
+def stats() -> dict:
+    """모델별 요청/재시도/429 횟수, 현재 동시 요청 한도, 버킷 잔량"""
+    with _client_lock:
+        schedulers = list(_schedulers.values())
+    return {
+        s.model: {
+            **s.stats,
+            "wait_sec": round(s.stats["wait_sec"], 2),
+            "concurrency_limit": round(s.concurrency.limit, 2),
+            "rpm_limit": s.requests.per_minute,
+            "tpm_limit": s.tokens.per_minute,
+        }
+        for s in schedulers
+    }
+
+
+def fake_backend_stats() -> dict:
+    """fake 서버가 받은 요청/429/재생 횟수와 최대 동시 요청 수 (fake 백엔드가 아니면 빈 dict)"""
+    transport = _fake_transport
+    if transport is None:
+        return {}
+    with transport._lock:
+        return dict(transport.stats)
+
+
+def reset() -> None:
+    """클라이언트와 모델별 스케줄러 상태(버킷/동시 요청 한도/통계)를 버린다 (벤치마크 반복 실행용)"""
+    global _client, _fake_transport
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _fake_transport = None
+        _schedulers.clear()
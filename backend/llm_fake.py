@@ -0,0 +1,397 @@
+"""
+오프라인 LLM 백엔드 (OpenAI API 흉내)
+
+LLM_BACKEND=fake로 두면 llm_client의 공용 클라이언트가 네트워크 대신 이 모듈의 httpx transport로 요청을 보낸다.
+OpenAI SDK → RequestScheduler(버킷/AIMD/재시도) → HTTP 응답 파싱까지 실제 경로를 그대로 타므로,
+API 키 없이도 파이프라인 전체(analysis_wrapper, clustering.run_for_problem, 파싱 스크립트)를 돌리고
+동시 요청 수 / 한도 초과 대응을 부하 시험할 수 있다.
+
+- 지연: LLM_FAKE_LATENCY ("0", "fixed:0.3", "uniform:0.2,1.5", "lognormal:0.8,0.5" → 중앙값 0.8초)
+- 429: LLM_FAKE_429_RATE 확률로 무작위 429, LLM_FAKE_RPM / LLM_FAKE_TPM을 넘으면 서버처럼 429 (retry-after-ms 포함)
+  성공 응답에는 x-ratelimit-* 헤더를 붙인다
+- 응답: LLM_RECORD_DIR에 녹화된 응답이 있으면 재생, 없으면 요청 내용으로 만든 결정적인 응답
+  (같은 요청이면 항상 같은 응답, 임베딩은 글자 3-gram 해싱이라 비슷한 답안은 비슷한 벡터)
+  LLM_BACKEND=openai + LLM_RECORD_DIR이면 실제 응답을 녹화한다
+
+사용법:
+    LLM_BACKEND=fake LLM_FAKE_LATENCY=lognormal:0.8,0.5 LLM_FAKE_RPM=300 python analysis_wrapper.py ...
+    python llm_fake.py --port 8089    # 다른 프로세스용 스텁 서버 (OPENAI_BASE_URL=http://127.0.0.1:8089/v1)
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from typing import Optional, Tuple
+
+import httpx
+import numpy as np
+
+from config import settings
+
+FAKE_EMBED_DIMENSIONS = {"text-embedding-3-large": 3072, "text-embedding-3-small": 1536}
+# 결정적 응답에서 만들 문항 수 / 배점
+FAKE_PROBLEM_SCORES = [40, 30, 30]
+
+_IMAGE_MARKER = re.compile(r"\[이미지 (\d+)\]")
+_REQUIRED_CODE = re.compile(r'student_code 필드에는 반드시 "([^"]+)"')
+
+
+def request_key(body: dict) -> str:
+    """녹화/재생 키 (요청 본문 전체, 키 순서 무관)"""
+    return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def parse_latency(spec: str):
+    """LLM_FAKE_LATENCY 문자열 → 초를 돌려주는 함수"""
+    spec = (spec or "0").strip()
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    seconds = float(kind)
+    return lambda: seconds
+
+
+def _seed(*parts) -> int:
+    digest = hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def fake_embedding(text: str, dimensions: int) -> list:
+    """글자 3-gram을 차원에 해싱한 단위 벡터 (겹치는 글자가 많을수록 코사인 유사도가 높다)"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    padded = f"  {text or ''}  "
+    for i in range(len(padded) - 2):
+        h = _seed(padded[i:i + 3])
+        vector[h % dimensions] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[_seed(text) % dimensions] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+def _prompt_text(messages: list) -> Tuple[str, list]:
+    """메시지의 텍스트 전체와 이미지 URL 목록"""
+    texts, images = [], []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                images.append((part.get("image_url") or {}).get("url", ""))
+    return "\n".join(texts), images
+
+
+def _student_code(image_url: str) -> str:
+    return str(2200000 + _seed("student", image_url) % 100000)
+
+
+def _answers(image_url: str, with_text: bool) -> list:
+    rng = random.Random(_seed("answers", image_url))
+    answers = []
+    for number, max_score in enumerate(FAKE_PROBLEM_SCORES, start=1):
+        # 만점 / 부분점수 / 0점이 섞이도록
+        score = rng.choice([max_score, max_score, rng.randint(0, max_score - 1), 0])
+        text = ""
+        if with_text:
+            steps = rng.sample(["x^2 - 4x + 3 = 0", "(x-1)(x-3) = 0", "x = 1, 3", "판별식 D > 0",
+                                "기울기 m = 4/3", "y = -3/4 x + 8", "따라서 (0, 8)", "k^2 < 4"], k=3)
+            text = " ".join(steps)
+        answers.append({"question_number": number, "answer_text": text, "score": score})
+    return answers
+
+
+def _last_json_example(text: str) -> Optional[dict]:
+    """프롬프트에 들어 있는 JSON 예시 중 마지막으로 파싱되는 것"""
+    decoder = json.JSONDecoder()
+    found = None
+    for match in re.finditer(r"\{", text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            found = value
+    return found
+
+
+def fake_chat_content(body: dict) -> str:
+    """프롬프트 종류(점수표/답안/문제지/클러스터 요약)에 맞는 결정적인 JSON 응답"""
+    text, images = _prompt_text(body.get("messages", []))
+    first_image = images[0] if images else text
+
+    if '"sheets"' in text:
+        markers = [int(i) for i in _IMAGE_MARKER.findall(text)] or list(range(len(images)))
+        sheets = [
+            {"image_index": index, "student_code": _student_code(url), "answers": _answers(url, with_text=False)}
+            for index, url in zip(markers, images)
+        ]
+        return json.dumps({"sheets": sheets}, ensure_ascii=False)
+
+    if "problem_index" in text:
+        problems = [
+            {"problem_index": number, "raw_text": f"문제 {number}. (1) 첫째 소문항 (2) 둘째 소문항 [{score}점]", "score": score}
+            for number, score in enumerate(FAKE_PROBLEM_SCORES, start=1)
+        ]
+        return json.dumps({"problems": problems}, ensure_ascii=False)
+
+    if "student_code" in text:
+        required = _REQUIRED_CODE.search(text)
+        student_code = required.group(1) if required else _student_code(first_image)
+        # 손글씨 답안(parse2)은 답안 텍스트까지, 점수표(score)는 점수만
+        answers = _answers(first_image, with_text="손글씨" in text)
+        return json.dumps({"student_code": student_code, "answers": answers}, ensure_ascii=False)
+
+    # 클러스터 요약 등: 프롬프트의 JSON 형식 예시를 그대로 돌려준다
+    example = _last_json_example(text)
+    return json.dumps(example if example is not None else {}, ensure_ascii=False)
+
+
+class _Window:
+    """최근 60초 사용량 (서버 쪽 한도 흉내)"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.events = deque()
+        self.used = 0
+
+    def _expire(self, now: float) -> None:
+        while self.events and now - self.events[0][0] >= 60.0:
+            self.used -= self.events.popleft()[1]
+
+    def try_take(self, amount: int, now: float) -> Optional[float]:
+        """가능하면 차감하고 None, 아니면 기다려야 할 초"""
+        if self.limit <= 0:
+            return None
+        self._expire(now)
+        amount = min(amount, self.limit)
+        if self.used + amount <= self.limit:
+            self.events.append((now, amount))
+            self.used += amount
+            return None
+        # 가장 오래된 사용분부터 빠질 때까지
+        freed = self.used
+        for at, size in self.events:
+            freed -= size
+            if freed + amount <= self.limit:
+                return max(0.001, 60.0 - (now - at))
+        return 60.0
+
+    def release(self) -> None:
+        """방금 try_take로 차감한 것을 되돌린다 (제한 없는 창은 차감하지 않았으므로 할 일 없음)"""
+        if self.limit <= 0 or not self.events:
+            return
+        self.used -= self.events.pop()[1]
+
+    def remaining(self) -> int:
+        return max(0, self.limit - self.used)
+
+
+class FakeOpenAITransport(httpx.BaseTransport):
+    """/v1/chat/completions, /v1/embeddings 흉내"""
+
+    def __init__(self):
+        self.latency = parse_latency(settings.LLM_FAKE_LATENCY)
+        self.error_rate = settings.LLM_FAKE_429_RATE
+        self.requests = _Window(settings.LLM_FAKE_RPM)
+        self.tokens = _Window(settings.LLM_FAKE_TPM)
+        self.record_dir = settings.LLM_RECORD_DIR
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # max_in_flight: 서버가 동시에 받고 있던 요청 수의 최댓값 (429 포함)
+        self.stats = {"requests": 0, "throttled": 0, "replayed": 0, "max_in_flight": 0}
+
+    def _rate_limited(self, retry_after: float, reason: str) -> httpx.Response:
+        with self._lock:
+            self.stats["throttled"] += 1
+        return httpx.Response(
+            429,
+            headers={"retry-after-ms": str(int(retry_after * 1000)), "retry-after": str(math.ceil(retry_after))},
+            json={"error": {"message": f"Rate limit reached ({reason}, fake backend)", "type": reason, "code": "rate_limit_exceeded"}},
+        )
+
+    def _limit_headers(self) -> dict:
+        headers = {}
+        for name, window in (("requests", self.requests), ("tokens", self.tokens)):
+            if window.limit > 0:
+                headers[f"x-ratelimit-limit-{name}"] = str(window.limit)
+                headers[f"x-ratelimit-remaining-{name}"] = str(window.remaining())
+        return headers
+
+    def _replay(self, body: dict) -> Optional[dict]:
+        if not self.record_dir:
+            return None
+        path = os.path.join(self.record_dir, f"{request_key(body)}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _respond(self, path: str, body: dict) -> dict:
+        model = body.get("model", "fake")
+        if path.endswith("/embeddings"):
+            inputs = body.get("input")
+            inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+            dimensions = body.get("dimensions") or FAKE_EMBED_DIMENSIONS.get(model, 256)
+            tokens = sum(len(text) for text in inputs)
+            return {
+                "object": "list",
+                "model": model,
+                "data": [
+                    {"object": "embedding", "index": index, "embedding": fake_embedding(text, dimensions)}
+                    for index, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+
+        content = fake_chat_content(body)
+        prompt_text, images = _prompt_text(body.get("messages", []))
+        prompt_tokens = len(prompt_text) + 765 * len(images)
+        completion_tokens = len(content)
+        return {
+            "id": f"chatcmpl-fake-{request_key(body)[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def handle(self, method: str, path: str, body: dict) -> Tuple[int, dict, dict]:
+        """(status, headers, JSON 본문) — transport와 스텁 서버가 같이 쓴다"""
+        if method != "POST" or not (path.endswith("/chat/completions") or path.endswith("/embeddings")):
+            return 404, {}, {"error": {"message": f"fake backend: {method} {path} 없음", "type": "invalid_request_error"}}
+
+        with self._lock:
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+        try:
+            return self._handle(path, body)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _handle(self, path: str, body: dict) -> Tuple[int, dict, dict]:
+        # 지연은 한도 검사 전에 (실제 서버처럼 429도 왕복 시간이 걸림)
+        time.sleep(max(0.0, self.latency()))
+
+        if self.error_rate and random.random() < self.error_rate:
+            response = self._rate_limited(random.uniform(0.2, 2.0), "requests")
+            return response.status_code, dict(response.headers), response.json()
+
+        estimated_tokens = len(json.dumps(body.get("input") or body.get("messages") or "", ensure_ascii=False)) // 4
+        with self._lock:
+            now = time.monotonic()
+            wait = self.requests.try_take(1, now)
+            reason = "requests"
+            if wait is None:
+                wait = self.tokens.try_take(estimated_tokens + int(body.get("max_tokens") or 0), now)
+                reason = "tokens"
+                if wait is not None:
+                    # 요청 수는 이미 차감했으므로 되돌린다
+                    self.requests.release()
+            if wait is None:
+                self.stats["requests"] += 1
+            headers = self._limit_headers()
+        if wait is not None:
+            response = self._rate_limited(wait, reason)
+            return response.status_code, dict(response.headers), response.json()
+
+        recorded = self._replay(body)
+        if recorded is not None:
+            with self._lock:
+                self.stats["replayed"] += 1
+            return 200, headers, recorded
+        return 200, headers, self._respond(path, body)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.read() or b"{}")
+        status, headers, payload = self.handle(request.method, request.url.path, body)
+        return httpx.Response(status, headers=headers, json=payload)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """실제 API 응답을 LLM_RECORD_DIR에 녹화 (fake 백엔드가 같은 요청이면 그대로 재생)"""
+
+    def __init__(self, inner: httpx.BaseTransport, record_dir: str):
+        self.inner = inner
+        self.record_dir = record_dir
+        os.makedirs(record_dir, exist_ok=True)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.read() or b"{}")
+        response = self.inner.handle_request(request)
+        if response.status_code == 200 and request.method == "POST":
+            response.read()
+            path = os.path.join(self.record_dir, f"{request_key(body)}.json")
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(response.content)
+            os.replace(tmp_path, path)
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def serve(host: str, port: int) -> None:
+    """여러 프로세스가 같은 한도를 공유하도록 HTTP 스텁 서버로 띄운다"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    transport = FakeOpenAITransport()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("content-length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            status, headers, payload = transport.handle("POST", self.path, body)
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            for name, value in headers.items():
+                if name.lower() not in ("content-length", "content-type"):
+                    self.send_header(name, value)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"🧪 fake OpenAI 서버: http://{host}:{port}/v1 (지연 {settings.LLM_FAKE_LATENCY}, "
+          f"RPM {settings.LLM_FAKE_RPM or '무제한'}, TPM {settings.LLM_FAKE_TPM or '무제한'}, 429 확률 {settings.LLM_FAKE_429_RATE})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n통계: {transport.stats}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenAI API 흉내 스텁 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+    serve(args.host, args.port)
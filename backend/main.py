@@ -1,11 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
+import asyncio
+import logging
 
-from database import engine, Base
-from routers import answer_sheets, answer_key, question_papers  
-Base.metadata.create_all(bind=engine)
+from config import settings
+from database import engine, async_engine, read_async_engine, pool_status
+from schema_version import check_schema_revision
+from read_routing import ReadYourWritesMiddleware
+from routers import answer_sheets, answer_key, question_papers, exams, analysis, health
+# 테이블 생성/변경은 Alembic 마이그레이션으로 (alembic upgrade head)
 app = FastAPI(title="REALThon API", version="1.0.0")
 origins = [
     "http://localhost:3000",  # 리액트/Next.js 기본 포트
@@ -23,9 +29,40 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 리포트/오답 목록처럼 큰 JSON 응답은 gzip으로 (클라이언트가 Accept-Encoding: gzip을 보낼 때만)
+if settings.GZIP_MINIMUM_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
+# 쓰기 후 읽기를 primary로 보내기 위한 쿠키 + X-DB-Route 헤더 (READ_DATABASE_URL이 있을 때만 의미 있음)
+app.add_middleware(ReadYourWritesMiddleware)
 app.include_router(answer_sheets.router)
 app.include_router(answer_key.router)
 app.include_router(question_papers.router)
+app.include_router(exams.router)
+app.include_router(analysis.router)
+app.include_router(health.router)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+async def _log_pool_status_periodically(interval_sec: int):
+    """풀 크기 산정을 위해 주기적으로 커넥션 풀 상태를 로그로 남김"""
+    while True:
+        await asyncio.sleep(interval_sec)
+        logger.info("DB pool status: sync=%s async=%s", pool_status(engine), pool_status(async_engine))
+        if read_async_engine is not None:
+            logger.info("DB pool status: read=%s", pool_status(read_async_engine))
+
+
+@app.on_event("startup")
+async def verify_schema_revision():
+    if settings.DB_SCHEMA_CHECK:
+        await check_schema_revision(async_engine)
+
+
+@app.on_event("startup")
+async def start_pool_status_logging():
+    if settings.DB_POOL_LOG_INTERVAL_SEC > 0:
+        asyncio.create_task(_log_pool_status_periodically(settings.DB_POOL_LOG_INTERVAL_SEC))
 
 
 
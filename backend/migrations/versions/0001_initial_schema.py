@@ -0,0 +1,125 @@
+"""initial schema (기존 create_all 결과와 동일)
+
+Revision ID: 0001_initial_schema
+Revises: 
+Create Date: 2025-11-23 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_initial_schema'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _timestamps(nullable: bool = False):
+    return [
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=nullable),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=nullable),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'documents',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('original_filename', sa.String(), nullable=False),
+        sa.Column('file_size', sa.Integer(), nullable=False),
+        sa.Column('file_type', sa.String(), nullable=False),
+        sa.Column('page_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index('ix_documents_id', 'documents', ['id'])
+
+    op.create_table(
+        'exam',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('exam_date', sa.Date(), nullable=True),
+        sa.Column('llm_analysis_text', sa.Text(), nullable=True),
+        *_timestamps(),
+    )
+    op.create_index('ix_exam_id', 'exam', ['id'])
+
+    op.create_table(
+        'question',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('number', sa.Integer(), nullable=False, unique=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('score', sa.Numeric(5, 2), nullable=False),
+        sa.Column('answer_text', sa.Text(), nullable=True),
+        *_timestamps(),
+    )
+    op.create_index('ix_question_id', 'question', ['id'])
+
+    op.create_table(
+        'answer_sheet',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_code', sa.String(length=100), nullable=False, unique=True),
+        *_timestamps(),
+    )
+    op.create_index('ix_answer_sheet_id', 'answer_sheet', ['id'])
+
+    op.create_table(
+        'answer',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('answer_sheet_id', sa.Integer(), sa.ForeignKey('answer_sheet.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('question_id', sa.Integer(), sa.ForeignKey('question.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('answer_text', sa.Text(), nullable=False),
+        sa.Column('raw_score', sa.Numeric(5, 2), nullable=True),
+        *_timestamps(),
+        sa.UniqueConstraint('answer_sheet_id', 'question_id', name='uq_answer_sheet_question'),
+    )
+    op.create_index('ix_answer_id', 'answer', ['id'])
+
+    op.create_table(
+        'question_pattern',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('question_id', sa.Integer(), sa.ForeignKey('question.id', ondelete='CASCADE'), nullable=False, unique=True),
+        sa.Column('total_responses', sa.Integer(), nullable=False),
+        sa.Column('avg_score', sa.Numeric(5, 2), nullable=True),
+        sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('pattern_json', sa.JSON(), nullable=False),
+    )
+    op.create_index('ix_question_pattern_id', 'question_pattern', ['id'])
+
+    op.create_table(
+        'llm_analyses',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('answer_sheet_id', sa.Integer(), sa.ForeignKey('answer_sheet.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('prompt', sa.Text(), nullable=True),
+        sa.Column('llm_response', sa.JSON(), nullable=False),
+        sa.Column('llm_api_type', sa.String(), nullable=False),
+        sa.Column('llm_model', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index('ix_llm_analyses_id', 'llm_analyses', ['id'])
+
+    op.create_table(
+        'analysis_results',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('question_id', sa.Integer(), sa.ForeignKey('question.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('analysis_text', sa.Text(), nullable=False),
+        sa.Column('cluster_data', sa.JSON(), nullable=True),
+        *_timestamps(),
+    )
+    op.create_index('ix_analysis_results_id', 'analysis_results', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_table('analysis_results')
+    op.drop_table('llm_analyses')
+    op.drop_table('question_pattern')
+    op.drop_table('answer')
+    op.drop_table('answer_sheet')
+    op.drop_table('question')
+    op.drop_table('exam')
+    op.drop_table('documents')
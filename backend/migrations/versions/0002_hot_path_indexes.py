@@ -0,0 +1,55 @@
+"""hot path indexes for report and ingest queries
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_initial_schema
+Create Date: 2025-11-23 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_hot_path_indexes'
+down_revision: Union[str, None] = '0001_initial_schema'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 운영 중인 테이블을 잠그지 않도록 CONCURRENTLY로 생성 (트랜잭션 밖에서 실행해야 함)
+    with op.get_context().autocommit_block():
+        # 문항별 리포트/오답 목록: WHERE question_id = ? 집계 + (raw_score, id) 순 정렬
+        # answer_sheet_id를 INCLUDE 해서 학번 조인도 index-only scan으로 처리
+        op.create_index(
+            'ix_answer_question_id_raw_score',
+            'answer',
+            ['question_id', 'raw_score', 'id'],
+            postgresql_include=['answer_sheet_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # 문항별 분석 결과 조회
+        op.create_index(
+            'ix_analysis_results_question_id',
+            'analysis_results',
+            ['question_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # answer_sheet 삭제 시 CASCADE 대상 탐색
+        op.create_index(
+            'ix_llm_analyses_answer_sheet_id',
+            'llm_analyses',
+            ['answer_sheet_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_llm_analyses_answer_sheet_id', table_name='llm_analyses', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_analysis_results_question_id', table_name='analysis_results', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_answer_question_id_raw_score', table_name='answer', postgresql_concurrently=True, if_exists=True)
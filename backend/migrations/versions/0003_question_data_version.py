@@ -0,0 +1,29 @@
+"""question data version for report caching
+
+Revision ID: 0003_question_data_version
+Revises: 0002_hot_path_indexes
+Create Date: 2025-11-23 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_question_data_version'
+down_revision: Union[str, None] = '0002_hot_path_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 상수 기본값이라 PostgreSQL 11+ 에서는 테이블을 다시 쓰지 않는다
+    op.add_column('question', sa.Column('data_version', sa.BigInteger(), server_default='1', nullable=False))
+    op.add_column('question', sa.Column('data_updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('question', 'data_updated_at')
+    op.drop_column('question', 'data_version')
@@ -0,0 +1,27 @@
+"""question content hash for diff-aware question paper upserts
+
+Revision ID: 0004_question_content_hash
+Revises: 0003_question_data_version
+Create Date: 2025-11-23 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_question_content_hash'
+down_revision: Union[str, None] = '0003_question_data_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 기존 행은 NULL로 두고, 다음 문제지 업로드 때 한 번 UPDATE 되면서 채워진다
+    op.add_column('question', sa.Column('content_hash', sa.String(64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('question', 'content_hash')
@@ -0,0 +1,137 @@
+"""exam scoping: exam_id on question / answer_sheet / analysis_results, answer partitioned by exam
+
+Revision ID: 0005_exam_scoping
+Revises: 0004_question_content_hash
+Create Date: 2025-11-23 00:00:04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_exam_scoping'
+down_revision: Union[str, None] = '0004_question_content_hash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DEFAULT_EXAM_TITLE = '기본 시험'
+SCOPED_TABLES = ('question', 'answer_sheet', 'analysis_results')
+
+
+def _add_exam_id(table: str) -> None:
+    # 기존 행은 모두 기본 시험(가장 먼저 만든 시험) 소속으로 채운 뒤 NOT NULL + FK
+    op.add_column(table, sa.Column('exam_id', sa.Integer(), nullable=True))
+    op.execute(f"UPDATE {table} SET exam_id = (SELECT min(id) FROM exam)")
+    op.alter_column(table, 'exam_id', nullable=False)
+    op.create_foreign_key(f'fk_{table}_exam_id', table, 'exam', ['exam_id'], ['id'], ondelete='CASCADE')
+
+
+def _create_answer_table(name: str, partitioned: bool) -> None:
+    columns = [
+        sa.Column('id', sa.Integer(), nullable=False, server_default=sa.text("nextval('answer_id_seq')")),
+        sa.Column('answer_sheet_id', sa.Integer(), sa.ForeignKey('answer_sheet.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('question_id', sa.Integer(), sa.ForeignKey('question.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('answer_text', sa.Text(), nullable=False),
+        sa.Column('raw_score', sa.Numeric(5, 2), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    ]
+    if partitioned:
+        # 파티션 키(exam_id)가 기본키/유니크 제약에 들어가야 한다
+        op.create_table(
+            name,
+            *columns,
+            sa.Column('exam_id', sa.Integer(), sa.ForeignKey('exam.id', ondelete='CASCADE'), nullable=False),
+            sa.PrimaryKeyConstraint('id', 'exam_id', name='pk_answer'),
+            sa.UniqueConstraint('exam_id', 'answer_sheet_id', 'question_id', name='uq_answer_exam_sheet_question'),
+            postgresql_partition_by='LIST (exam_id)',
+        )
+    else:
+        op.create_table(
+            name,
+            *columns,
+            sa.PrimaryKeyConstraint('id', name='answer_pkey'),
+            sa.UniqueConstraint('answer_sheet_id', 'question_id', name='uq_answer_sheet_question'),
+        )
+
+
+def _create_answer_question_index() -> None:
+    # 파티션 테이블 부모에는 CONCURRENTLY를 쓸 수 없다 (파티션마다 같은 인덱스가 만들어짐)
+    op.create_index(
+        'ix_answer_question_id_raw_score',
+        'answer',
+        ['question_id', 'raw_score', 'id'],
+        postgresql_include=['answer_sheet_id'],
+    )
+
+
+def upgrade() -> None:
+    # --sql(오프라인)로도 스크립트를 뽑을 수 있도록 DB에서 값을 읽지 않고 SQL만 쓴다
+    op.add_column('exam', sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True))
+
+    # 지금까지의 데이터는 가장 먼저 만든 시험(없으면 기본 시험을 만들어서)에 넣는다
+    op.execute(
+        sa.text("INSERT INTO exam (title) SELECT :title WHERE NOT EXISTS (SELECT 1 FROM exam)")
+        .bindparams(title=DEFAULT_EXAM_TITLE)
+    )
+
+    for table in SCOPED_TABLES:
+        _add_exam_id(table)
+
+    # 문항 번호 / 학번은 시험 안에서만 유일
+    op.drop_constraint('question_number_key', 'question', type_='unique')
+    op.create_unique_constraint('uq_question_exam_number', 'question', ['exam_id', 'number'])
+    op.drop_constraint('answer_sheet_student_code_key', 'answer_sheet', type_='unique')
+    op.create_unique_constraint('uq_answer_sheet_exam_student', 'answer_sheet', ['exam_id', 'student_code'])
+
+    # answer → exam_id LIST 파티션 테이블로 교체 (기존 id 시퀀스는 그대로 이어서 사용)
+    op.execute("ALTER SEQUENCE answer_id_seq OWNED BY NONE")
+    _create_answer_table('answer_partitioned', partitioned=True)
+    # 시험마다 파티션 하나 (시험 목록은 실행 시점의 DB에서)
+    op.execute(
+        "DO $$ DECLARE r record; BEGIN "
+        "FOR r IN SELECT id FROM exam ORDER BY id LOOP "
+        "EXECUTE 'CREATE TABLE answer_exam_' || r.id || ' PARTITION OF answer_partitioned FOR VALUES IN (' || r.id || ')'; "
+        "END LOOP; END $$"
+    )
+    op.execute(
+        "INSERT INTO answer_partitioned "
+        "(id, exam_id, answer_sheet_id, question_id, answer_text, raw_score, created_at, updated_at) "
+        "SELECT a.id, s.exam_id, a.answer_sheet_id, a.question_id, a.answer_text, a.raw_score, a.created_at, a.updated_at "
+        "FROM answer a JOIN answer_sheet s ON s.id = a.answer_sheet_id"
+    )
+    op.drop_table('answer')
+    op.rename_table('answer_partitioned', 'answer')
+    op.execute("ALTER SEQUENCE answer_id_seq OWNED BY answer.id")
+    _create_answer_question_index()
+
+
+def downgrade() -> None:
+    # 보관(DETACH)된 시험의 파티션 테이블은 되돌리지 않는다 (필요하면 먼저 복원할 것)
+    # 시험이 여러 개면 문항 번호/학번 유일 제약 복구가 실패할 수 있다
+    op.execute("ALTER SEQUENCE answer_id_seq OWNED BY NONE")
+    _create_answer_table('answer_plain', partitioned=False)
+    op.execute(
+        "INSERT INTO answer_plain (id, answer_sheet_id, question_id, answer_text, raw_score, created_at, updated_at) "
+        "SELECT id, answer_sheet_id, question_id, answer_text, raw_score, created_at, updated_at FROM answer"
+    )
+    # 붙어 있는 파티션은 부모와 함께 삭제된다
+    op.drop_table('answer')
+    op.rename_table('answer_plain', 'answer')
+    op.execute("ALTER SEQUENCE answer_id_seq OWNED BY answer.id")
+    op.create_index('ix_answer_id', 'answer', ['id'])
+    _create_answer_question_index()
+
+    op.drop_constraint('uq_answer_sheet_exam_student', 'answer_sheet', type_='unique')
+    op.create_unique_constraint('answer_sheet_student_code_key', 'answer_sheet', ['student_code'])
+    op.drop_constraint('uq_question_exam_number', 'question', type_='unique')
+    op.create_unique_constraint('question_number_key', 'question', ['number'])
+
+    for table in reversed(SCOPED_TABLES):
+        op.drop_constraint(f'fk_{table}_exam_id', table, type_='foreignkey')
+        op.drop_column(table, 'exam_id')
+
+    op.drop_column('exam', 'archived_at')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Numeric, Boolean, Date, UniqueConstraint, func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Text, JSON, Numeric, Boolean, Date, UniqueConstraint, PrimaryKeyConstraint, Index, func, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
@@ -24,25 +24,35 @@ class Exam(Base):
     description = Column(Text, nullable=True)  # 시험 설명
     exam_date = Column(Date, nullable=True)  # 실제 시험 날짜
     llm_analysis_text = Column(Text, nullable=True)  # LLM API로 받은 시험지 분석 텍스트
+    # 보관 처리된 시각 (보관되면 이 시험의 answer 파티션이 분리되어 있음, exam_scope 참고)
+    archived_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
-    
-    # 관계 (시험이 하나만 있으므로 관계 제거)
 
 
 class Question(Base):
     __tablename__ = "question"
     
     id = Column(Integer, primary_key=True, index=True)
-    number = Column(Integer, nullable=False, unique=True)  # 시험지 상 문항 번호 (1,2,3,...)
+    exam_id = Column(Integer, ForeignKey("exam.id", ondelete="CASCADE"), nullable=False)
+    number = Column(Integer, nullable=False)  # 시험지 상 문항 번호 (1,2,3,...), 시험 안에서 유일
     text = Column(Text, nullable=False)  # 문항 지문
     score = Column(Numeric(5, 2), nullable=False)  # 배점 (예: 5.0점)
     answer_text = Column(Text, nullable=True)  # 정답 텍스트 (정답표에서 저장)
+    content_hash = Column(String(64), nullable=True)  # 지문 + 배점 sha256 (문제지 재업로드 시 변경 여부 판단)
+    
+    # 리포트에 영향을 주는 데이터(문항/답안/분석 결과)가 바뀔 때마다 증가 (ETag, 리포트 캐시 키)
+    data_version = Column(BigInteger, nullable=False, server_default="1")
+    data_updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
-    # 관계 (시험이 하나만 있으므로 exam_id 없이)
+    __table_args__ = (
+        UniqueConstraint('exam_id', 'number', name='uq_question_exam_number'),
+    )
+    
+    # 관계
     answers = relationship("Answer", back_populates="question", cascade="all, delete-orphan")
     question_pattern = relationship("QuestionPattern", back_populates="question", uselist=False, cascade="all, delete-orphan")
     analysis_results = relationship("AnalysisResult", back_populates="question", cascade="all, delete-orphan")
@@ -52,19 +62,29 @@ class AnswerSheet(Base):
     __tablename__ = "answer_sheet"
     
     id = Column(Integer, primary_key=True, index=True)
-    student_code = Column(String(100), nullable=False, unique=True)  # 학번/학생 식별자 (로그인 계정 아님)
+    exam_id = Column(Integer, ForeignKey("exam.id", ondelete="CASCADE"), nullable=False)
+    student_code = Column(String(100), nullable=False)  # 학번/학생 식별자 (로그인 계정 아님), 시험 안에서 유일
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
-    # 관계 (시험이 하나만 있으므로 exam_id 없이)
+    __table_args__ = (
+        UniqueConstraint('exam_id', 'student_code', name='uq_answer_sheet_exam_student'),
+    )
+    
+    # 관계
     answers = relationship("Answer", back_populates="answer_sheet", cascade="all, delete-orphan")
     llm_analyses = relationship("LLMAnalysis", back_populates="answer_sheet", cascade="all, delete-orphan")
 
 
 class Answer(Base):
+    """
+    학생 답안 (exam_id 기준 LIST 파티션 테이블, 시험마다 answer_exam_{exam_id} 파티션)
+    파티션 키가 기본키/유니크 제약에 포함되어야 하므로 기본키는 (id, exam_id)
+    """
     __tablename__ = "answer"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, nullable=False, server_default=text("nextval('answer_id_seq')"))
+    exam_id = Column(Integer, ForeignKey("exam.id", ondelete="CASCADE"), nullable=False)
     answer_sheet_id = Column(Integer, ForeignKey("answer_sheet.id", ondelete="CASCADE"), nullable=False)
     question_id = Column(Integer, ForeignKey("question.id", ondelete="CASCADE"), nullable=False)
     
@@ -74,9 +94,13 @@ class Answer(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
-    # 제약 조건
+    # 제약 조건 / 인덱스 (스키마 변경은 migrations/ 의 Alembic 마이그레이션으로 관리)
     __table_args__ = (
-        UniqueConstraint('answer_sheet_id', 'question_id', name='uq_answer_sheet_question'),
+        PrimaryKeyConstraint('id', 'exam_id', name='pk_answer'),
+        UniqueConstraint('exam_id', 'answer_sheet_id', 'question_id', name='uq_answer_exam_sheet_question'),
+        # 문항별 리포트 집계 + (raw_score, id) 순 오답 목록용 커버링 인덱스 (파티션마다 생성됨)
+        Index('ix_answer_question_id_raw_score', 'question_id', 'raw_score', 'id', postgresql_include=['answer_sheet_id']),
+        {"postgresql_partition_by": "LIST (exam_id)"},
     )
     
     # 관계
@@ -109,6 +133,10 @@ class LLMAnalysis(Base):
     llm_model = Column(String, nullable=True)  # 사용한 모델명
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index('ix_llm_analyses_answer_sheet_id', 'answer_sheet_id'),
+    )
+    
     # 관계
     answer_sheet = relationship("AnswerSheet", back_populates="llm_analyses")
 
@@ -117,12 +145,17 @@ class AnalysisResult(Base):
     __tablename__ = "analysis_results"
     
     id = Column(Integer, primary_key=True, index=True)
+    exam_id = Column(Integer, ForeignKey("exam.id", ondelete="CASCADE"), nullable=False)
     question_id = Column(Integer, ForeignKey("question.id", ondelete="CASCADE"), nullable=False)
     analysis_text = Column(Text, nullable=False)  # LLM이 제공한 문항별 오답 분석 결과 텍스트
     cluster_data = Column(JSON, nullable=True)  # 많이 등장한 답안 클러스터링 결과 (JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
+    __table_args__ = (
+        Index('ix_analysis_results_question_id', 'question_id'),
+    )
+    
     # 관계
     question = relationship("Question", back_populates="analysis_results")
 
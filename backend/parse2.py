@@ -1,22 +1,21 @@
 import os
-import base64
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
 
-load_dotenv()
+from llm_client import chat_completion
+from vision_cache import vision_cache
+import image_preprocess
+import rasterize
 
-# OpenAI API 키를 환경변수에서 읽어오기
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY 환경변수가 설정되지 않았습니다.")
+load_dotenv()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+ANSWER_MODEL = "gpt-4o"  # 이미지 입력이 가능한 모델
+# 프롬프트나 응답 형식을 바꾸면 올릴 것 (비전 캐시 키에 들어감)
+ANSWER_PROMPT_VERSION = "answer-v1"
 
-def encode_image(image_path: str) -> str:
-    """이미지 파일을 base64 문자열로 인코딩"""
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+def encode_pages(image_path: str) -> list:
+    """답안지 이미지 또는 PDF(모든 쪽)를 전처리(image_preprocess)해서 messages에 넣을 image_url 항목 목록으로"""
+    return image_preprocess.document_parts(image_path, "answer")
 
 
 def parse_student_answer_handwriting(image_path: str, student_code: str = None) -> dict:
@@ -24,7 +23,7 @@ def parse_student_answer_handwriting(image_path: str, student_code: str = None)
     손글씨 답안지를 파싱하여 JSON 형식으로 반환
     
     Args:
-        image_path: 답안지 이미지 경로
+        image_path: 답안지 이미지 또는 PDF 경로 (PDF면 모든 쪽을 한 학생의 답안으로)
         student_code: 학번 (이미지에서 추출하거나 제공된 값 사용)
     
     Returns:
@@ -38,8 +37,17 @@ def parse_student_answer_handwriting(image_path: str, student_code: str = None)
                 }
             ]
         }
+    (같은 이미지 + 같은 학번 힌트로 이미 파싱했으면 비전 캐시에서)
     """
-    base64_image = encode_image(image_path)
+    return vision_cache.fetch(
+        "answer", image_path, lambda: request_student_answer(image_path, student_code),
+        prompt_version=f"{ANSWER_PROMPT_VERSION}+{image_preprocess.cache_tag('answer')}{rasterize.cache_tag(image_path)}",
+        model=ANSWER_MODEL, hint=student_code or "",
+    )
+
+
+def request_student_answer(image_path: str, student_code: str = None) -> dict:
+    page_contents = encode_pages(image_path)
 
     system_prompt = """
 당신은 손글씨 시험 답안을 JSON 구조로 파싱하는 보조자입니다.
@@ -106,20 +114,16 @@ def parse_student_answer_handwriting(image_path: str, student_code: str = None)
         f"{code_instruction}"
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4o",  # 이미지 입력이 가능한 모델
+    response = chat_completion(
+        label=f"answer {os.path.basename(image_path)}",
+        model=ANSWER_MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": user_text},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
-                        },
-                    },
+                    *page_contents,
                 ],
             },
         ],
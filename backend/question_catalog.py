@@ -0,0 +1,92 @@
+"""
+문항 카탈로그 캐시 (프로세스 단위, 시험별)
+
+시험별 Question.number → (id, 배점) 매핑은 문제지 업로드 때만 바뀌므로
+답안 저장 때마다 DB에서 다시 읽지 않고 메모리 스냅샷을 사용한다.
+
+- 처음 필요할 때 한 번 로드한다 (lazy)
+- 문제지/정답표 업로드가 commit되면 reload_catalog()로 새 스냅샷을 만들어 통째로 교체한다
+  (참조 하나만 바꾸므로 읽는 쪽은 잠금 없이 항상 완전한 스냅샷을 본다)
+- 다른 프로세스에서 문항이 추가된 경우를 위해, 없는 번호를 만나면 한 번 다시 로드한다
+- 로드할 때 잠금을 잡지 않는다: 비동기 라우터가 run_sync로 부르면 DB 대기 중에 이벤트 루프로 돌아가므로
+  threading.Lock을 잡은 채로 I/O를 하면 같은 루프의 다른 요청이 잠금에서 루프 전체를 막는다.
+  동시에 두 번 로드되어도 각자 완전한 스냅샷을 만들어 참조만 바꾸므로 결과는 같다.
+"""
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Question
+
+
+class QuestionCatalog:
+    """문항 번호 → (question.id, 배점) 불변 스냅샷"""
+
+    def __init__(self, entries: Dict[int, Tuple[int, Decimal]]):
+        self._entries = MappingProxyType(dict(entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, number: int) -> bool:
+        return number in self._entries
+
+    def get(self, number: int) -> Optional[Tuple[int, Decimal]]:
+        return self._entries.get(number)
+
+    def question_id(self, number: int) -> Optional[int]:
+        entry = self._entries.get(number)
+        return entry[0] if entry else None
+
+    def question_ids(self, numbers: Iterable[int]) -> Dict[int, int]:
+        """있는 번호만 골라 번호 → question.id 매핑으로 반환"""
+        return {
+            number: self._entries[number][0]
+            for number in numbers
+            if number in self._entries
+        }
+
+
+# exam_id → 스냅샷 (시험마다 따로 교체)
+_catalogs: Dict[int, QuestionCatalog] = {}
+
+
+def reload_catalog(db: Session, exam_id: int) -> QuestionCatalog:
+    """DB에서 시험의 문항 목록을 읽어 새 스냅샷으로 교체"""
+    rows = db.execute(
+        select(Question.number, Question.id, Question.score).where(Question.exam_id == exam_id)
+    ).all()
+    catalog = QuestionCatalog({number: (question_id, score) for number, question_id, score in rows})
+    _catalogs[exam_id] = catalog
+    return catalog
+
+
+def get_catalog(db: Session, exam_id: int) -> QuestionCatalog:
+    """현재 스냅샷 (없으면 로드)"""
+    catalog = _catalogs.get(exam_id)
+    if catalog is None:
+        catalog = reload_catalog(db, exam_id)
+    return catalog
+
+
+def invalidate_catalog(exam_id: Optional[int] = None) -> None:
+    """다음 조회 때 다시 로드하도록 스냅샷을 버림 (exam_id가 없으면 전체)"""
+    if exam_id is None:
+        _catalogs.clear()
+    else:
+        _catalogs.pop(exam_id, None)
+
+
+def resolve_question_ids(db: Session, exam_id: int, numbers: Iterable[int]) -> Dict[int, int]:
+    """
+    시험의 문항 번호 → question.id 매핑
+    캐시에 없는 번호가 있으면 한 번만 다시 로드해서 확인한다 (그래도 없으면 결과에서 빠짐)
+    """
+    numbers = set(numbers)
+    catalog = get_catalog(db, exam_id)
+    if any(number not in catalog for number in numbers):
+        catalog = reload_catalog(db, exam_id)
+    return catalog.question_ids(numbers)
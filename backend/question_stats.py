@@ -0,0 +1,364 @@
+"""
+문항별 누적 통계 (question_pattern 테이블)
+
+리포트/대시보드가 매번 answer 전체를 집계하지 않도록, 답안이 저장/수정/삭제될 때
+같은 트랜잭션 안에서 문항별 누적값을 갱신해 둔다.
+
+pattern_json 형식:
+    {
+        "max_score": "10.00",     # 집계 당시 배점 (배점이 바뀌면 다시 계산)
+        "count": 120,             # 답안 수 (점수 없는 답안 포함)
+        "scored_count": 118,      # 점수가 있는 답안 수
+        "score_sum": "803.50",
+        "score_sum_sq": "6201.25",
+        "correct_count": 40,      # 만점 답안 수
+        "histogram": [3, 10, 25, 40, 40]   # score_distribution 구간별 답안 수
+    }
+
+동시성: 답안을 쓰는 트랜잭션은 먼저 관련 문항의 question_pattern 행을 question_id 순서로
+SELECT ... FOR UPDATE 로 잠근 뒤 기존 점수를 읽고 갱신한다. 같은 문항에 쓰는 트랜잭션끼리는
+순서대로 처리되므로 누적값이 어긋나지 않는다.
+
+복구용 전체 재계산:
+    python question_stats.py                  # 전체 문항
+    python question_stats.py --question-id 3  # 특정 문항만
+"""
+import os
+import sys
+import argparse
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import Exam, Question, Answer, QuestionPattern
+from score_distribution import score_bucket_index, score_bucket_conditions, score_bucket_labels, BUCKET_COUNT
+
+# answer.raw_score 컬럼 정밀도 (Numeric(5, 2))와 맞춰서 더해야 DB 재계산 결과와 같아진다
+SCORE_QUANTUM = Decimal("0.01")
+
+
+def _to_score(value) -> Optional[Decimal]:
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(SCORE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+class ScoreAggregate:
+    """문항 하나의 누적 통계 (pattern_json과 1:1)"""
+
+    def __init__(self, max_score, count=0, scored_count=0, score_sum=Decimal(0), score_sum_sq=Decimal(0),
+                 correct_count=0, histogram=None):
+        self.max_score = Decimal(str(max_score))
+        self.count = count
+        self.scored_count = scored_count
+        self.score_sum = Decimal(str(score_sum))
+        self.score_sum_sq = Decimal(str(score_sum_sq))
+        self.correct_count = correct_count
+        self.histogram = list(histogram) if histogram else [0] * BUCKET_COUNT
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ScoreAggregate":
+        return cls(
+            max_score=data["max_score"],
+            count=data["count"],
+            scored_count=data["scored_count"],
+            score_sum=data["score_sum"],
+            score_sum_sq=data["score_sum_sq"],
+            correct_count=data["correct_count"],
+            histogram=data["histogram"],
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "max_score": str(self.max_score),
+            "count": self.count,
+            "scored_count": self.scored_count,
+            "score_sum": str(self.score_sum),
+            "score_sum_sq": str(self.score_sum_sq),
+            "correct_count": self.correct_count,
+            "histogram": self.histogram,
+        }
+
+    def _apply(self, score, sign: int) -> None:
+        score = _to_score(score)
+        self.count += sign
+        if score is None:
+            return
+        self.scored_count += sign
+        self.score_sum += sign * score
+        self.score_sum_sq += sign * score * score
+        if score >= self.max_score:
+            self.correct_count += sign
+        self.histogram[score_bucket_index(score, self.max_score)] += sign
+
+    def add(self, score) -> None:
+        self._apply(score, 1)
+
+    def remove(self, score) -> None:
+        self._apply(score, -1)
+
+    @property
+    def mean(self) -> Optional[Decimal]:
+        if self.scored_count <= 0:
+            return None
+        return self.score_sum / self.scored_count
+
+    @property
+    def std(self) -> Optional[float]:
+        if self.scored_count <= 0:
+            return None
+        mean = self.score_sum / self.scored_count
+        variance = self.score_sum_sq / self.scored_count - mean * mean
+        return float(max(variance, Decimal(0))) ** 0.5
+
+    def matches(self, max_score) -> bool:
+        """현재 배점 기준으로 집계된 값인지 (배점이 바뀌면 구간/만점 수를 다시 계산해야 함)"""
+        return self.max_score == Decimal(str(max_score))
+
+    def to_statistics(self) -> dict:
+        """리포트 statistics 형식 (analysis_queries.statistics_from_row와 같은 키)"""
+        correct_rate = (self.correct_count / self.count * 100) if self.count > 0 else 0
+        mean = self.mean
+        std = self.std
+        return {
+            "total_answers": self.count,
+            "correct_answers": self.correct_count,
+            # 점수가 없는 답안도 오답으로 간주
+            "wrong_answers": self.count - self.correct_count,
+            "correct_rate": round(correct_rate, 2),
+            "scored_answers": self.scored_count,
+            "mean_score": round(float(mean), 2) if mean is not None else None,
+            "std_score": round(std, 2) if std is not None else None,
+            "histogram": {
+                "labels": score_bucket_labels(self.max_score),
+                "counts": list(self.histogram),
+            },
+        }
+
+
+def _pattern_values(aggregate: ScoreAggregate) -> dict:
+    """question_pattern 행에 저장할 컬럼 값"""
+    mean = aggregate.mean
+    return {
+        "total_responses": aggregate.count,
+        "avg_score": mean.quantize(SCORE_QUANTUM, rounding=ROUND_HALF_UP) if mean is not None else None,
+        "pattern_json": aggregate.to_json(),
+        "computed_at": func.now(),
+    }
+
+
+def aggregate_from_answers(db: Session, question_ids: Optional[Iterable[int]] = None) -> Dict[int, ScoreAggregate]:
+    """
+    answer 테이블을 직접 집계해서 문항별 ScoreAggregate 생성 (답안이 없는 문항도 포함)
+    보관된 시험은 answer 파티션이 분리되어 있어 0으로 집계되므로 제외한다 (기존 누적값 유지)
+    """
+    count = func.count(Answer.id)
+    stmt = (
+        select(
+            Question.id,
+            Question.score,
+            count.label("count"),
+            func.count(Answer.raw_score).label("scored_count"),
+            func.coalesce(func.sum(Answer.raw_score), 0).label("score_sum"),
+            func.coalesce(func.sum(Answer.raw_score * Answer.raw_score), 0).label("score_sum_sq"),
+            count.filter(Answer.raw_score >= Question.score).label("correct_count"),
+            *[
+                count.filter(condition).label(f"bucket_{index}")
+                for index, condition in enumerate(score_bucket_conditions(Answer.raw_score, Question.score))
+            ],
+        )
+        .select_from(Question)
+        # exam_id도 조인 조건에 넣어서 문항이 속한 시험의 파티션만 읽게 한다
+        .join(Exam, Exam.id == Question.exam_id)
+        .outerjoin(Answer, (Answer.question_id == Question.id) & (Answer.exam_id == Question.exam_id))
+        .where(Exam.archived_at.is_(None))
+        .group_by(Question.id, Question.score)
+    )
+    if question_ids is not None:
+        stmt = stmt.where(Question.id.in_(list(question_ids)))
+
+    return {
+        row.id: ScoreAggregate(
+            max_score=row.score,
+            count=row.count,
+            scored_count=row.scored_count,
+            score_sum=row.score_sum,
+            score_sum_sq=row.score_sum_sq,
+            correct_count=row.correct_count,
+            histogram=[getattr(row, f"bucket_{index}") for index in range(BUCKET_COUNT)],
+        )
+        for row in db.execute(stmt)
+    }
+
+
+def lock_patterns(db: Session, question_ids: Iterable[int]) -> Dict[int, QuestionPattern]:
+    """
+    답안을 쓰기 전에 호출: 문항별 question_pattern 행을 question_id 순서로 잠그고 반환
+    행이 없거나 배점이 바뀐 문항은 잠근 상태에서 answer 테이블로부터 다시 계산해 둔다
+    """
+    question_ids = sorted(set(question_ids))
+    if not question_ids:
+        return {}
+
+    # 아직 행이 없는 문항은 현재 답안으로 계산해서 만든다 (동시에 만들면 먼저 만든 쪽이 이김)
+    existing = set(db.scalars(
+        select(QuestionPattern.question_id).where(QuestionPattern.question_id.in_(question_ids))
+    ))
+    missing = [question_id for question_id in question_ids if question_id not in existing]
+    if missing:
+        rows = [
+            {"question_id": question_id, **_pattern_values(aggregate)}
+            for question_id, aggregate in sorted(aggregate_from_answers(db, missing).items())
+        ]
+        if rows:
+            db.execute(
+                pg_insert(QuestionPattern).values(rows).on_conflict_do_nothing(index_elements=[QuestionPattern.question_id])
+            )
+
+    rows = db.execute(
+        select(QuestionPattern, Question.score)
+        .join(Question, Question.id == QuestionPattern.question_id)
+        .where(QuestionPattern.question_id.in_(question_ids))
+        .order_by(QuestionPattern.question_id)
+        .with_for_update(of=QuestionPattern)
+    ).all()
+    patterns = {pattern.question_id: pattern for pattern, _ in rows}
+
+    stale = [
+        pattern.question_id
+        for pattern, max_score in rows
+        if not ScoreAggregate.from_json(pattern.pattern_json).matches(max_score)
+    ]
+    if stale:
+        for question_id, aggregate in aggregate_from_answers(db, stale).items():
+            _store(patterns[question_id], aggregate)
+
+    return patterns
+
+
+def _store(pattern: QuestionPattern, aggregate: ScoreAggregate) -> None:
+    for key, value in _pattern_values(aggregate).items():
+        setattr(pattern, key, value)
+
+
+def existing_scores(db: Session, exam_id: int, keys: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], Optional[Decimal]]:
+    """
+    시험의 (answer_sheet_id, question_id) → 현재 raw_score (답안이 있는 키만, 해당 시험 파티션만 읽음)
+    lock_patterns 이후에 호출해야 읽은 값이 갱신 전까지 바뀌지 않는다
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    sheet_ids = {sheet_id for sheet_id, _ in keys}
+    question_ids = {question_id for _, question_id in keys}
+    rows = db.execute(
+        select(Answer.answer_sheet_id, Answer.question_id, Answer.raw_score)
+        .where(
+            Answer.exam_id == exam_id,
+            Answer.answer_sheet_id.in_(sheet_ids),
+            Answer.question_id.in_(question_ids),
+        )
+    )
+    return {
+        (sheet_id, question_id): raw_score
+        for sheet_id, question_id, raw_score in rows
+        if (sheet_id, question_id) in keys
+    }
+
+
+def apply_changes(
+    patterns: Dict[int, QuestionPattern],
+    removed: Iterable[Tuple[int, Optional[Decimal]]] = (),
+    added: Iterable[Tuple[int, Optional[Decimal]]] = (),
+) -> None:
+    """
+    잠긴 question_pattern 행에 답안 변경분을 반영
+    - removed: 삭제되거나 덮어써진 답안의 (question_id, 이전 점수)
+    - added: 새로 저장되거나 수정된 답안의 (question_id, 새 점수)
+    (수정은 이전 점수 remove + 새 점수 add)
+    """
+    aggregates = {
+        question_id: ScoreAggregate.from_json(pattern.pattern_json)
+        for question_id, pattern in patterns.items()
+    }
+    for question_id, score in removed:
+        aggregates[question_id].remove(score)
+    for question_id, score in added:
+        aggregates[question_id].add(score)
+    for question_id, aggregate in aggregates.items():
+        _store(patterns[question_id], aggregate)
+
+
+def rebuild_patterns(db: Session, question_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    answer 테이블에서 문항별 통계를 다시 계산해서 덮어쓴다 (commit은 호출하는 쪽에서)
+    배점이 바뀐 문항이나, 누적값이 어긋났을 때 복구용
+    Returns: 갱신된 문항 수
+    """
+    if question_ids is not None:
+        question_ids = sorted(set(question_ids))
+        if not question_ids:
+            return 0
+
+    # 답안 쓰기와 같은 순서로 잠가서, 재계산 도중 들어온 변경분이 사라지지 않게 한다
+    lock_stmt = select(QuestionPattern.id).order_by(QuestionPattern.question_id).with_for_update()
+    if question_ids is not None:
+        lock_stmt = lock_stmt.where(QuestionPattern.question_id.in_(question_ids))
+    db.execute(lock_stmt).all()
+
+    rows = [
+        {"question_id": question_id, **_pattern_values(aggregate)}
+        for question_id, aggregate in sorted(aggregate_from_answers(db, question_ids).items())
+    ]
+    if not rows:
+        return 0
+
+    stmt = pg_insert(QuestionPattern).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[QuestionPattern.question_id],
+        set_={
+            "total_responses": stmt.excluded.total_responses,
+            "avg_score": stmt.excluded.avg_score,
+            "pattern_json": stmt.excluded.pattern_json,
+            "computed_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+    return len(rows)
+
+
+def get_statistics(db: Session, question: Question) -> Optional[dict]:
+    """누적 통계로 리포트 statistics 생성 (행이 없거나 배점이 바뀌었으면 None)"""
+    pattern_json = db.scalar(
+        select(QuestionPattern.pattern_json).where(QuestionPattern.question_id == question.id)
+    )
+    if not pattern_json:
+        return None
+    aggregate = ScoreAggregate.from_json(pattern_json)
+    if not aggregate.matches(question.score):
+        return None
+    return aggregate.to_statistics()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    from report_cache import bump_data_versions
+
+    parser = argparse.ArgumentParser(description="문항별 누적 통계(question_pattern) 재계산")
+    parser.add_argument("--question-id", type=int, action="append", help="재계산할 문항 ID (여러 번 지정 가능, 없으면 전체)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        # 통계가 바뀌었을 수 있으므로 캐시된 리포트를 쓰지 않도록 버전을 올린다 (답안 쓰기와 같은 잠금 순서)
+        bump_data_versions(db, args.question_id or db.scalars(select(Question.id)).all())
+        updated = rebuild_patterns(db, args.question_id)
+        db.commit()
+        print(f"문항 {updated}개 통계 재계산 완료")
+    finally:
+        db.close()
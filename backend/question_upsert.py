@@ -0,0 +1,153 @@
+"""
+문제지 / 정답표 일괄 저장 (변경분만 반영)
+
+문항을 하나씩 SELECT 해서 덮어쓰는 대신, 시험의 문항 목록 전체를 INSERT ... ON CONFLICT (exam_id, number) 한 문장으로 보내고
+지문/배점 해시(content_hash)가 같은 행은 UPDATE 하지 않는다.
+같은 문제지를 다시 올리면 행이 하나도 바뀌지 않으므로 updated_at, data_version, WAL이 그대로다.
+"""
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, func, literal_column, values, column, Integer, Text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import Question
+from question_stats import rebuild_patterns
+
+# question.score 컬럼 정밀도 (Numeric(5, 2))
+SCORE_QUANTUM = Decimal("0.01")
+
+
+def _normalize_score(score) -> Decimal:
+    return Decimal(str(score)).quantize(SCORE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def question_content_hash(text: str, score) -> str:
+    """지문 + 배점 해시 (DB에 저장되는 배점 정밀도 기준)"""
+    payload = f"{text}\x00{_normalize_score(score)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def upsert_questions(db: Session, exam_id: int, problems: Iterable[Tuple[int, str, object]]) -> dict:
+    """
+    시험의 문항 목록을 한 문장으로 upsert (commit은 호출하는 쪽에서)
+    지문/배점이 바뀐 문항만 UPDATE 하고, 그때 data_version도 같이 올린다.
+    배점이 바뀐 문항은 누적 통계(question_pattern)를 다시 계산한다.
+
+    problems: (문항 번호, 지문, 배점) 목록 (같은 번호가 여러 번 있으면 마지막 값 사용)
+    Returns:
+        {
+            "created": 새로 만든 문항 번호 목록,
+            "updated": 지문/배점이 바뀐 문항 번호 목록,
+            "unchanged": 그대로인 문항 번호 목록,
+            "rescored_question_ids": 배점이 바뀐 문항 ID 목록
+        }
+    """
+    rows_by_number = {
+        number: {
+            "exam_id": exam_id,
+            "number": number,
+            "text": text,
+            "score": _normalize_score(score),
+            "content_hash": question_content_hash(text, score),
+        }
+        for number, text, score in problems
+    }
+    numbers = sorted(rows_by_number)
+    if not numbers:
+        return {"created": [], "updated": [], "unchanged": [], "rescored_question_ids": []}
+
+    # 배점 변경 여부를 알기 위해 기존 배점을 먼저 읽는다 (번호 순으로 잠가서 동시 업로드 간 순서 고정)
+    previous_scores = {
+        number: score
+        for number, score in db.execute(
+            select(Question.number, Question.score)
+            .where(Question.exam_id == exam_id, Question.number.in_(numbers))
+            .order_by(Question.number)
+            .with_for_update()
+        )
+    }
+
+    stmt = pg_insert(Question).values([rows_by_number[number] for number in numbers])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Question.exam_id, Question.number],
+        set_={
+            "text": stmt.excluded.text,
+            "score": stmt.excluded.score,
+            "content_hash": stmt.excluded.content_hash,
+            "updated_at": func.now(),
+            "data_version": Question.data_version + 1,
+            "data_updated_at": func.now(),
+        },
+        # 내용이 같으면 행을 건드리지 않는다 (RETURNING에도 나오지 않음)
+        # 해시가 없는 예전 행은 NULL이라 한 번은 UPDATE 되면서 해시가 채워진다
+        where=Question.content_hash.is_distinct_from(stmt.excluded.content_hash),
+    ).returning(Question.id, Question.number, Question.score, literal_column("xmax = 0"))
+
+    created: List[int] = []
+    updated: List[int] = []
+    rescored_question_ids: List[int] = []
+    for question_id, number, score, was_inserted in db.execute(stmt):
+        if was_inserted:
+            created.append(number)
+            continue
+        updated.append(number)
+        if previous_scores.get(number) != score:
+            rescored_question_ids.append(question_id)
+
+    touched = set(created) | set(updated)
+    unchanged = [number for number in numbers if number not in touched]
+
+    # 배점이 바뀌면 만점/점수 구간이 달라지므로 누적 통계를 다시 계산
+    if rescored_question_ids:
+        rebuild_patterns(db, rescored_question_ids)
+
+    return {
+        "created": sorted(created),
+        "updated": sorted(updated),
+        "unchanged": unchanged,
+        "rescored_question_ids": sorted(rescored_question_ids),
+    }
+
+
+def upsert_answer_key(db: Session, exam_id: int, answers: Iterable[Tuple[int, str]]) -> dict:
+    """
+    시험의 정답표(문항 번호 → 정답 텍스트)를 UPDATE ... FROM (VALUES ...) 한 문장으로 저장 (commit은 호출하는 쪽에서)
+    정답이 같은 문항은 UPDATE 하지 않는다. 문항이 없는 번호는 missing으로 돌려준다.
+    (정답 텍스트는 리포트에 나오지 않으므로 data_version은 그대로 둔다)
+
+    Returns: {"updated": [...], "unchanged": [...], "missing": [...]} (문항 번호 목록)
+    """
+    answer_by_number: Dict[int, str] = {number: answer_text for number, answer_text in answers}
+    numbers = sorted(answer_by_number)
+    if not numbers:
+        return {"updated": [], "unchanged": [], "missing": []}
+
+    existing = set(db.scalars(
+        select(Question.number).where(Question.exam_id == exam_id, Question.number.in_(numbers))
+    ))
+
+    key_values = values(
+        column("number", Integer), column("answer_text", Text), name="answer_key"
+    ).data([(number, answer_by_number[number]) for number in numbers if number in existing])
+
+    updated: List[int] = []
+    if existing:
+        updated = sorted(db.scalars(
+            Question.__table__.update()
+            .where(
+                Question.exam_id == exam_id,
+                Question.number == key_values.c.number,
+                Question.answer_text.is_distinct_from(key_values.c.answer_text),
+            )
+            .values(answer_text=key_values.c.answer_text, updated_at=func.now())
+            .returning(Question.number)
+        ))
+
+    return {
+        "updated": updated,
+        "unchanged": [number for number in numbers if number in existing and number not in updated],
+        "missing": [number for number in numbers if number not in existing],
+    }
@@ -0,0 +1,290 @@
+"""
+PDF → 페이지 이미지 변환 (여러 프로세스로 렌더링 + 디스크 캐시)
+
+test_parse.pdf_to_image는 PDF 첫 페이지만 고정 2배(fitz.Matrix(2, 2))로 매번 다시 렌더링했고,
+parse2 / score는 PDF를 받지 못했다. test_parse / parse2 / score / clustering이 모두 여기를 거친다.
+
+- 모든 페이지를 렌더링 (렌더링할 페이지가 여러 장이면 프로세스 풀에서, 파일 여러 개도 한 풀로)
+  풀은 spawn 방식으로 한 번 만들어 재사용한다 (스레드에서 불려도 fork로 잠금 상태를 복사하지 않음)
+- 배율은 페이지 크기와 픽셀 예산(RASTER_PIXEL_BUDGET)으로 정한다 (0.25 단위로 내림, MIN_ZOOM~MAX_ZOOM)
+- (파일 SHA-256, 페이지, 배율)을 키로 PNG를 디스크에 저장해 두고, 같은 PDF는 다시 렌더링하지 않음
+- 이미지 파일은 그대로 한 페이지로 취급 (렌더링/해시 없음)
+- PyMuPDF가 없으면 pdf2image(poppler)로 렌더링 (페이지 크기를 모르므로 DEFAULT_ZOOM)
+
+사용법:
+    python rasterize.py 문제지.pdf 점수표묶음.pdf    # 페이지 이미지 경로와 렌더링/캐시 적중 수
+    python rasterize.py --clear                      # 캐시 삭제
+"""
+import os
+import sys
+import math
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import settings
+from vision_cache import file_sha256
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "pages")
+
+MIN_ZOOM = 0.5
+MAX_ZOOM = 4.0
+DEFAULT_ZOOM = 2.0  # 페이지 크기를 모를 때 (pdf2image)
+ZOOM_STEP = 0.25    # 배율을 이 단위로 내림 (페이지 크기가 조금씩 달라도 같은 캐시 키)
+
+
+def is_pdf(path: str) -> bool:
+    return path.lower().endswith(".pdf")
+
+
+def zoom_for_page(width_pt: float, height_pt: float, pixel_budget: int) -> float:
+    """렌더링 결과(폭 x 높이 픽셀)가 pixel_budget을 넘지 않는 가장 큰 배율"""
+    zoom = math.sqrt(pixel_budget / max(width_pt * height_pt, 1.0))
+    zoom = math.floor(zoom / ZOOM_STEP) * ZOOM_STEP
+    return min(MAX_ZOOM, max(MIN_ZOOM, zoom))
+
+
+def cache_tag(path: str) -> str:
+    """비전 캐시 키에 붙일 렌더링 설정 (PDF만, 이미지 파일은 빈 문자열)"""
+    return f"+pdf@{settings.RASTER_PIXEL_BUDGET}" if is_pdf(path) else ""
+
+
+def _page_zooms(pdf_path: str, pixel_budget: int) -> List[float]:
+    """페이지마다 배율"""
+    if fitz is not None:
+        with fitz.open(pdf_path) as doc:
+            return [zoom_for_page(page.rect.width, page.rect.height, pixel_budget) for page in doc]
+    try:
+        from pdf2image import pdfinfo_from_path
+    except ImportError:
+        raise ImportError("PDF를 이미지로 변환하려면 PyMuPDF 또는 pdf2image가 필요합니다. 'pip install PyMuPDF' 또는 'pip install pdf2image'를 실행하세요.")
+    return [DEFAULT_ZOOM] * int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _render_pages(pdf_path: str, jobs: List[Tuple[int, float, str]]) -> float:
+    """
+    jobs [(페이지 번호, 배율, 저장 경로)]를 렌더링해서 PNG로 저장, 걸린 시간(초) 반환
+    프로세스 풀 워커에서 실행된다 (문서는 워커마다 한 번만 연다)
+    """
+    started = time.perf_counter()
+    if fitz is not None:
+        with fitz.open(pdf_path) as doc:
+            for page_index, zoom, out_path in jobs:
+                pix = doc[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                _write_atomic(out_path, pix.tobytes("png"))
+    else:
+        import io
+        from pdf2image import convert_from_path
+
+        for page_index, zoom, out_path in jobs:
+            images = convert_from_path(pdf_path, dpi=int(72 * zoom), first_page=page_index + 1, last_page=page_index + 1)
+            if not images:
+                raise ValueError(f"PDF에서 이미지를 추출할 수 없습니다: {pdf_path} {page_index + 1}쪽")
+            buffer = io.BytesIO()
+            images[0].save(buffer, format="PNG")
+            _write_atomic(out_path, buffer.getvalue())
+    return time.perf_counter() - started
+
+
+def _chunks(items: list, size: int) -> List[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class Rasterizer:
+    def __init__(self, directory: str, pixel_budget: int, workers: int = 0):
+        self.directory = directory
+        self.pixel_budget = pixel_budget
+        self.workers = workers or os.cpu_count() or 1
+        self._lock = threading.Lock()
+        # 같은 PDF를 여러 스레드가 동시에 요청하면 한 스레드만 렌더링하고 나머지는 캐시를 읽는다
+        self._file_locks: Dict[str, threading.Lock] = {}
+        # (경로, 수정 시각, 크기) → 페이지 경로 (같은 프로세스에서 다시 해시하지 않도록)
+        self._resolved: Dict[tuple, List[str]] = {}
+        # 렌더링 프로세스 풀 (처음 필요할 때 만들고 프로세스 안에서 계속 재사용, 동시 호출도 이 풀을 나눠 씀)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.stats = {"files": 0, "pages": 0, "rendered": 0, "cached": 0, "render_sec": 0.0}
+
+    def _page_path(self, sha256: str, page_index: int, zoom: float) -> str:
+        return os.path.join(self.directory, sha256[:2], f"{sha256}-p{page_index:04d}-z{zoom:.2f}.png")
+
+    def _file_lock(self, sha256: str) -> threading.Lock:
+        with self._lock:
+            return self._file_locks.setdefault(sha256, threading.Lock())
+
+    def _memo_key(self, path: str) -> tuple:
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size, self.pixel_budget)
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def rasterize_many(self, paths: Sequence[str]) -> List[List[str]]:
+        """
+        파일마다 페이지 이미지 경로 목록 (paths 순서대로)
+        캐시에 없는 페이지는 모든 파일의 것을 모아 한 프로세스 풀에서 렌더링한다
+        """
+        results: List[Optional[List[str]]] = [None] * len(paths)
+        to_resolve = []  # (결과 위치, 경로, 메모 키, SHA-256)
+        for position, path in enumerate(paths):
+            if not is_pdf(path):
+                results[position] = [path]
+                continue
+            memo_key = self._memo_key(path)
+            with self._lock:
+                resolved = self._resolved.get(memo_key)
+            if resolved is not None and all(os.path.exists(p) for p in resolved):
+                results[position] = list(resolved)
+                continue
+            to_resolve.append((position, path, memo_key, file_sha256(path)))
+        if not to_resolve:
+            return results
+
+        # 파일 잠금은 항상 같은 순서로 잡는다 (스레드끼리 겹치는 파일 묶음을 요청해도 교착 없음)
+        locks = [self._file_lock(sha256) for sha256 in sorted({item[3] for item in to_resolve})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            jobs_by_file: Dict[str, List[Tuple[int, float, str]]] = {}
+            planned = set()  # 내용이 같은 PDF가 여러 번 들어와도 한 번만 렌더링
+            for position, path, memo_key, sha256 in to_resolve:
+                pages = []
+                missing = 0
+                for page_index, zoom in enumerate(_page_zooms(path, self.pixel_budget)):
+                    page_path = self._page_path(sha256, page_index, zoom)
+                    pages.append(page_path)
+                    if page_path not in planned and not os.path.exists(page_path):
+                        planned.add(page_path)
+                        jobs_by_file.setdefault(path, []).append((page_index, zoom, page_path))
+                        missing += 1
+                self._count(files=1, pages=len(pages), cached=len(pages) - missing, rendered=missing)
+                results[position] = pages
+
+            if jobs_by_file:
+                self._render(jobs_by_file)
+            with self._lock:
+                for position, _, memo_key, _ in to_resolve:
+                    self._resolved[memo_key] = results[position]
+        finally:
+            for lock in locks:
+                lock.release()
+        return results
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: 호출하는 쪽은 스레드 풀 워커라 HTTP 클라이언트/스케줄러 스레드와 잡힌 잠금이 있다 (fork하면 그대로 복사됨)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _render(self, jobs_by_file: Dict[str, List[Tuple[int, float, str]]]) -> None:
+        for jobs in jobs_by_file.values():
+            for _, _, out_path in jobs:
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+        total = sum(len(jobs) for jobs in jobs_by_file.values())
+        workers = min(self.workers, total)
+        if workers <= 1:
+            for pdf_path, jobs in jobs_by_file.items():
+                self._count(render_sec=_render_pages(pdf_path, jobs))
+            return
+
+        # 워커마다 몇 묶음씩 돌아가도록 나눈다 (묶음마다 문서를 한 번 연다)
+        chunk_size = max(1, math.ceil(total / (workers * 4)))
+        pool = self._get_pool()
+        try:
+            futures = [
+                pool.submit(_render_pages, pdf_path, chunk)
+                for pdf_path, jobs in jobs_by_file.items()
+                for chunk in _chunks(jobs, chunk_size)
+            ]
+            for future in futures:
+                self._count(render_sec=future.result())
+        except BrokenProcessPool:
+            # 워커가 죽은 풀은 다음 호출 때 새로 만든다
+            self._discard_pool(pool)
+            raise
+
+    def rasterize(self, path: str) -> List[str]:
+        """PDF면 페이지 이미지 경로 목록, 이미지 파일이면 [path]"""
+        return self.rasterize_many([path])[0]
+
+    def clear(self) -> int:
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for root, _, files in os.walk(self.directory, topdown=False):
+            for name in files:
+                os.remove(os.path.join(root, name))
+                removed += 1
+            if root != self.directory:
+                os.rmdir(root)
+        with self._lock:
+            self._resolved.clear()
+        return removed
+
+
+rasterizer = Rasterizer(settings.RASTER_CACHE_DIR or DEFAULT_CACHE_DIR, settings.RASTER_PIXEL_BUDGET, settings.RASTER_WORKERS)
+
+
+def rasterize(path: str) -> List[str]:
+    return rasterizer.rasterize(path)
+
+
+def expand_pages(paths: Sequence[str]) -> List[str]:
+    """파일 목록 → 페이지 이미지 경로 목록 (PDF는 페이지마다 한 항목, 점수표 묶음 스캔 등)"""
+    return [page for pages in rasterizer.rasterize_many(paths) for page in pages]
+
+
+def format_stats() -> str:
+    stats = rasterizer.stats
+    if not stats["files"]:
+        return "PDF 없음"
+    return (
+        f"PDF {stats['files']}개 {stats['pages']}쪽 (렌더링 {stats['rendered']}쪽, 캐시 {stats['cached']}쪽, "
+        f"렌더링 {stats['render_sec']:.1f}초)"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PDF 페이지 렌더링 / 캐시 관리")
+    parser.add_argument("files", nargs="*", help="PDF 또는 이미지 파일 경로")
+    parser.add_argument("--clear", action="store_true", help="렌더링한 페이지 캐시 삭제")
+    args = parser.parse_args()
+
+    print(f"캐시 디렉터리: {rasterizer.directory} (픽셀 예산 {rasterizer.pixel_budget:,}, 워커 {rasterizer.workers}개)")
+    if args.clear:
+        print(f"🗑️  {rasterizer.clear()}개 페이지 삭제")
+    if not args.files:
+        sys.exit(0)
+
+    started = time.perf_counter()
+    for path, pages in zip(args.files, rasterizer.rasterize_many(args.files)):
+        print(f"{path}: {len(pages)}쪽")
+        for page in pages:
+            print(f"  {page}")
+    print(f"{format_stats()}, 전체 {time.perf_counter() - started:.1f}초")
@@ -0,0 +1,77 @@
+"""
+읽기 요청 DB 라우팅 (복제본 / primary)
+
+READ_DATABASE_URL이 설정되어 있으면 조회용 GET 엔드포인트(get_read_db 의존성)는 복제본에서 읽는다.
+복제 지연 때문에 방금 쓴 데이터가 안 보이는 일이 없도록, 쓰기 요청(POST/PUT/PATCH/DELETE)이
+성공하면 응답에 마지막 쓰기 시각 쿠키를 붙이고, READ_YOUR_WRITES_WINDOW_SEC 동안은
+그 클라이언트의 읽기를 primary로 보낸다. 쿠키만 보면 되므로 워커 프로세스가 여러 개여도 동작한다.
+
+응답의 X-DB-Route 헤더(replica / primary)로 어느 쪽에서 읽었는지 확인할 수 있다.
+"""
+import time
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from config import settings
+
+LAST_WRITE_COOKIE = "db_last_write"
+ROUTE_HEADER = "X-DB-Route"
+ROUTE_REPLICA = "replica"
+ROUTE_PRIMARY = "primary"
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def last_write_at(connection: HTTPConnection) -> Optional[float]:
+    value = connection.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def choose_read_route(connection: HTTPConnection, replica_available: bool) -> str:
+    """복제본이 있고, 이 클라이언트의 최근 쓰기가 창(window) 밖이면 replica"""
+    if not replica_available:
+        return ROUTE_PRIMARY
+    written_at = last_write_at(connection)
+    if written_at is not None and time.time() - written_at < settings.READ_YOUR_WRITES_WINDOW_SEC:
+        return ROUTE_PRIMARY
+    return ROUTE_REPLICA
+
+
+class ReadYourWritesMiddleware:
+    """
+    - 성공한 쓰기 요청의 응답에 마지막 쓰기 시각 쿠키를 붙인다
+    - get_read_db가 고른 경로를 X-DB-Route 헤더로 내보낸다
+    (StreamingResponse도 그대로 흘려보내도록 순수 ASGI 미들웨어로 구현)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        is_write = scope["method"] not in SAFE_METHODS
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                route = state.get("db_route")
+                if route:
+                    headers.append(ROUTE_HEADER, route)
+                if is_write and message["status"] < 400 and settings.READ_YOUR_WRITES_WINDOW_SEC > 0:
+                    max_age = int(settings.READ_YOUR_WRITES_WINDOW_SEC) + 1
+                    headers.append(
+                        "set-cookie",
+                        f"{LAST_WRITE_COOKIE}={time.time():.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
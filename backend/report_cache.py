@@ -0,0 +1,122 @@
+"""
+문항 리포트 응답 캐시 + 문항 데이터 버전
+
+question.data_version은 리포트에 영향을 주는 쓰기(답안 저장/삭제, 분석 결과 저장, 문항 수정)가
+있을 때마다 같은 트랜잭션 안에서 1씩 올린다. 리포트는 이 버전으로
+- ETag / Last-Modified 헤더를 만들고 (변경이 없으면 304)
+- 직렬화된 응답 본문을 (question_id, data_version) 키로 프로세스 메모리(LRU)에 보관한다.
+버전이 키에 들어가므로 캐시를 따로 지울 필요가 없고, 여러 워커 프로세스 사이에서도 오래된 응답을 주지 않는다.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+
+from models import Question
+from config import settings
+
+CacheKey = Tuple[int, int]
+
+
+class ReportCache:
+    """(question_id, data_version) → 직렬화된 리포트 본문(bytes) LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: CacheKey, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            # 같은 문항의 이전 버전은 다시 쓰일 일이 없으므로 바로 버린다
+            for stale_key in [k for k in self._entries if k[0] == key[0] and k[1] < key[1]]:
+                del self._entries[stale_key]
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+
+report_cache = ReportCache(settings.REPORT_CACHE_SIZE)
+
+
+def bump_data_versions(db: Session, question_ids: Iterable[int]) -> None:
+    """
+    문항들의 data_version을 올린다 (commit은 호출하는 쪽에서)
+    question 행 잠금 순서를 고정하려고 id 순으로 먼저 잠근 뒤 UPDATE 한다
+    """
+    question_ids = sorted(set(question_ids))
+    if not question_ids:
+        return
+    db.execute(
+        select(Question.id).where(Question.id.in_(question_ids)).order_by(Question.id).with_for_update()
+    ).all()
+    db.execute(
+        update(Question)
+        .where(Question.id.in_(question_ids))
+        .values(
+            data_version=Question.data_version + 1,
+            data_updated_at=func.now(),
+            # 문항 자체가 바뀐 것은 아니므로 updated_at(onupdate)은 그대로 둔다
+            updated_at=Question.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def make_etag(question_id: int, data_version: int) -> str:
+    return f'W/"q{question_id}-v{data_version}"'
+
+
+def format_http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(if_none_match: Optional[str], if_modified_since: Optional[str], etag: str, last_modified: datetime) -> bool:
+    """조건부 요청 헤더 기준으로 304를 줘도 되는지 (If-None-Match가 있으면 그쪽만 본다)"""
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # weak 비교: W/ 접두어는 무시
+        normalized = etag[2:] if etag.startswith("W/") else etag
+        return "*" in candidates or any(
+            (tag[2:] if tag.startswith("W/") else tag) == normalized for tag in candidates
+        )
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP 날짜는 초 단위까지만 표현된다
+        return last_modified.replace(microsecond=0) <= since
+    return False
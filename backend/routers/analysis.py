@@ -1,22 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Query, Header
+from fastapi.responses import StreamingResponse, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional, Tuple
 from decimal import Decimal
 
-from models import Question, Answer, AnswerSheet, AnalysisResult
+from models import Question, AnalysisResult
 from schemas import AnalysisResultCreate, AnalysisResultResponse
-from dependencies import get_db
+from dependencies import get_db, get_read_db
+from question_stats import get_statistics
+from report_cache import report_cache, bump_data_versions, make_etag, format_http_date, is_not_modified
+from serialization import dumps, FastJSONResponse
+from exam_scope import resolve_exam_id
+from analysis_queries import (
+    question_statistics_stmt,
+    statistics_from_row,
+    wrong_answers_page_stmt,
+    wrong_answer_to_dict,
+    encode_cursor,
+    decode_cursor,
+    exam_overview_stmt,
+    overview_question_from_row,
+)
 
 router = APIRouter(prefix="/analysis", tags=["오답 분석"])
 
+# 리포트에 같이 내려주는 오답 목록 첫 페이지 크기 (나머지는 /wrong-answers 에서 커서로)
+REPORT_WRONG_ANSWERS_LIMIT = 20
+# 오답 목록 한 페이지 최대 크기
+MAX_WRONG_ANSWERS_LIMIT = 500
+# NDJSON 스트리밍 시 DB에서 한 번에 읽는 행 수
+NDJSON_FETCH_SIZE = 1000
+
+
+async def fetch_wrong_answers_page(
+    db: AsyncSession,
+    question: Question,
+    limit: int,
+    after: Optional[Tuple[Optional[Decimal], int]] = None,
+    **filters,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    오답 목록 한 페이지와 다음 페이지 커서를 반환 (마지막 페이지면 커서는 None)
+    다음 페이지 존재 여부는 limit + 1 행을 읽어서 판단한다
+    """
+    rows = (await db.execute(
+        wrong_answers_page_stmt(question.exam_id, question.id, question.score, limit + 1, after=after, **filters)
+    )).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].raw_score, rows[-1].id)
+    return [wrong_answer_to_dict(row, question.score) for row in rows], next_cursor
+
 
 @router.post("/exams/{question_id}/analyze", status_code=status.HTTP_201_CREATED)
 async def analyze_wrong_answers(
     question_id: int,
     analysis_text: str = Form(...),
     cluster_data_json: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     문항별 전체 학생 answer중 raw_score가 question.score(배점)보다 낮은 answer 분석 실행 (LLM 분석 결과 텍스트 저장) (인증 없음)
@@ -27,7 +70,7 @@ async def analyze_wrong_answers(
     """
     try:
         # 문항 존재 확인
-        question = db.query(Question).filter(Question.id == question_id).first()
+        question = await db.get(Question, question_id)
         if not question:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -47,114 +90,213 @@ async def analyze_wrong_answers(
                 )
         
         # 기존 분석 결과 확인
-        existing_result = db.query(AnalysisResult).filter(
-            AnalysisResult.question_id == question_id
-        ).first()
+        existing_result = await db.scalar(
+            select(AnalysisResult).where(AnalysisResult.question_id == question_id)
+        )
+        
+        # 리포트에 분석 결과가 포함되므로 문항 데이터 버전을 올린다
+        await db.run_sync(bump_data_versions, [question_id])
         
         if existing_result:
             # 기존 결과 업데이트
             existing_result.analysis_text = analysis_text
             existing_result.cluster_data = cluster_data
-            db.commit()
-            db.refresh(existing_result)
+            await db.commit()
+            await db.refresh(existing_result)
             return existing_result
         else:
             # 새 분석 결과 생성
             db_result = AnalysisResult(
+                exam_id=question.exam_id,
                 question_id=question_id,
                 analysis_text=analysis_text,
                 cluster_data=cluster_data
             )
             db.add(db_result)
-            db.commit()
-            db.refresh(db_result)
+            await db.commit()
+            await db.refresh(db_result)
             return db_result
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"오답 분석 저장 중 오류가 발생했습니다: {str(e)}"
         )
 
 
+@router.get("/overview")
+async def get_exam_overview(
+    exam_id: Optional[int] = Query(None, description="시험 ID (없으면 현재 시험)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    대시보드용 시험 전체 문항 요약 (인증 없음)
+    dashboard.js가 그대로 렌더링하는 {totalStudents, questions: [...]} 형식을 쿼리 한 번으로 반환
+    """
+    try:
+        exam_id = await db.run_sync(resolve_exam_id, exam_id)
+        rows = (await db.execute(exam_overview_stmt(exam_id))).all()
+        return FastJSONResponse({
+            "examId": exam_id,
+            "totalStudents": rows[0].total_students if rows else 0,
+            "questions": [overview_question_from_row(row) for row in rows]
+        })
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"전체 요약 조회 중 오류가 발생했습니다: {str(e)}"
+        )
+
+
 @router.get("/questions/{question_id}/report")
 async def get_question_analysis_report(
     question_id: int,
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     문항별 답안 분석 결과, 문항별 정답률 조회 (인증 없음)
+    
+    question.data_version 기준 ETag / Last-Modified를 내려주며,
+    바뀐 것이 없으면 304, 같은 버전을 이미 만든 적이 있으면 메모리에 있는 응답을 그대로 돌려준다
     """
     try:
-        # 문항 존재 확인
-        question = db.query(Question).filter(Question.id == question_id).first()
+        # 문항 존재 확인 (+ 데이터 버전)
+        question = await db.get(Question, question_id)
         if not question:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="문항을 찾을 수 없습니다."
             )
         
-        # 해당 문항의 모든 답변 조회
-        answers = db.query(Answer).filter(Answer.question_id == question_id).all()
+        etag = make_etag(question_id, question.data_version)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_http_date(question.data_updated_at),
+            # 브라우저가 매번 재검증하도록 (변경이 없으면 304라서 비용이 거의 없음)
+            "Cache-Control": "no-cache",
+        }
+        if is_not_modified(if_none_match, if_modified_since, etag, question.data_updated_at):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
         
-        # 통계 계산
-        total_answers = len(answers)
-        correct_answers = 0
-        wrong_answers = []
+        cache_key = (question_id, question.data_version)
+        body = report_cache.get(cache_key)
+        if body is not None:
+            return Response(content=body, media_type="application/json", headers=headers)
         
-        for answer in answers:
-            # raw_score가 question.score와 같거나 큰 경우 정답으로 간주
-            if answer.raw_score is not None:
-                if answer.raw_score >= question.score:
-                    correct_answers += 1
-                else:
-                    wrong_answers.append({
-                        "answer_id": answer.id,
-                        "student_code": answer.answer_sheet.student_code,
-                        "answer_text": answer.answer_text,
-                        "score": float(answer.raw_score) if answer.raw_score else None,
-                        "max_score": float(question.score)
-                    })
-            else:
-                # 점수가 없는 경우 오답으로 간주
-                wrong_answers.append({
-                    "answer_id": answer.id,
-                    "student_code": answer.answer_sheet.student_code,
-                    "answer_text": answer.answer_text,
-                    "score": None,
-                    "max_score": float(question.score)
-                })
+        # 통계 (전체/정답/평균/점수 구간)는 question_pattern 누적값을 그대로 사용
+        # 아직 누적값이 없거나 배점이 바뀐 문항이면 answer 테이블에서 직접 집계
+        statistics = await db.run_sync(get_statistics, question)
+        if statistics is None:
+            stats_row = (await db.execute(question_statistics_stmt(question.exam_id, question_id, question.score))).one()
+            statistics = statistics_from_row(stats_row, question.score)
         
-        # 정답률 계산
-        correct_rate = (correct_answers / total_answers * 100) if total_answers > 0 else 0
+        # 오답 목록은 첫 페이지만 (나머지는 wrong_answers_next_cursor로 /wrong-answers 에서 조회)
+        wrong_answers, wrong_answers_next_cursor = await fetch_wrong_answers_page(
+            db, question, REPORT_WRONG_ANSWERS_LIMIT
+        )
         
         # 분석 결과 조회
-        analysis_result = db.query(AnalysisResult).filter(
-            AnalysisResult.question_id == question_id
-        ).first()
+        analysis_result = await db.scalar(
+            select(AnalysisResult).where(AnalysisResult.question_id == question_id)
+        )
         
-        return {
+        report = {
             "question_id": question_id,
             "question_number": question.number,
             "question_text": question.text,
             "max_score": float(question.score),
-            "statistics": {
-                "total_answers": total_answers,
-                "correct_answers": correct_answers,
-                "wrong_answers": len(wrong_answers),
-                "correct_rate": round(correct_rate, 2)
-            },
+            "statistics": statistics,
             "wrong_answers": wrong_answers,
+            "wrong_answers_next_cursor": wrong_answers_next_cursor,
             "analysis_result": {
                 "analysis_text": analysis_result.analysis_text if analysis_result else None,
                 "cluster_data": analysis_result.cluster_data if analysis_result else None
             } if analysis_result else None
         }
+        
+        # 버전을 읽은 뒤의 데이터로 만든 응답이므로 최소한 그 버전만큼은 최신이다
+        body = dumps(report)
+        report_cache.put(cache_key, body)
+        return Response(content=body, media_type="application/json", headers=headers)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"분석 리포트 조회 중 오류가 발생했습니다: {str(e)}"
         )
 
+
+@router.get("/questions/{question_id}/wrong-answers")
+async def list_wrong_answers(
+    question_id: int,
+    limit: int = Query(50, ge=1, le=MAX_WRONG_ANSWERS_LIMIT, description="페이지 크기 (format=ndjson이면 무시)"),
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+    min_score: Optional[Decimal] = Query(None, description="이 점수 이상만"),
+    max_score: Optional[Decimal] = Query(None, description="이 점수 이하만"),
+    student_code: Optional[str] = Query(None, description="특정 학생만"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json: 페이지 단위, ndjson: 전체를 한 줄에 한 건씩 스트리밍"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    문항별 오답 목록 조회 (인증 없음)
+
+    정렬: 점수 오름차순 (점수 없는 답안은 맨 뒤), 같은 점수는 answer.id 순
+    - format=json: {"items": [...], "next_cursor": ...} 형태로 limit개씩. next_cursor를 cursor로 넘기면 다음 페이지
+    - format=ndjson: cursor 이후의 오답 전체를 application/x-ndjson으로 스트리밍 (내부적으로 keyset으로 나눠 읽음)
+    - min_score / max_score를 주면 점수 없는 답안은 제외된다
+    """
+    question = await db.get(Question, question_id)
+    if not question:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="문항을 찾을 수 없습니다."
+        )
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    filters = {"min_score": min_score, "max_score_filter": max_score, "student_code": student_code}
+
+    if format == "ndjson":
+        async def stream_lines():
+            # 요청 세션은 응답 전송이 끝난 뒤에 닫히므로 스트리밍 중에도 그대로 쓸 수 있다
+            position = after
+            while True:
+                rows = (await db.execute(
+                    wrong_answers_page_stmt(
+                        question.exam_id, question.id, question.score, NDJSON_FETCH_SIZE, after=position, **filters
+                    )
+                )).all()
+                if not rows:
+                    break
+                yield b"".join(
+                    dumps(wrong_answer_to_dict(row, question.score)) + b"\n"
+                    for row in rows
+                )
+                if len(rows) < NDJSON_FETCH_SIZE:
+                    break
+                position = (rows[-1].raw_score, rows[-1].id)
+
+        return StreamingResponse(stream_lines(), media_type="application/x-ndjson")
+
+    items, next_cursor = await fetch_wrong_answers_page(db, question, limit, after=after, **filters)
+    return FastJSONResponse({
+        "question_id": question_id,
+        "items": items,
+        "next_cursor": next_cursor,
+    })
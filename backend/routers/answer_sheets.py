@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Request, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, AsyncIterator
 import json
+import time
+import zlib
 
-from models import AnswerSheet, Answer, Question
 from schemas import AnswerExtractionResult, AnswerKeyResult
 from dependencies import get_db
+from question_upsert import upsert_answer_key
+from ingest import bulk_upsert_extraction_results, delete_answer_sheet
+from exam_scope import resolve_exam_id
+from config import settings
 
 router = APIRouter(prefix="/answer-sheets", tags=["답안지"])
 
@@ -13,13 +18,15 @@ router = APIRouter(prefix="/answer-sheets", tags=["답안지"])
 @router.post("/answer-key", status_code=status.HTTP_201_CREATED)
 async def upload_answer_sheets(
     extraction_results_json: str = Form(...),
-    db: Session = Depends(get_db)
+    exam_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     여러개의 답안지 LLM 추출 결과(학생별 문항별 답안, 점수) JSON 받아서 Answer에 저장 (인증 없음)
     PDF 파일은 저장하지 않음
     
     - extraction_results_json: LLM 추출 결과들 (JSON 배열 문자열)
+    - exam_id: 시험 ID (없으면 현재 시험)
     """
     try:
         # LLM 추출 결과 파싱
@@ -33,66 +40,16 @@ async def upload_answer_sheets(
                 detail=f"LLM 추출 결과 JSON 파싱 실패: {str(e)}"
             )
         
-        uploaded_sheets = []
+        # 문항 조회 1회 + 답안지/답안 set-based upsert
+        exam_id = await db.run_sync(resolve_exam_id, exam_id, True)
+        summary = await db.run_sync(bulk_upsert_extraction_results, exam_id, extraction_results)
         
-        # 각 추출 결과 처리
-        for idx, extraction_result in enumerate(extraction_results):
-            
-            # AnswerSheet 생성 또는 조회 (student_code만으로)
-            student_code = extraction_result.student_code if extraction_result else f"student_{idx}"
-            answer_sheet = db.query(AnswerSheet).filter(
-                AnswerSheet.student_code == student_code
-            ).first()
-            
-            if not answer_sheet:
-                # 새 답안지 생성
-                answer_sheet = AnswerSheet(
-                    student_code=student_code
-                )
-                db.add(answer_sheet)
-                db.flush()  # ID를 얻기 위해 flush
-            
-            # LLM 추출 결과로 Answer에 저장
-            if extraction_result:
-                for answer_item in extraction_result.answers:
-                    # 문항 조회 (number만으로)
-                    question = db.query(Question).filter(
-                        Question.number == answer_item.question_number
-                    ).first()
-                    
-                    if not question:
-                        continue  # 문항이 없으면 스킵
-                    
-                    # 기존 답변 확인
-                    existing_answer = db.query(Answer).filter(
-                        Answer.answer_sheet_id == answer_sheet.id,
-                        Answer.question_id == question.id
-                    ).first()
-                    
-                    if existing_answer:
-                        # 기존 답변 업데이트
-                        existing_answer.answer_text = answer_item.answer_text
-                        existing_answer.raw_score = answer_item.score
-                    else:
-                        # 새 답변 생성
-                        db_answer = Answer(
-                            answer_sheet_id=answer_sheet.id,
-                            question_id=question.id,
-                            answer_text=answer_item.answer_text,
-                            raw_score=answer_item.score
-                        )
-                        db.add(db_answer)
-            
-            uploaded_sheets.append({
-                "student_code": extraction_result.student_code,
-                "answers_count": len(extraction_result.answers)
-            })
-        
-        db.commit()
+        await db.commit()
         
         return {
             "message": f"{len(extraction_results)}개의 답안지 정보가 저장되었습니다.",
-            "uploaded_sheets": uploaded_sheets
+            "exam_id": exam_id,
+            "uploaded_sheets": summary["uploaded_sheets"]
         }
     
     except ValueError as e:
@@ -101,22 +58,182 @@ async def upload_answer_sheets(
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"답안지 업로드 중 오류가 발생했습니다: {str(e)}"
         )
 
 
+# 응답에 상세 내용을 담을 최대 오류 줄 수
+MAX_REPORTED_LINE_ERRORS = 50
+
+
+# gzip 본문을 한 번에 풀어낼 최대 크기 (압축 폭탄이 메모리를 한꺼번에 잡지 않도록)
+DECOMPRESS_CHUNK_BYTES = 64 * 1024
+
+
+def _split_new_lines(buffer: bytearray, data: bytes) -> List[bytes]:
+    """
+    새로 받은 data만 잘라서 완성된 줄을 돌려주고, 마지막 미완성 줄은 buffer에 남긴다
+    (앞서 받은 부분은 다시 훑지 않음)
+    """
+    parts = data.split(b"\n")
+    if len(parts) == 1:
+        buffer += data
+        lines = []
+    else:
+        lines = [bytes(buffer) + parts[0], *parts[1:-1]]
+        buffer[:] = parts[-1]
+    if len(buffer) > settings.INGEST_MAX_LINE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"한 줄이 너무 깁니다 (최대 {settings.INGEST_MAX_LINE_BYTES}바이트)"
+        )
+    return lines
+
+
+async def _iter_request_lines(request: Request) -> AsyncIterator[bytes]:
+    """
+    요청 본문을 청크 단위로 읽어 줄 단위로 돌려준다 (Content-Encoding: gzip 지원)
+    gzip은 DECOMPRESS_CHUNK_BYTES씩 나눠 풀고, 풀린 본문이 INGEST_MAX_BODY_BYTES를 넘으면 413
+    """
+    decompressor = None
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    buffer = bytearray()
+    total = 0
+
+    def accept(data: bytes) -> List[bytes]:
+        nonlocal total
+        total += len(data)
+        if total > settings.INGEST_MAX_BODY_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"본문이 너무 큽니다 (압축 해제 후 최대 {settings.INGEST_MAX_BODY_BYTES}바이트)"
+            )
+        return _split_new_lines(buffer, data)
+
+    async for chunk in request.stream():
+        if not decompressor:
+            for line in accept(chunk):
+                yield line
+            continue
+        while chunk:
+            for line in accept(decompressor.decompress(chunk, DECOMPRESS_CHUNK_BYTES)):
+                yield line
+            chunk = decompressor.unconsumed_tail
+
+    if decompressor:
+        for line in accept(decompressor.flush()):
+            yield line
+    yield bytes(buffer)
+
+
+@router.post("/stream", status_code=status.HTTP_201_CREATED)
+async def stream_answer_sheets(
+    request: Request,
+    batch_size: Optional[int] = Query(None, ge=1, le=10000),
+    exam_id: Optional[int] = Query(None, description="시험 ID (없으면 현재 시험)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    답안지 LLM 추출 결과를 NDJSON(한 줄에 학생 한 명)으로 스트리밍 업로드 (인증 없음)
+    본문 전체를 메모리에 올리지 않고 읽는 대로 검증하고 batch_size명 단위로 commit 합니다.
+    
+    - 본문: application/x-ndjson, Content-Encoding: gzip 가능
+      {"student_code": "2271001", "answers": [{"question_number": 1, "answer_text": "...", "score": 10}]}
+    - batch_size: 한 번에 commit할 학생 수 (기본값: INGEST_BATCH_SIZE)
+    - exam_id: 시험 ID (없으면 현재 시험)
+    
+    형식이 잘못된 줄은 건너뛰고 line_errors에 기록합니다.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    started_at = time.monotonic()
+    batch = []
+    batches = []
+    line_errors = []
+    error_count = 0
+    line_no = 0
+    total_students = 0
+
+    async def flush_batch():
+        nonlocal total_students
+        summary = await db.run_sync(bulk_upsert_extraction_results, exam_id, batch)
+        await db.commit()
+        total_students += len(summary["uploaded_sheets"])
+        batches.append({
+            "batch": len(batches) + 1,
+            "students": len(summary["uploaded_sheets"]),
+            "answers": summary["inserted_answers"] + summary["updated_answers"],
+            "skipped_answers": summary["skipped_answers"],
+            "last_line": line_no,
+            "elapsed_ms": round((time.monotonic() - started_at) * 1000, 1)
+        })
+        batch.clear()
+
+    try:
+        exam_id = await db.run_sync(resolve_exam_id, exam_id, True)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    try:
+        async for raw_line in _iter_request_lines(request):
+            line_no += 1
+            line = raw_line.strip()
+            if not line:
+                continue
+            
+            try:
+                batch.append(AnswerExtractionResult(**json.loads(line)))
+            except Exception as e:
+                error_count += 1
+                if len(line_errors) < MAX_REPORTED_LINE_ERRORS:
+                    line_errors.append({"line": line_no, "error": str(e)})
+                continue
+            
+            if len(batch) >= batch_size:
+                await flush_batch()
+        
+        if batch:
+            await flush_batch()
+    
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"답안지 스트리밍 업로드 중 오류가 발생했습니다 ({len(batches)}개 배치, {total_students}명 저장 후 중단): {str(e)}"
+        )
+    
+    return {
+        "message": f"{total_students}개의 답안지 정보가 저장되었습니다.",
+        "exam_id": exam_id,
+        "total_students": total_students,
+        "batch_size": batch_size,
+        "batches": batches,
+        "error_count": error_count,
+        "line_errors": line_errors
+    }
+
+
 @router.post("/upload", status_code=status.HTTP_201_CREATED)
 async def upload_answer_key(
     answer_key_json: str = Form(...),
-    db: Session = Depends(get_db)
+    exam_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     정답표 JSON을 받아서 Question 모델의 answer_text에 저장 (인증 없음)
     score.py 형식의 JSON을 받습니다.
     
+    - exam_id: 시험 ID (없으면 현재 시험)
     - answer_key_json: 정답표 JSON
       {
         "answers": [
@@ -159,28 +276,22 @@ async def upload_answer_key(
                 detail="정답이 없습니다."
             )
         
-        updated_count = 0
-        
-        # 정답표를 Question 모델에 저장
-        for answer_item in answer_key_result.answers:
-            # 문항 조회
-            question = db.query(Question).filter(
-                Question.number == answer_item.question_number
-            ).first()
-            
-            if question:
-                # 기존 문항에 정답 업데이트
-                question.answer_text = answer_item.answer_text
-                updated_count += 1
-            else:
-                # 문항이 없으면 경고만 (문항은 먼저 생성되어야 함)
-                continue
+        # 정답표를 한 문장으로 저장 (문항이 없으면 제외, 문항은 먼저 생성되어야 함 / 정답이 같으면 건드리지 않음)
+        exam_id = await db.run_sync(resolve_exam_id, exam_id)
+        summary = await db.run_sync(
+            upsert_answer_key,
+            exam_id,
+            [(item.question_number, item.answer_text) for item in answer_key_result.answers]
+        )
         
-        db.commit()
+        await db.commit()
         
         return {
             "message": "정답표가 저장되었습니다.",
-            "updated_questions": updated_count,
+            "exam_id": exam_id,
+            "updated_questions": len(summary["updated"]),
+            "unchanged_questions": len(summary["unchanged"]),
+            "missing_questions": summary["missing"],
             "total_answers": len(answer_key_result.answers)
         }
     
@@ -192,9 +303,50 @@ async def upload_answer_key(
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"정답표 저장 중 오류가 발생했습니다: {str(e)}"
         )
 
+
+@router.delete("/{student_code}")
+async def remove_answer_sheet(
+    student_code: str,
+    exam_id: Optional[int] = Query(None, description="시험 ID (없으면 현재 시험)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    학생 답안지와 답안 삭제 (인증 없음)
+    문항별 누적 통계에서도 해당 답안들을 빼준다
+    """
+    try:
+        exam_id = await db.run_sync(resolve_exam_id, exam_id)
+        deleted_answers = await db.run_sync(delete_answer_sheet, exam_id, student_code)
+        if deleted_answers is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="답안지를 찾을 수 없습니다."
+            )
+        
+        await db.commit()
+        
+        return {
+            "message": "답안지가 삭제되었습니다.",
+            "student_code": student_code,
+            "deleted_answers": deleted_answers
+        }
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"답안지 삭제 중 오류가 발생했습니다: {str(e)}"
+        )
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from models import Exam
 from schemas import ExamCreate, ExamResponse
-from dependencies import get_db
+from dependencies import get_db, get_read_db
+from exam_scope import DEFAULT_EXAM_TITLE, current_exam, archive_exam, restore_exam
+from exam_scope import create_exam as create_exam_with_partition
+from question_catalog import invalidate_catalog
 
 router = APIRouter(prefix="/exams", tags=["시험"])
 
@@ -12,36 +16,40 @@ router = APIRouter(prefix="/exams", tags=["시험"])
 @router.post("", response_model=ExamResponse, status_code=status.HTTP_201_CREATED)
 async def create_exam(
     exam: ExamCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """시험 생성 (인증 없음)"""
-    db_exam = Exam(
-        title=exam.title,
+    """시험 생성 (answer 파티션도 같이 생성) (인증 없음)"""
+    db_exam = await db.run_sync(
+        create_exam_with_partition,
+        exam.title,
         description=exam.description,
         exam_date=exam.exam_date,
         llm_analysis_text=exam.llm_analysis_text
     )
-    db.add(db_exam)
-    db.commit()
-    db.refresh(db_exam)
+    await db.commit()
+    await db.refresh(db_exam)
     return db_exam
 
 
 @router.get("", response_model=List[ExamResponse])
 async def get_exams(
-    db: Session = Depends(get_db)
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """시험 목록 조회 (인증 없음)"""
-    exams = db.query(Exam).all()
+    """시험 목록 조회 (include_archived=true면 보관된 시험 포함) (인증 없음)"""
+    stmt = select(Exam).order_by(Exam.id)
+    if not include_archived:
+        stmt = stmt.where(Exam.archived_at.is_(None))
+    exams = (await db.scalars(stmt)).all()
     return exams
 
 
 @router.get("/current", response_model=ExamResponse)
 async def get_current_exam(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """현재 시험 조회 (시험이 하나만 있다고 가정) (인증 없음)"""
-    exam = db.query(Exam).first()
+    """현재 시험 조회 (보관되지 않은 가장 최근 시험) (인증 없음)"""
+    exam = await db.run_sync(current_exam)
     if not exam:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,22 +61,73 @@ async def get_current_exam(
 @router.post("/llm-analysis", response_model=ExamResponse)
 async def update_exam_llm_analysis(
     llm_analysis_text: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    시험지 LLM 분석 텍스트 업데이트 (시험이 하나만 있다고 가정) (인증 없음)
+    현재 시험의 시험지 LLM 분석 텍스트 업데이트 (인증 없음)
     
     - llm_analysis_text: LLM API로 받은 시험지 분석 텍스트
     """
-    exam = db.query(Exam).first()
+    exam = await db.run_sync(current_exam)
     if not exam:
         # 시험이 없으면 생성
-        exam = Exam(title="기본 시험")
-        db.add(exam)
-        db.flush()
+        exam = await db.run_sync(create_exam_with_partition, DEFAULT_EXAM_TITLE)
     
     exam.llm_analysis_text = llm_analysis_text
-    db.commit()
-    db.refresh(exam)
+    await db.commit()
+    await db.refresh(exam)
     return exam
 
+
+async def _get_exam_or_404(db: AsyncSession, exam_id: int) -> Exam:
+    exam = await db.get(Exam, exam_id, with_for_update=True)
+    if not exam:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="시험을 찾을 수 없습니다."
+        )
+    return exam
+
+
+@router.post("/{exam_id}/archive", response_model=ExamResponse)
+async def archive_exam_endpoint(
+    exam_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    시험 보관 (인증 없음)
+    answer 파티션을 분리해서 현재 시험 쿼리/인덱스에서 빠지게 한다. 데이터는 지우지 않는다.
+    """
+    exam = await _get_exam_or_404(db, exam_id)
+    try:
+        await db.run_sync(archive_exam, exam)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"시험 보관 중 오류가 발생했습니다: {str(e)}"
+        )
+    invalidate_catalog(exam_id)
+    await db.refresh(exam)
+    return exam
+
+
+@router.post("/{exam_id}/restore", response_model=ExamResponse)
+async def restore_exam_endpoint(
+    exam_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """시험 보관 해제: 분리했던 answer 파티션을 다시 붙인다 (인증 없음)"""
+    exam = await _get_exam_or_404(db, exam_id)
+    try:
+        await db.run_sync(restore_exam, exam)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"시험 복원 중 오류가 발생했습니다: {str(e)}"
+        )
+    await db.refresh(exam)
+    return exam
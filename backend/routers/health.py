@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+
+from database import engine, async_engine, read_async_engine, pool_status
+from report_cache import report_cache
+
+router = APIRouter(prefix="/health", tags=["상태 확인"])
+
+
+@router.get("/db-pool")
+async def get_db_pool_status():
+    """
+    DB 커넥션 풀 상태 조회 (인증 없음)
+    
+    - checked_out: 사용 중인 커넥션 수
+    - idle: 풀에서 대기 중인 커넥션 수
+    - overflow: pool_size를 넘어 추가로 연 커넥션 수
+    - wait: 커넥션을 얻기까지 기다린 시간 통계 (avg_ms, max_ms, timeouts)
+    - read: 읽기 전용 복제본 풀 (READ_DATABASE_URL이 없으면 null)
+    """
+    return {
+        "sync": pool_status(engine),
+        "async": pool_status(async_engine),
+        "read": pool_status(read_async_engine) if read_async_engine is not None else None
+    }
+
+
+@router.get("/report-cache")
+async def get_report_cache_status():
+    """
+    이 프로세스의 문항 리포트 응답 캐시 상태 조회 (인증 없음)
+    """
+    return report_cache.stats()
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import json
 import re
-from decimal import Decimal
 
-from models import Question
 from schemas import QuestionExtractionResult, TestParseResult, AnswerKeyResult
 from dependencies import get_db
+from question_catalog import reload_catalog
+from question_upsert import upsert_questions, upsert_answer_key
+from exam_scope import resolve_exam_id
 
 router = APIRouter(prefix="/question-papers", tags=["문제지"])
 
@@ -30,11 +32,13 @@ def count_subquestions(text: str) -> int:
 @router.post("/upload", status_code=status.HTTP_201_CREATED)
 async def upload_question_paper(
     extraction_result_json: str = Form(...),
-    db: Session = Depends(get_db)
+    exam_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     test_parse.py의 결과(시험지 문제 추출 JSON 결과)를 받아서 Question에 저장 (인증 없음)
     
+    - exam_id: 시험 ID (없으면 현재 시험, 시험이 하나도 없으면 기본 시험 생성)
     - extraction_result_json: test_parse.py의 parse_exam 함수 반환 형식 JSON
       {
         "problems": [
@@ -49,7 +53,6 @@ async def upload_question_paper(
       }
     """
     try:
-        questions_created = []
         parsed_data = None
         
         # JSON 파싱
@@ -110,36 +113,24 @@ async def upload_question_paper(
                 detail="추출된 문제가 없습니다."
             )
         
-        # test_parse.py 결과를 Question 모델에 저장
-        for problem in test_parse_result.problems:
-            # 문항 번호 중복 확인
-            existing_question = db.query(Question).filter(
-                Question.number == problem.problem_index
-            ).first()
-            
-            if existing_question:
-                # 기존 문항 업데이트
-                existing_question.text = problem.raw_text
-                existing_question.score = Decimal(str(problem.score))
-            else:
-                # 새 문항 생성
-                db_question = Question(
-                    number=problem.problem_index,
-                    text=problem.raw_text,
-                    score=Decimal(str(problem.score))
-                )
-                db.add(db_question)
-                questions_created.append(db_question)
-        
-        db.commit()
+        # test_parse.py 결과를 Question 모델에 한 문장으로 저장 (지문/배점이 그대로인 문항은 건드리지 않음)
+        exam_id = await db.run_sync(resolve_exam_id, exam_id, True)
+        summary = await db.run_sync(
+            upsert_questions,
+            exam_id,
+            [(problem.problem_index, problem.raw_text, problem.score) for problem in test_parse_result.problems]
+        )
         
-        # 생성된 문항들 refresh
-        for q in questions_created:
-            db.refresh(q)
+        await db.commit()
+        if summary["created"] or summary["updated"]:
+            await db.run_sync(reload_catalog, exam_id)
         
         return {
             "message": "문제지 정보가 저장되었습니다.",
-            "questions_created": len(questions_created),
+            "exam_id": exam_id,
+            "questions_created": len(summary["created"]),
+            "questions_updated": len(summary["updated"]),
+            "questions_unchanged": len(summary["unchanged"]),
             "total_questions": len(test_parse_result.problems),
             "total_score": test_parse_result.total_score
         }
@@ -152,7 +143,7 @@ async def upload_question_paper(
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"문제지 업로드 중 오류가 발생했습니다: {str(e)}"
@@ -162,12 +153,14 @@ async def upload_question_paper(
 @router.post("/answer-key", status_code=status.HTTP_201_CREATED)
 async def upload_answer_key(
     answer_key_json: str = Form(...),
-    db: Session = Depends(get_db)
+    exam_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     정답표 JSON을 받아서 Question 모델의 answer_text에 저장 (인증 없음)
     score.py 형식의 JSON을 받습니다.
     
+    - exam_id: 시험 ID (없으면 현재 시험)
     - answer_key_json: 정답표 JSON
       {
         "answers": [
@@ -210,28 +203,22 @@ async def upload_answer_key(
                 detail="정답이 없습니다."
             )
         
-        updated_count = 0
-        
-        # 정답표를 Question 모델에 저장
-        for answer_item in answer_key_result.answers:
-            # 문항 조회
-            question = db.query(Question).filter(
-                Question.number == answer_item.question_number
-            ).first()
-            
-            if question:
-                # 기존 문항에 정답 업데이트
-                question.answer_text = answer_item.answer_text
-                updated_count += 1
-            else:
-                # 문항이 없으면 경고만 (문항은 먼저 생성되어야 함)
-                continue
+        # 정답표를 한 문장으로 저장 (문항이 없으면 제외, 문항은 먼저 생성되어야 함 / 정답이 같으면 건드리지 않음)
+        exam_id = await db.run_sync(resolve_exam_id, exam_id)
+        summary = await db.run_sync(
+            upsert_answer_key,
+            exam_id,
+            [(item.question_number, item.answer_text) for item in answer_key_result.answers]
+        )
         
-        db.commit()
+        await db.commit()
         
         return {
             "message": "정답표가 저장되었습니다.",
-            "updated_questions": updated_count,
+            "exam_id": exam_id,
+            "updated_questions": len(summary["updated"]),
+            "unchanged_questions": len(summary["unchanged"]),
+            "missing_questions": summary["missing"],
             "total_answers": len(answer_key_result.answers)
         }
     
@@ -243,7 +230,7 @@ async def upload_answer_key(
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"정답표 저장 중 오류가 발생했습니다: {str(e)}"
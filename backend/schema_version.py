@@ -0,0 +1,38 @@
+"""
+DB 스키마 리비전 확인
+
+스키마는 Alembic 마이그레이션(migrations/)이 기준이다.
+서버는 부팅할 때 테이블을 만들지 않고, 현재 DB 리비전이 코드의 head 리비전과 같은지만 확인한다.
+"""
+import os
+
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+ALEMBIC_INI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def get_head_revision() -> str:
+    """코드에 있는 마이그레이션의 head 리비전"""
+    config = Config(ALEMBIC_INI_PATH)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI_PATH), "migrations"))
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def get_current_revision(connection) -> str | None:
+    """DB에 기록된 현재 리비전 (동기 Connection)"""
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+async def check_schema_revision(async_engine) -> None:
+    """DB 리비전이 head와 다르면 RuntimeError (alembic upgrade head 필요)"""
+    head = get_head_revision()
+    async with async_engine.connect() as conn:
+        current = await conn.run_sync(get_current_revision)
+
+    if current != head:
+        raise RuntimeError(
+            f"DB 스키마 리비전({current})이 최신({head})이 아닙니다. "
+            "backend 폴더에서 'alembic upgrade head'를 실행하세요."
+        )
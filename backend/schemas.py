@@ -29,6 +29,7 @@ class ExamResponse(ExamBase):
     id: int
     created_at: datetime
     updated_at: datetime
+    archived_at: Optional[datetime] = None  # 보관된 시험이면 보관 시각
     
     class Config:
         from_attributes = True
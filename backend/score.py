@@ -1,41 +1,47 @@
 import os
 import sys
-import base64
 import json
+import re
 import argparse
 import glob
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from decimal import Decimal
-from openai import OpenAI
 from dotenv import load_dotenv
 
 # 상위 디렉토리를 경로에 추가 (backend 모듈 import를 위해)
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import SessionLocal
-from models import AnswerSheet, Answer, Question
+from ingest import bulk_upsert_extraction_results
+from exam_scope import resolve_exam_id
+from llm_client import chat_completion
+from vision_cache import vision_cache
+from config import settings
+import image_preprocess
+import rasterize
 
 # .env 파일에서 환경변수 로드
 load_dotenv()
 
-# OpenAI API 키를 환경변수에서 읽어오기
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+SCORE_MODEL = "gpt-4o-mini"  # 또는 gpt-4o / gpt-4.1 등 비전 지원 모델
+# 프롬프트나 응답 형식을 바꾸면 올릴 것 (비전 캐시 키에 들어감)
+SCORE_PROMPT_VERSION = "score-v1"
 
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY 환경변수가 설정되지 않았습니다.")
+def encode_image(image_path: str) -> dict:
+    """이미지를 전처리(image_preprocess)해서 messages에 넣을 image_url 항목으로"""
+    return image_preprocess.image_part(image_path, "score")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+def _cache_args() -> dict:
+    return {"prompt_version": f"{SCORE_PROMPT_VERSION}+{image_preprocess.cache_tag('score')}", "model": SCORE_MODEL}
 
-def encode_image(image_path: str) -> str:
-    """이미지를 base64 data URL 형태로 인코딩"""
-    import mimetypes
-    mime_type = mimetypes.guess_type(image_path)[0] or "image/png"
-    with open(image_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return f"data:{mime_type};base64,{b64}"
 
 def parse_sheet(image_path: str) -> dict:
-    image_data_url = encode_image(image_path)
+    """점수표 이미지 → {"student_code", "answers"} (같은 이미지를 이미 파싱했으면 비전 캐시에서)"""
+    return vision_cache.fetch("score", image_path, lambda: request_sheet(image_path), **_cache_args())
+
+
+def request_sheet(image_path: str) -> dict:
+    image_content = encode_image(image_path)
 
     prompt = """
 이미지에는 한 학생의 답안이 있으며,
@@ -94,18 +100,16 @@ def parse_sheet(image_path: str) -> dict:
 
 
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",  # 또는 gpt-4o / gpt-4.1 등 비전 지원 모델
+    response = chat_completion(
+        label=f"score {os.path.basename(image_path)}",
+        model=SCORE_MODEL,
         response_format={"type": "json_object"},  # JSON 모드
         messages=[
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": image_data_url},
-                    },
+                    image_content,
                 ],
             }
         ],
@@ -119,68 +123,222 @@ def parse_sheet(image_path: str) -> dict:
     return result
 
 
-def save_to_db(result: dict, db) -> dict:
-    """parse_sheet 결과를 DB에 저장"""
+BATCH_PROMPT = """
+이미지 {count}장이 순서대로 주어지며, 각 이미지 바로 앞에 "[이미지 i]" 표시가 있습니다 (i는 0부터 {last}까지).
+각 이미지에는 한 학생의 답안이 있으며,
+상단에 "학번 : XXXX" 형식의 텍스트와
+그 아래에 '문항'과 '점수' 헤더를 가진 표가 있습니다.
+
+당신의 임무는 이미지마다 학번과 각 문항의 점수를 읽어,
+아래 예시와 같은 형식의 JSON 객체 하나만 출력하는 것입니다.
+
+예시 (이미지 2장):
+{{
+  "sheets": [
+    {{
+      "image_index": 0,
+      "student_code": "2271022",
+      "answers": [
+        {{"question_number": 1, "answer_text": "", "score": 15}},
+        {{"question_number": 2, "answer_text": "", "score": 20}}
+      ]
+    }},
+    {{
+      "image_index": 1,
+      "student_code": "2271023",
+      "answers": [
+        {{"question_number": 1, "answer_text": "", "score": 10}},
+        {{"question_number": 2, "answer_text": "", "score": 5}}
+      ]
+    }}
+  ]
+}}
+
+규칙:
+- sheets에는 이미지마다 정확히 한 항목을 image_index 순서대로 넣으세요. 이미지를 건너뛰거나 합치지 마세요.
+- image_index: 그 이미지 앞의 "[이미지 i]" 번호 i (정수).
+- 한 항목의 학번과 점수는 반드시 같은 이미지에서만 읽으세요. 다른 이미지의 값을 섞지 마세요.
+- student_code:
+  - "학번" 또는 "학 번"이라는 단어 뒤에 나오는 숫자 전체를 문자열로 넣으세요.
+  - 숫자 사이에 공백이나 하이픈이 있어도 모두 붙인 하나의 문자열로 만드세요.
+  - 학번을 읽을 수 없으면 빈 문자열("")로 넣으세요.
+- answers:
+  - question_number: 표에서 '문항' 열에 있는 값을 정수형 숫자로 넣으세요. (예: "1" → 1)
+  - answer_text: 답안 텍스트가 없으므로 빈 문자열("")로 넣으세요.
+  - score: 같은 행의 '점수' 열 값을 정수형 숫자로 넣으세요. (예: "15" → 15)
+  - 문항 번호가 숫자가 아니거나, 점수가 인식되지 않은 행은 무시하세요.
+  - 표에 존재하는 모든 문항을 누락 없이 포함하세요.
+- 표에 다른 열이 더 있더라도, '문항'과 '점수' 두 열만 사용하세요.
+- JSON 이외의 설명, 주석, 불필요한 텍스트는 절대 출력하지 마세요.
+"""
+# 한 장당 출력 토큰 (단건 요청의 max_tokens와 같음)
+MAX_TOKENS_PER_SHEET = 300
+
+_STUDENT_CODE = re.compile(r"^[0-9A-Za-z]+$")
+
+
+def validate_sheet(entry) -> dict | None:
+    """
+    배치 응답의 한 항목을 parse_sheet 결과 형식으로 정리 (형식이 어긋나면 None → 단건으로 다시 요청)
+    """
+    if not isinstance(entry, dict):
+        return None
+    student_code = re.sub(r"[\s-]", "", str(entry.get("student_code") or ""))
+    if not _STUDENT_CODE.match(student_code):
+        return None
+    answers = entry.get("answers")
+    if not isinstance(answers, list) or not answers:
+        return None
+
+    normalized = []
+    seen_numbers = set()
+    for answer in answers:
+        if not isinstance(answer, dict):
+            return None
+        number, score = answer.get("question_number"), answer.get("score")
+        if isinstance(number, bool) or isinstance(score, bool):
+            return None
+        try:
+            number = int(number)
+            score = float(score)
+        except (TypeError, ValueError):
+            return None
+        if number in seen_numbers or score < 0:
+            return None
+        seen_numbers.add(number)
+        normalized.append({
+            "question_number": number,
+            "answer_text": "",
+            "score": int(score) if score.is_integer() else score,
+        })
+    return {"student_code": student_code, "answers": normalized}
+
+
+def request_sheet_batch(image_paths: list) -> list:
+    """
+    점수표 여러 장을 한 요청으로 → image_paths 순서대로 결과 (검증에 실패한 자리는 None)
+    한 응답 안에서 image_index가 중복/누락되거나 같은 학번이 두 번 나오면 그 항목들은 믿지 않는다
+    """
+    content = [{"type": "text", "text": BATCH_PROMPT.format(count=len(image_paths), last=len(image_paths) - 1)}]
+    for index, image_path in enumerate(image_paths):
+        content.append({"type": "text", "text": f"[이미지 {index}]"})
+        content.append(encode_image(image_path))
+
+    response = chat_completion(
+        label=f"score batch x{len(image_paths)}",
+        model=SCORE_MODEL,
+        response_format={"type": "json_object"},
+        messages=[{"role": "user", "content": content}],
+        max_tokens=MAX_TOKENS_PER_SHEET * len(image_paths),
+    )
+    sheets = json.loads(response.choices[0].message.content).get("sheets")
+    if not isinstance(sheets, list):
+        return [None] * len(image_paths)
+
+    by_index = {}
+    duplicated = set()
+    for entry in sheets:
+        index = entry.get("image_index") if isinstance(entry, dict) else None
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(image_paths):
+            continue
+        if index in by_index:
+            duplicated.add(index)
+        by_index[index] = validate_sheet(entry)
+
+    results = [None if index in duplicated else by_index.get(index) for index in range(len(image_paths))]
+
+    # 학번이 겹치면 어느 이미지의 것인지 알 수 없으므로 둘 다 단건으로
+    codes = [result["student_code"] for result in results if result]
+    repeated = {code for code in codes if codes.count(code) > 1}
+    return [None if result and result["student_code"] in repeated else result for result in results]
+
+
+def parse_sheets(image_paths: list, batch_size: int | None = None, strict: bool = True, workers: int | None = None) -> list:
+    """
+    점수표 여러 장 파싱 → image_paths 순서대로 parse_sheet 결과 목록
+    PDF(묶음 스캔)는 쪽마다 한 장으로 펼친다 (결과는 rasterize.expand_pages 순서, 이미지만 넘기면 image_paths와 같은 길이)
+    - 비전 캐시에 있는 장은 요청하지 않는다
+    - 나머지를 batch_size장씩 한 요청으로 묶어 (동시에) 보낸다
+    - 배치 응답에서 검증에 실패한 장(배치 요청 자체가 실패하면 그 배치 전체)은 한 장씩 다시 요청
+    batch_size가 1이면 전부 한 장씩 요청한다.
+    strict=False면 한 장씩 요청한 것이 실패해도 예외 대신 경고를 남기고 그 자리를 None으로 둔다.
+    workers: 동시에 보낼 요청 수 (기본값: ANALYSIS_CONCURRENCY, 1이면 한 요청씩)
+    """
+    batch_size = max(1, batch_size or settings.SCORE_BATCH_SIZE)
+    image_paths = rasterize.expand_pages(image_paths)
+    results = [None] * len(image_paths)
+
+    pending = []
+    for index, image_path in enumerate(image_paths):
+        cached = vision_cache.lookup("score", image_path, **_cache_args())
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.append(index)
+    # 한 장만 남는 배치는 단건 프롬프트로 보낸다
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)] if batch_size > 1 else []
+    batches = [batch for batch in batches if len(batch) > 1]
+    batched = {index for batch in batches for index in batch}
+    retry = [index for index in pending if index not in batched]
+
+    def run_batch(indexes):
+        try:
+            return request_sheet_batch([image_paths[index] for index in indexes])
+        except Exception as e:
+            print(f"⚠️  점수표 배치 요청 실패 ({len(indexes)}장, 한 장씩 다시 요청): {e}", file=sys.stderr)
+            return [None] * len(indexes)
+
+    def run_single(index):
+        image_path = image_paths[index]
+        try:
+            result = request_sheet(image_path)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"⚠️ 점수표 파싱 실패 ({image_path}): {e}", file=sys.stderr)
+            return None
+        vision_cache.store("score", image_path, result, **_cache_args())
+        return result
+
+    workers = max(1, workers or settings.ANALYSIS_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for indexes, batch_results in zip(batches, pool.map(run_batch, batches)):
+            for index, result in zip(indexes, batch_results):
+                if result is None:
+                    retry.append(index)
+                    continue
+                results[index] = result
+                vision_cache.store("score", image_paths[index], result, **_cache_args())
+
+        for index, result in zip(retry, pool.map(run_single, retry)):
+            results[index] = result
+
+    print(
+        f"📋 점수표 {len(image_paths)}장: 캐시 {len(image_paths) - len(pending)}장, "
+        f"배치 요청 {len(batches)}회 ({len(batched)}장), 한 장씩 요청 {len(retry)}장",
+        file=sys.stderr,
+    )
+    return results
+
+
+def save_to_db(result: dict, db, exam_id: int | None = None) -> dict:
+    """parse_sheet 결과를 DB에 저장 (문항 카탈로그 캐시 + bulk upsert 경로 사용, exam_id가 없으면 현재 시험)"""
     from schemas import AnswerExtractionResult
     
     try:
         # 스키마 검증
         extraction_result = AnswerExtractionResult(**result)
-        
-        # AnswerSheet 생성 또는 조회
         student_code = extraction_result.student_code
-        answer_sheet = db.query(AnswerSheet).filter(
-            AnswerSheet.student_code == student_code
-        ).first()
-        
-        if not answer_sheet:
-            # 새 답안지 생성
-            answer_sheet = AnswerSheet(
-                student_code=student_code
-            )
-            db.add(answer_sheet)
-            db.flush()  # ID를 얻기 위해 flush
-        
-        # Answer에 저장
-        saved_count = 0
-        updated_count = 0
-        skipped_count = 0
         
-        for answer_item in extraction_result.answers:
-            # 문항 조회
-            question = db.query(Question).filter(
-                Question.number == answer_item.question_number
-            ).first()
-            
-            if not question:
-                print(f"    ⚠️ 문항 {answer_item.question_number}번이 DB에 없어 스킵합니다. (문제지를 먼저 업로드하세요)", file=sys.stderr)
-                skipped_count += 1
-                continue  # 문항이 없으면 스킵
-            
-            # 기존 답변 확인
-            existing_answer = db.query(Answer).filter(
-                Answer.answer_sheet_id == answer_sheet.id,
-                Answer.question_id == question.id
-            ).first()
-            
-            if existing_answer:
-                # 기존 답변 업데이트
-                existing_answer.answer_text = answer_item.answer_text
-                existing_answer.raw_score = Decimal(str(answer_item.score)) if answer_item.score else None
-                updated_count += 1
-            else:
-                # 새 답변 생성
-                db_answer = Answer(
-                    answer_sheet_id=answer_sheet.id,
-                    question_id=question.id,
-                    answer_text=answer_item.answer_text,
-                    raw_score=Decimal(str(answer_item.score)) if answer_item.score else None
-                )
-                db.add(db_answer)
-                saved_count += 1
+        # AnswerSheet / Answer upsert (문항이 없는 답변은 스킵)
+        exam_id = resolve_exam_id(db, exam_id, create_if_missing=True)
+        summary = bulk_upsert_extraction_results(db, exam_id, [extraction_result])
+        saved_count = summary["inserted_answers"]
+        updated_count = summary["updated_answers"]
+        skipped_count = summary["skipped_answers"]
         
         if skipped_count > 0:
-            print(f"    ⚠️ {skipped_count}개 답변이 문항이 없어 저장되지 않았습니다.", file=sys.stderr)
+            print(f"    ⚠️ {skipped_count}개 답변이 문항이 없어 저장되지 않았습니다. (문제지를 먼저 업로드하세요)", file=sys.stderr)
         if updated_count > 0:
             print(f"    ℹ️ {updated_count}개 답변이 업데이트되었습니다.", file=sys.stderr)
         
@@ -203,7 +361,9 @@ def save_to_db(result: dict, db) -> dict:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="점수표 이미지들을 분석하고 DB에 저장합니다.")
     # 점수표 파일 경로 리스트를 1개 이상 필수로 받습니다.
-    parser.add_argument("score_files", nargs='+', help="점수표 이미지 파일 경로 리스트 (다중 파일)")
+    parser.add_argument("score_files", nargs='+', help="점수표 이미지/PDF 파일 경로 리스트 (다중 파일, PDF는 쪽마다 한 장)")
+    parser.add_argument("--exam-id", type=int, default=None, help="저장할 시험 ID (없으면 현재 시험)")
+    parser.add_argument("--batch-size", type=int, default=None, help="한 요청에 묶을 점수표 수 (기본값: SCORE_BATCH_SIZE, 1이면 한 장씩)")
     args = parser.parse_args()
     
     # DB 세션 생성
@@ -214,23 +374,35 @@ if __name__ == "__main__":
     
     try:
         # glob 대신 인수로 받은 파일 리스트(args.score_files)를 사용
+        image_paths = []
         for image_path in args.score_files:
-            filename = Path(image_path).name
-            
             if not os.path.exists(image_path):
-                print(f"\n⚠️ 경고: '{filename}' 파일을 찾을 수 없어 건너뜁니다.")
+                print(f"\n⚠️ 경고: '{Path(image_path).name}' 파일을 찾을 수 없어 건너뜁니다.")
                 error_count += 1
                 continue
+            image_paths.append(image_path)
+
+        # PDF는 쪽마다 한 장으로 (여러 프로세스로 렌더링, 이미 렌더링한 쪽은 캐시에서)
+        page_paths = []
+        filenames = []
+        for image_path, pages in zip(image_paths, rasterize.rasterizer.rasterize_many(image_paths)):
+            for page_number, page_path in enumerate(pages, start=1):
+                page_paths.append(page_path)
+                filenames.append(f"{Path(image_path).name} {page_number}쪽" if rasterize.is_pdf(image_path) else Path(image_path).name)
+
+        # 이미지 파싱 (여러 장씩 묶어서 요청, 실패한 장은 None)
+        parsed = parse_sheets(page_paths, args.batch_size, strict=False)
 
+        for filename, result in zip(filenames, parsed):
             print(f"\n[처리 중] {filename}")
             
             try:
-                # 이미지 파싱
-                result = parse_sheet(image_path)
+                if result is None:
+                    raise ValueError("점수표를 파싱하지 못했습니다.")
                 print(f" 파싱 완료: 학번 {result.get('student_code', 'N/A')}")
                 
                 # DB에 저장
-                save_result = save_to_db(result, db)
+                save_result = save_to_db(result, db, args.exam_id)
                 if save_result["success"]:
                     saved = save_result.get('saved_count', 0)
                     updated = save_result.get('updated_count', 0)
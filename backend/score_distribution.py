@@ -0,0 +1,59 @@
+"""
+문항별 점수 분포 구간 (대시보드의 scoreLabels / scoreData 와 같은 기준)
+
+구간: 0점 / 1-3점 / 4-6점 / 7-9점 / 만점
+- 만점: score >= 만점 (배점이 7점 미만인 문항도 만점은 항상 마지막 구간)
+- 0점: score <= 0
+- 1-3점: 0 < score < 4
+- 4-6점: 4 <= score < 7
+- 7-9점: 7 <= score < 만점
+
+Python 쪽(분석 파이프라인)과 SQL 쪽(리포트 집계)이 같은 기준을 쓰도록 한 곳에 둔다.
+"""
+from decimal import Decimal
+from typing import List, Union
+
+from sqlalchemy import and_
+
+BUCKET_COUNT = 5
+
+Number = Union[int, float, Decimal]
+
+
+def _format_score(max_score: Number) -> str:
+    # 40.00 → "40", 7.50 → "7.5"
+    value = Decimal(str(max_score)).normalize()
+    return format(value, "f")
+
+
+def score_bucket_labels(max_score: Number) -> List[str]:
+    return ["0점", "1-3점", "4-6점", "7-9점", f"{_format_score(max_score)}점"]
+
+
+def score_bucket_index(score: Number, max_score: Number) -> int:
+    """점수가 속한 구간 번호 (0 ~ 4)"""
+    if score >= max_score:
+        return 4
+    if score <= 0:
+        return 0
+    if score < 4:
+        return 1
+    if score < 7:
+        return 2
+    return 3
+
+
+def score_bucket_conditions(score_column, max_score) -> list:
+    """
+    각 구간에 해당하는 SQL 조건 목록 (score_bucket_index와 같은 기준)
+    max_score는 값 또는 컬럼(Question.score) 모두 가능
+    NULL 점수는 어느 구간에도 속하지 않는다
+    """
+    below_max = score_column < max_score
+    return [
+        and_(score_column <= 0, below_max),
+        and_(score_column > 0, score_column < 4, below_max),
+        and_(score_column >= 4, score_column < 7, below_max),
+        and_(score_column >= 7, below_max),
+        score_column >= max_score,
+    ]
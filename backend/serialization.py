@@ -0,0 +1,57 @@
+"""
+JSON 직렬화 (큰 분석 응답용 빠른 경로)
+
+orjson이 설치되어 있고 FAST_JSON이 켜져 있으면 orjson으로, 아니면 표준 json으로 직렬화한다.
+두 경로 모두 Decimal, datetime/date, numpy 스칼라/배열을 그대로 받는다.
+(FastAPI 기본 경로처럼 jsonable_encoder로 객체 전체를 한 번 더 복사하지 않는다)
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from config import settings
+
+try:
+    import orjson
+except ImportError:  # 선택 의존성
+    orjson = None
+
+USE_ORJSON = orjson is not None and settings.FAST_JSON
+
+
+def _default(obj: Any) -> Any:
+    """기본 인코더가 모르는 타입 변환 (orjson은 datetime/numpy를 직접 처리하므로 주로 Decimal만 들어온다)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    # numpy는 선택 의존성이라 import하지 않고 모양으로 판별 (np.int64, np.float32, np.ndarray ...)
+    if type(obj).__module__ == "numpy" and hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if USE_ORJSON:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """dumps()로 직렬화하는 JSONResponse (response_class 또는 직접 반환용)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,11 +1,8 @@
 import os
 import sys
-import base64
 import json
 import re
 import argparse
-from decimal import Decimal
-from openai import OpenAI
 from dotenv import load_dotenv
 
 # -----------------------------------------------------------
@@ -13,63 +10,24 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import SessionLocal
-from models import Question
+from question_upsert import upsert_questions
+from exam_scope import resolve_exam_id
+from llm_client import chat_completion
+from vision_cache import vision_cache
+import image_preprocess
+import rasterize
 # -----------------------------------------------------------
 
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY 환경변수가 설정되지 않았습니다.")
+PROBLEM_MODEL = "gpt-4o"
+# 프롬프트나 응답 형식을 바꾸면 올릴 것 (비전 캐시 키에 들어감)
+PROBLEM_PROMPT_VERSION = "problems-v1"
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-
-def pdf_to_image(pdf_path: str) -> bytes:
-    """PDF 파일의 첫 페이지를 PNG 이미지로 변환"""
-    try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(pdf_path)
-        if len(doc) == 0:
-            raise ValueError("PDF 파일이 비어있습니다.")
-        # 첫 페이지를 이미지로 변환
-        page = doc[0]
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2배 확대
-        img_bytes = pix.tobytes("png")
-        doc.close()
-        return img_bytes
-    except ImportError:
-        # PyMuPDF가 없으면 pdf2image 시도
-        try:
-            from pdf2image import convert_from_path
-            images = convert_from_path(pdf_path, first_page=1, last_page=1)
-            if not images:
-                raise ValueError("PDF에서 이미지를 추출할 수 없습니다.")
-            import io
-            img_byte_arr = io.BytesIO()
-            images[0].save(img_byte_arr, format='PNG')
-            return img_byte_arr.getvalue()
-        except ImportError:
-            raise ImportError("PDF를 이미지로 변환하려면 PyMuPDF 또는 pdf2image가 필요합니다. 'pip install PyMuPDF' 또는 'pip install pdf2image'를 실행하세요.")
-    except Exception as e:
-        raise ValueError(f"PDF를 이미지로 변환하는 중 오류 발생: {str(e)}")
-
-
-def encode_image(image_path: str) -> str:
-    """이미지 또는 PDF를 base64 data URL 형태로 인코딩"""
-    import mimetypes
-    mime_type = mimetypes.guess_type(image_path)[0] or "image/png"
-    
-    # PDF 파일인 경우 이미지로 변환
-    if mime_type == "application/pdf" or image_path.lower().endswith('.pdf'):
-        img_bytes = pdf_to_image(image_path)
-        b64 = base64.b64encode(img_bytes).decode("utf-8")
-        return f"data:image/png;base64,{b64}"
-    
-    # 일반 이미지 파일
-    with open(image_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return f"data:{mime_type};base64,{b64}"
+def encode_pages(image_path: str) -> list:
+    """문제지 이미지 또는 PDF(모든 쪽)를 전처리(image_preprocess)해서 messages에 넣을 image_url 항목 목록으로"""
+    return image_preprocess.document_parts(image_path, "problems")
 
 
 def count_subquestions(text: str) -> int:
@@ -81,8 +39,40 @@ def count_subquestions(text: str) -> int:
 
 
 def call_openai_for_problems(image_path: str) -> dict:
-    """OpenAI API를 통해 문제 정보 추출"""
-    image_data_url = encode_image(image_path)
+    """OpenAI API를 통해 문제 정보 추출 (같은 문제지를 이미 파싱했으면 비전 캐시에서)"""
+    raw = vision_cache.fetch(
+        "problems", image_path, lambda: request_problems(image_path),
+        prompt_version=f"{PROBLEM_PROMPT_VERSION}+{image_preprocess.cache_tag('problems')}{rasterize.cache_tag(image_path)}",
+        model=PROBLEM_MODEL,
+    )
+    
+    problems_out = []
+    total_score = 0
+    
+    for p in raw.get("problems", []):
+        idx = p.get("problem_index")
+        text = p.get("raw_text", "")
+        score = int(p.get("score", 0))
+        
+        q_count = count_subquestions(text)
+        total_score += score
+        
+        problems_out.append({
+            "problem_index": idx,
+            "question_count": q_count,
+            "score": score,
+            "raw_text": text,
+        })
+    
+    return {
+        "problems": problems_out,
+        "total_score": total_score,
+    }
+
+
+def request_problems(image_path: str) -> dict:
+    """문제지 이미지/PDF → 모델이 돌려준 JSON 그대로 ({"problems": [...]}, PDF는 모든 쪽을 한 요청으로)"""
+    page_contents = encode_pages(image_path)
 
     # ▼▼▼ [수정됨] "JSON" 단어 필수 포함 ▼▼▼
     system_prompt = """
@@ -114,8 +104,9 @@ def call_openai_for_problems(image_path: str) -> dict:
     - 오직 JSON 데이터만 출력하세요.
     """
 
-    resp = client.chat.completions.create(
-        model="gpt-4o", 
+    resp = chat_completion(
+        label=f"problems {os.path.basename(image_path)}",
+        model=PROBLEM_MODEL,
         response_format={"type": "json_object"}, # 이 옵션을 쓰려면 프롬프트에 'JSON'이 있어야 함
         messages=[
             {"role": "system", "content": system_prompt},
@@ -123,7 +114,7 @@ def call_openai_for_problems(image_path: str) -> dict:
                 "role": "user",
                 "content": [
                     {"type": "text", "text": user_prompt},
-                    {"type": "image_url", "image_url": {"url": image_data_url}},
+                    *page_contents,
                 ],
             },
         ],
@@ -131,34 +122,11 @@ def call_openai_for_problems(image_path: str) -> dict:
     )
 
     content = resp.choices[0].message.content
-    raw = json.loads(content)
-    
-    problems_out = []
-    total_score = 0
-    
-    for p in raw.get("problems", []):
-        idx = p.get("problem_index")
-        text = p.get("raw_text", "")
-        score = int(p.get("score", 0))
-        
-        q_count = count_subquestions(text)
-        total_score += score
-        
-        problems_out.append({
-            "problem_index": idx,
-            "question_count": q_count,
-            "score": score,
-            "raw_text": text,
-        })
-    
-    return {
-        "problems": problems_out,
-        "total_score": total_score,
-    }
+    return json.loads(content)
 
 
-def save_questions_to_db(parse_result: dict):
-    """파싱된 결과를 Question 테이블에 저장"""
+def save_questions_to_db(parse_result: dict, exam_id: int | None = None):
+    """파싱된 결과를 Question 테이블에 저장 (exam_id가 없으면 현재 시험, 시험이 없으면 기본 시험 생성)"""
     db = SessionLocal()
     saved_count = 0
     
@@ -166,30 +134,16 @@ def save_questions_to_db(parse_result: dict):
         print("\n 데이터베이스 저장 시작...")
         problems = parse_result.get("problems", [])
         
-        for p in problems:
-            q_num = p["problem_index"]
-            q_text = p["raw_text"]
-            q_score = p["score"]
-            
-            # 이미 존재하는지 확인
-            existing_q = db.query(Question).filter(Question.number == q_num).first()
-            
-            if existing_q:
-                # 업데이트
-                existing_q.text = q_text
-                existing_q.score = Decimal(str(q_score))
-                print(f"  [UPDATE] 문항 {q_num}번 업데이트됨")
-            else:
-                # 새로 생성
-                new_q = Question(
-                    number=q_num,
-                    text=q_text,
-                    score=Decimal(str(q_score))
-                )
-                db.add(new_q)
-                print(f"  [INSERT] 문항 {q_num}번 새로 등록됨")
-            
-            saved_count += 1
+        # 문항 전체를 한 문장으로 upsert (지문/배점이 그대로인 문항은 건드리지 않음)
+        exam_id = resolve_exam_id(db, exam_id, create_if_missing=True)
+        summary = upsert_questions(db, exam_id, [(p["problem_index"], p["raw_text"], p["score"]) for p in problems])
+        for q_num in summary["created"]:
+            print(f"  [INSERT] 문항 {q_num}번 새로 등록됨")
+        for q_num in summary["updated"]:
+            print(f"  [UPDATE] 문항 {q_num}번 업데이트됨")
+        for q_num in summary["unchanged"]:
+            print(f"  [SKIP] 문항 {q_num}번 변경 없음")
+        saved_count = len(summary["created"]) + len(summary["updated"])
             
         db.commit()
         print(f"총 {saved_count}개의 문제가 DB에 저장되었습니다.")
@@ -216,7 +170,8 @@ def parse_exam(image_path: str, output_json_path: str | None = None) -> dict:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="문제지 원본을 분석하고 DB에 저장합니다.")
     # 문제지 원본 파일 경로 1개를 필수 인수로 받습니다.
-    parser.add_argument("problem_file", help="문제 원본 이미지 파일 경로 (단일 파일)", type=str)
+    parser.add_argument("problem_file", help="문제 원본 이미지 또는 PDF 파일 경로 (단일 파일, PDF는 모든 쪽)", type=str)
+    parser.add_argument("--exam-id", type=int, default=None, help="저장할 시험 ID (없으면 현재 시험)")
     args = parser.parse_args()
 
     if not os.path.exists(args.problem_file):
@@ -226,5 +181,5 @@ if __name__ == "__main__":
     # 2. 파싱 실행 (LLM) 및 DB 저장
     print(f"🔍 '{args.problem_file}' 분석 및 DB 등록 시작...")
     parsed_data = parse_exam(args.problem_file, "문제지_parsed.json")
-    save_questions_to_db(parsed_data)
+    save_questions_to_db(parsed_data, args.exam_id)
     print(f"✅ 문제 등록 완료: 총 {len(parsed_data['problems'])}개 문항.")
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+비전 파싱 결과 캐시 (이미지 내용 기준)
+
+score.parse_sheet / parse2.parse_student_answer_handwriting / test_parse.call_openai_for_problems는
+같은 스캔을 다시 돌려도 매번 모델에 보냈다. 이미지 바이트의 SHA-256 + 프롬프트 버전 + 모델 + 힌트(학번 등)를
+키로 모델이 돌려준 JSON을 디스크에 저장해 두고, 같은 키면 API를 부르지 않는다.
+
+- 파일 이름/경로가 바뀌어도 내용이 같으면 적중, 한 바이트라도 다르면 새로 파싱
+- 프롬프트나 후처리에 영향을 주는 부분을 바꾸면 각 모듈의 *_PROMPT_VERSION을 올릴 것 (기존 항목은 자연히 안 쓰임)
+- 파싱에 실패한 호출(예외)은 저장하지 않는다
+- 항목 하나 = JSON 파일 하나 (임시 파일에 쓴 뒤 os.replace → 동시에 써도 깨진 파일을 읽지 않음)
+
+사용법:
+    python vision_cache.py --stats    # 저장된 항목 수 / 크기 (종류별)
+    python vision_cache.py --clear    # 전부 삭제
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+from config import settings
+
+_CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+# fake 백엔드 응답이 실제 파싱 결과 캐시에 섞이지 않도록 따로 둔다
+DEFAULT_CACHE_DIR = os.path.join(_CACHE_ROOT, "fake" if settings.LLM_BACKEND.lower() == "fake" else "", "vision")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(kind: str, image_sha256: str, prompt_version: str, model: str, hint: str = "") -> str:
+    payload = "\x00".join([kind, prompt_version, model, hint or "", image_sha256])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class VisionCache:
+    def __init__(self, directory: str, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _path(self, key: str) -> str:
+        # 한 디렉터리에 파일이 너무 많이 쌓이지 않도록 앞 두 글자로 나눈다
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _count(self, kind: str, name: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(kind, {"hits": 0, "misses": 0, "writes": 0, "errors": 0})
+            counters[name] += 1
+
+    def get(self, kind: str, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self._count(kind, "misses")
+            return None
+        except (OSError, ValueError):
+            # 깨진 항목은 없는 것으로 보고 다시 파싱해서 덮어쓴다
+            self._count(kind, "errors")
+            self._count(kind, "misses")
+            return None
+        self._count(kind, "hits")
+        return entry["result"]
+
+    def put(self, kind: str, key: str, result: dict, meta: dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {**meta, "kind": kind, "created_at": time.time(), "result": result}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._count(kind, "writes")
+
+    def lookup(self, kind: str, image_path: str, *, prompt_version: str, model: str, hint: str = "") -> Optional[dict]:
+        """저장된 결과 (없거나 캐시를 끈 상태면 None)"""
+        if not self.enabled:
+            return None
+        return self.get(kind, cache_key(kind, file_sha256(image_path), prompt_version, model, hint))
+
+    def store(self, kind: str, image_path: str, result: dict, *, prompt_version: str, model: str, hint: str = "") -> None:
+        if not self.enabled:
+            return
+        image_sha256 = file_sha256(image_path)
+        try:
+            self.put(kind, cache_key(kind, image_sha256, prompt_version, model, hint), result, {
+                "image_sha256": image_sha256,
+                "prompt_version": prompt_version,
+                "model": model,
+                "hint": hint or "",
+                "source": os.path.basename(image_path),
+            })
+        except OSError as e:
+            # 캐시에 못 써도 파싱 결과는 돌려준다
+            self._count(kind, "errors")
+            print(f"⚠️  비전 캐시 저장 실패 ({image_path}): {e}", file=sys.stderr)
+
+    def fetch(
+        self,
+        kind: str,
+        image_path: str,
+        compute: Callable[[], dict],
+        *,
+        prompt_version: str,
+        model: str,
+        hint: str = "",
+    ) -> dict:
+        """캐시에 있으면 저장된 결과, 없으면 compute()를 호출하고 결과를 저장"""
+        if not self.enabled:
+            return compute()
+
+        cached = self.lookup(kind, image_path, prompt_version=prompt_version, model=model, hint=hint)
+        if cached is not None:
+            return cached
+
+        result = compute()
+        self.store(kind, image_path, result, prompt_version=prompt_version, model=model, hint=hint)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """이 프로세스에서의 종류별 적중/실패 횟수"""
+        with self._lock:
+            return {kind: dict(counters) for kind, counters in self._stats.items()}
+
+    def disk_usage(self) -> Dict[str, Dict[str, int]]:
+        usage: Dict[str, Dict[str, int]] = {}
+        if not os.path.isdir(self.directory):
+            return usage
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        kind = json.load(f).get("kind", "?")
+                except (OSError, ValueError):
+                    kind = "?"
+                entry = usage.setdefault(kind, {"entries": 0, "bytes": 0})
+                entry["entries"] += 1
+                entry["bytes"] += os.path.getsize(path)
+        return usage
+
+    def clear(self) -> int:
+        removed = 0
+        for root, _, files in os.walk(self.directory, topdown=False):
+            for name in files:
+                os.remove(os.path.join(root, name))
+                removed += 1
+            if root != self.directory:
+                os.rmdir(root)
+        return removed
+
+
+vision_cache = VisionCache(settings.VISION_CACHE_DIR or DEFAULT_CACHE_DIR, settings.VISION_CACHE_ENABLED)
+
+
+def format_stats(stats: Dict[str, Dict[str, int]]) -> str:
+    parts = []
+    for kind, counters in sorted(stats.items()):
+        total = counters["hits"] + counters["misses"]
+        rate = counters["hits"] / total * 100 if total else 0.0
+        parts.append(f"{kind} {counters['hits']}/{total} 적중 ({rate:.0f}%)")
+    return ", ".join(parts) if parts else "호출 없음"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="비전 파싱 결과 캐시 관리")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--stats", action="store_true", help="저장된 항목 수 / 크기")
+    group.add_argument("--clear", action="store_true", help="저장된 항목 전부 삭제")
+    args = parser.parse_args()
+
+    print(f"캐시 디렉터리: {vision_cache.directory} ({'사용' if vision_cache.enabled else '사용 안 함'})")
+    if args.clear:
+        print(f"🗑️  {vision_cache.clear()}개 항목 삭제")
+    else:
+        usage = vision_cache.disk_usage()
+        if not usage:
+            print("저장된 항목 없음")
+        for kind, entry in sorted(usage.items()):
+            print(f"  {kind:<10} {entry['entries']:>6}개  {entry['bytes'] / 1024:,.1f} KB")
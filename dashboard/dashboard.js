@@ -223,44 +223,29 @@ async function startFinalAnalysis() {
 
 // [핵심] 서버 데이터를 대시보드용 데이터로 변환하는 함수
 function processServerData(serverData) {
-  // 만약 서버가 이미 dashboard 형식을 준다면 그대로 반환
-  if (serverData.questions && serverData.totalStudents) return serverData;
+  // 만약 서버가 이미 dashboard 형식을 준다면 그대로 반환 (GET /analysis/overview 응답 포함)
+  if (serverData.questions && serverData.totalStudents !== undefined) return serverData;
 
   // analysis.py 형식이 단일 객체로 온다고 가정 (또는 배열일 수도 있음)
   // 여기서는 단일 문항 응답을 가정하고 배열로 감쌉니다.
   const inputItem = Array.isArray(serverData) ? serverData[0] : serverData;
 
   // 1. 기본 정보 추출
-  const totalStudents = inputItem.statistics?.total_answers || 0;
-  const correctCount = inputItem.statistics?.correct_answers || 0;
-  const wrongList = inputItem.wrong_answers || [];
+  // wrong_answers는 첫 페이지만 오므로(나머지는 wrong_answers_next_cursor) 집계에 쓰지 않고
+  // 서버가 전체 답안으로 계산한 statistics를 그대로 사용합니다.
+  const statistics = inputItem.statistics || {};
+  const totalStudents = statistics.total_answers || 0;
   const maxScore = inputItem.max_score || 10;
 
-  // 2. 점수 히스토그램 계산 (Distribution)
-  // 예: 10점 만점이면 [0점, 1-3점, 4-6점, 7-9점, 10점] 5개 구간으로 나눔
-  const scoreLabels = ["0점", "1-3점", "4-6점", "7-9점", "10점(정답)"];
-  const scoreCounts = [0, 0, 0, 0, 0]; // 각 구간별 인원 수
-
-  // 오답자 점수 집계
-  wrongList.forEach((item) => {
-    const s = item.score || 0;
-    if (s === 0) scoreCounts[0]++;
-    else if (s < 4) scoreCounts[1]++;
-    else if (s < 7) scoreCounts[2]++;
-    else if (s < 10) scoreCounts[3]++;
-    else scoreCounts[4]++; // 혹시 오답 리스트에 만점자가 있다면
-  });
-
-  // 정답자(만점자) 추가
-  // analysis.py 로직상 정답자는 wrong_answers 리스트에 없으므로 따로 더해줍니다.
-  scoreCounts[4] += correctCount;
+  // 2. 점수 히스토그램 (Distribution)
+  // 배점 기준 5개 구간 [0점, ..., 만점] - 구간 라벨도 서버가 배점에 맞춰 내려줌
+  const histogram = statistics.histogram || {};
+  const scoreLabels = histogram.labels || ["0점", "1-3점", "4-6점", "7-9점", "10점(정답)"];
+  const scoreCounts = histogram.counts || [0, 0, 0, 0, 0]; // 각 구간별 인원 수
 
-  // 3. 평균 점수 계산
-  let totalSum = 0;
-  wrongList.forEach((w) => (totalSum += w.score || 0));
-  totalSum += correctCount * maxScore;
+  // 3. 평균 점수 (점수가 매겨진 답안 기준)
   const avgScore =
-    totalStudents > 0 ? (totalSum / totalStudents).toFixed(1) : 0;
+    statistics.mean_score != null ? Number(statistics.mean_score).toFixed(1) : 0;
 
   // 4. 클러스터 데이터 매핑
   // analysis_result.cluster_data 가 없으면 빈 배열